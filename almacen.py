@@ -0,0 +1,465 @@
+import asyncio
+import heapq
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, time as hora_dia, timedelta, timezone
+from itertools import count, islice
+
+from coalescencia import LlamadasCompartidas
+from indice import IndiceIntervalos, IndicePrefijos, IndiceTexto, clave_lugar, fusionar, huecos
+from recurrencia import ocurrencias
+from tiempo import CAMPOS_MOMENTO, ZONA, calcular_momentos, duracion_evento, fin_evento, inicio_dia
+
+# Ocurrencias de una serie que se comprueban al avisar de solapes
+OCURRENCIAS_SOLAPE = 10
+
+# Compartido por todos los almacenes: una versión no se repite aunque se recree el de un servidor
+_versiones = count(1)
+
+
+logger = logging.getLogger(__name__)
+
+
+def clave_evento(evento):
+    """Clave de orden (starts_at, id); las páginas la usan como cursor."""
+    return (evento["starts_at"], evento["id"])
+
+
+class AlmacenEventos:
+    """Copia en memoria de los eventos de un servidor, ordenada por `starts_at`.
+
+    Se carga una vez desde el repositorio y se mantiene al día con escritura
+    directa: cada alta, modificación o baja pasa primero por el repositorio y
+    después actualiza el índice. Las consultas por rango son búsquedas
+    binarias. Si la copia supera `max_edad` segundos se recarga en la
+    siguiente lectura; `refrescar()` fuerza la recarga. Con `retencion` solo
+    se cargan los eventos puntuales que empezaron dentro de ese periodo: los
+    anteriores son los que el archivado saca de la tabla.
+
+    Los eventos recurrentes (con `rrule`) se guardan aparte, una vez por
+    serie, y sus ocurrencias se generan solo para la ventana consultada y se
+    intercalan en orden con los eventos puntuales. Los días y las horas se
+    interpretan en la zona del servidor.
+
+    Los eventos puntuales se indexan además como intervalos de tiempo, en
+    conjunto y por lugar, para avisar de solapes y buscar huecos libres.
+
+    `version` cambia con cada alta, modificación, baja o recarga, así que
+    sirve para invalidar lo calculado a partir de la copia. Las lecturas
+    concurrentes que necesitan cargarla, o que piden la misma página al
+    repositorio, comparten una sola consulta.
+
+    Si se le pasa `ubicaciones`, anota en ese diccionario compartido el
+    servidor de cada evento que tiene en la copia.
+    """
+
+    def __init__(self, repositorio, guild_id, zona=ZONA, max_edad=300, retencion=None, ubicaciones=None):
+        self._repositorio = repositorio
+        self._guild_id = guild_id
+        self._ubicaciones = {} if ubicaciones is None else ubicaciones
+        self._zona = zona
+        self._max_edad = max_edad
+        self._retencion = retencion
+        self._claves = []
+        self._eventos = []
+        self._por_id = {}
+        self._series = {}
+        self._nombres = IndicePrefijos()
+        self._texto = IndiceTexto()
+        self._intervalos = IndiceIntervalos()
+        self._lugares = {}
+        self._cargado_en = None
+        self._lock = asyncio.Lock()
+        self._compartidas = LlamadasCompartidas()
+        self.version = next(_versiones)
+
+    def _obsoleto(self):
+        if self._cargado_en is None:
+            return True
+        return self._max_edad is not None and time.monotonic() - self._cargado_en > self._max_edad
+
+    async def refrescar(self):
+        async with self._lock:
+            desde = datetime.now(timezone.utc) - self._retencion if self._retencion else None
+            eventos = await self._repositorio.cargar(self._guild_id, desde)
+            if eventos is None:
+                # Conservar la copia anterior si la recarga falla
+                return False
+            for id in self._por_id:
+                self._soltar_ubicacion(id)
+            self._por_id = {e["id"]: e for e in eventos}
+            self._ubicaciones.update(dict.fromkeys(self._por_id, self._guild_id))
+            self._series = {e["id"]: e for e in eventos if e.get("rrule")}
+            self._nombres = IndicePrefijos(eventos)
+            self._texto = IndiceTexto(eventos)
+            eventos = sorted((e for e in eventos if not e.get("rrule")), key=clave_evento)
+            self._intervalos = IndiceIntervalos(eventos)
+            por_lugar = defaultdict(list)
+            for evento in eventos:
+                por_lugar[clave_lugar(evento["lugar"])].append(evento)
+            self._lugares = {lugar: IndiceIntervalos(grupo) for lugar, grupo in por_lugar.items()}
+            self._eventos = eventos
+            self._claves = [clave_evento(e) for e in eventos]
+            self._cargado_en = time.monotonic()
+            self.version = next(_versiones)
+            logger.info(
+                f"Almacén de eventos del servidor {self._guild_id} cargado: "
+                f"{len(eventos)} eventos y {len(self._series)} series"
+            )
+            return True
+
+    async def _asegurar(self):
+        if self._obsoleto():
+            # Quien llega durante una recarga espera a esa misma en lugar de encadenar otra
+            await self._compartidas.llamar("refrescar", self.refrescar)
+
+    async def version_actual(self):
+        """Versión de la copia, tras cargarla si hace falta."""
+        await self._asegurar()
+        return self.version
+
+    async def todos(self):
+        """Todas las filas: eventos puntuales y series sin expandir."""
+        await self._asegurar()
+        return list(self._por_id.values())
+
+    async def series(self):
+        await self._asegurar()
+        return list(self._series.values())
+
+    def _intercalar(self, puntuales, series, desde, hasta=None, despues=None):
+        # Mezcla ordenada y perezosa de los puntuales con las ocurrencias de cada serie
+        generadores = [ocurrencias(serie, desde, hasta, self._zona) for serie in series]
+        mezcla = heapq.merge(puntuales, *generadores, key=clave_evento)
+        if despues is not None:
+            mezcla = (e for e in mezcla if clave_evento(e) > despues)
+        return mezcla
+
+    async def rango(self, desde, hasta):
+        """Eventos de los días [desde, hasta) en hora local, ordenados por `starts_at`."""
+        await self._asegurar()
+        desde, hasta = inicio_dia(desde, self._zona), inicio_dia(hasta, self._zona)
+        inicio = bisect_left(self._claves, (desde,))
+        fin = bisect_left(self._claves, (hasta,))
+        return list(self._intercalar(self._eventos[inicio:fin], self._series.values(), desde, hasta))
+
+    async def pagina(self, desde, despues=None, limite=10, expandir=True):
+        """Página de eventos que empiezan desde `desde` y siguen a la clave `despues`.
+
+        Con la copia vigente se resuelve con una búsqueda binaria; si está
+        obsoleta se pide solo esa página al repositorio en lugar de recargar
+        la tabla entera. Con `expandir=False` solo se recorren los eventos
+        puntuales, sin ocurrencias de series.
+        """
+        if self._obsoleto():
+            cursor = tuple(despues) if despues is not None else None
+            puntuales = await self._compartidas.llamar(
+                ("pagina", desde, cursor, limite), self._repositorio.pagina, self._guild_id, desde, despues, limite)
+            series = await self._compartidas.llamar(
+                "series", self._repositorio.series, self._guild_id) if expandir else []
+        else:
+            if despues is None:
+                inicio = bisect_left(self._claves, (desde,))
+            else:
+                inicio = bisect_right(self._claves, tuple(despues))
+            puntuales = self._eventos[inicio:inicio + limite]
+            series = self._series.values() if expandir else []
+        if not series:
+            return puntuales
+        # Las ocurrencias anteriores al cursor se descartan sin generar las de después
+        desde_series = max(desde, despues[0]) if despues is not None else desde
+        return list(islice(self._intercalar(puntuales, series, desde_series, despues=despues), limite))
+
+    async def contar(self, desde):
+        """Eventos puntuales desde `desde` más las series con alguna ocurrencia posterior."""
+        if self._obsoleto():
+            puntuales = await self._compartidas.llamar(
+                ("contar", desde), self._repositorio.contar, self._guild_id, desde)
+            series = await self._compartidas.llamar("series", self._repositorio.series, self._guild_id)
+        else:
+            puntuales = len(self._claves) - bisect_left(self._claves, (desde,))
+            series = self._series.values()
+        return puntuales + sum(1 for serie in series if next(ocurrencias(serie, desde, zona=self._zona), None))
+
+    async def obtener(self, id):
+        await self._asegurar()
+        return self._por_id.get(id)
+
+    async def sugerencias(self, texto, limite=25, solo_series=False):
+        """Eventos cuyo id o palabras del nombre empiezan por lo escrito, para autocompletar.
+
+        Se resuelve sobre la copia en memoria, sin consultar la base de datos.
+        Primero los próximos, del más cercano al más lejano, y después los
+        pasados, del más reciente al más antiguo; el evento cuyo id coincide
+        entero con lo escrito va delante de todo. Sin texto, los próximos.
+        """
+        await self._asegurar()
+        ahora = datetime.now(timezone.utc)
+        texto = texto.strip()
+        exacto = int(texto) if texto.isdigit() else None
+        if not texto:
+            inicio = bisect_left(self._claves, (ahora,))
+            candidatos = self._series.values() if solo_series else self._eventos[inicio:inicio + limite]
+        else:
+            ids = self._nombres.buscar(texto)
+            candidatos = (self._por_id[id] for id in ids)
+            if solo_series:
+                candidatos = (e for e in candidatos if e.get("rrule"))
+
+        def orden(evento):
+            distancia = (evento["starts_at"] - ahora).total_seconds()
+            return (evento["id"] != exacto, distancia < 0, abs(distancia))
+        return heapq.nsmallest(limite, candidatos, key=orden)
+
+    async def buscar(self, consulta, desde=None, hasta=None):
+        """Eventos con todas las palabras de la consulta en el nombre o el lugar, por relevancia.
+
+        `desde` y `hasta` (días en hora local, `hasta` excluido) filtran por
+        fecha. De cada serie se devuelve su primera ocurrencia desde `desde`
+        (o desde ahora) dentro del filtro. A igual relevancia van primero los
+        próximos y después los pasados, como en `sugerencias`.
+        """
+        await self._asegurar()
+        ahora = datetime.now(timezone.utc)
+        desde = inicio_dia(desde, self._zona) if desde else None
+        hasta = inicio_dia(hasta, self._zona) if hasta else None
+        resultados = []
+        for id, puntos in self._texto.buscar(consulta).items():
+            evento = self._por_id[id]
+            if evento.get("rrule"):
+                proxima = next(ocurrencias(evento, desde or ahora, hasta, self._zona), None)
+                if proxima is None and (desde or hasta):
+                    continue
+                evento = proxima or evento
+            elif (desde and evento["starts_at"] < desde) or (hasta and evento["starts_at"] >= hasta):
+                continue
+            distancia = (evento["starts_at"] - ahora).total_seconds()
+            resultados.append(((-puntos, distancia < 0, abs(distancia)), evento))
+        resultados.sort(key=lambda resultado: resultado[0])
+        return [evento for _, evento in resultados]
+
+    def _solapes(self, desde, hasta, lugar=None):
+        # Puntuales del índice de intervalos (el del lugar o el global) más las ocurrencias de las series
+        if lugar is None:
+            indice, series = self._intervalos, self._series.values()
+        else:
+            lugar = clave_lugar(lugar)
+            indice = self._lugares.get(lugar) or IndiceIntervalos()
+            series = [s for s in self._series.values() if clave_lugar(s["lugar"]) == lugar]
+        generadores = [
+            (o for o in ocurrencias(serie, desde - duracion_evento(serie), hasta, self._zona) if fin_evento(o) > desde)
+            for serie in series
+        ]
+        return list(heapq.merge(indice.solapes(desde, hasta), *generadores, key=clave_evento))
+
+    async def conflictos(self, evento):
+        """Eventos que coinciden en el tiempo con `evento`, como pares (otro, mismo_lugar).
+
+        Primero los del mismo lugar y después el resto, cada grupo por hora de
+        inicio. De una serie se comprueban sus próximas `OCURRENCIAS_SOLAPE`
+        ocurrencias. Los eventos sin duración cuentan con la de por defecto.
+        """
+        await self._asegurar()
+        if evento.get("rrule"):
+            desde = max(evento["starts_at"], datetime.now(timezone.utc))
+            tramos = list(islice(ocurrencias(evento, desde, zona=self._zona), OCURRENCIAS_SOLAPE))
+        else:
+            tramos = [evento]
+        mismo_lugar, otros = {}, {}
+        for tramo in tramos:
+            inicio, fin = tramo["starts_at"], fin_evento(tramo)
+            for otro in self._solapes(inicio, fin, evento["lugar"]):
+                mismo_lugar.setdefault(otro["id"], otro)
+            for otro in self._solapes(inicio, fin):
+                if otro["id"] not in mismo_lugar:
+                    otros.setdefault(otro["id"], otro)
+        mismo_lugar.pop(evento["id"], None)
+        otros.pop(evento["id"], None)
+        return [(otro, True) for otro in mismo_lugar.values()] + [(otro, False) for otro in otros.values()]
+
+    async def libres(self, desde, hasta, lugar=None, minimo=timedelta(0), apertura=hora_dia(0), cierre=None):
+        """Huecos libres de los días [desde, hasta) en hora local, como pares (inicio, fin).
+
+        Se recorre una vez, en orden, lo que ocupa el rango según el índice de
+        intervalos (el del lugar si se indica, si no el de todos) y cada día
+        solo cuenta la franja [apertura, cierre); sin `cierre`, hasta la
+        medianoche. Solo se devuelven los huecos de al menos `minimo`.
+        """
+        await self._asegurar()
+        ocupados = fusionar(
+            (e["starts_at"], fin_evento(e))
+            for e in self._solapes(inicio_dia(desde, self._zona), inicio_dia(hasta, self._zona), lugar)
+        )
+        resultado = []
+        dia = desde
+        while dia < hasta:
+            abre = datetime.combine(dia, apertura, tzinfo=self._zona)
+            cierra = datetime.combine(dia, cierre, tzinfo=self._zona) if cierre else inicio_dia(dia + timedelta(days=1), self._zona)
+            resultado.extend(huecos(ocupados, abre, cierra, minimo))
+            dia += timedelta(days=1)
+        return resultado
+
+    def _soltar_ubicacion(self, id):
+        if self._ubicaciones.get(id) == self._guild_id:
+            del self._ubicaciones[id]
+
+    def _indexar(self, evento):
+        self.version = next(_versiones)
+        self._por_id[evento["id"]] = evento
+        self._ubicaciones[evento["id"]] = self._guild_id
+        self._nombres.agregar(evento)
+        self._texto.agregar(evento)
+        if evento.get("rrule"):
+            self._series[evento["id"]] = evento
+            return
+        clave = clave_evento(evento)
+        posicion = bisect_left(self._claves, clave)
+        self._claves.insert(posicion, clave)
+        self._eventos.insert(posicion, evento)
+        self._intervalos.agregar(evento)
+        self._lugares.setdefault(clave_lugar(evento["lugar"]), IndiceIntervalos()).agregar(evento)
+
+    def _desindexar(self, id):
+        evento = self._por_id.pop(id, None)
+        if evento is None:
+            return
+        self.version = next(_versiones)
+        self._soltar_ubicacion(id)
+        self._nombres.quitar(evento)
+        self._texto.quitar(evento)
+        if self._series.pop(id, None) is not None:
+            return
+        posicion = bisect_left(self._claves, clave_evento(evento))
+        del self._claves[posicion]
+        del self._eventos[posicion]
+        self._intervalos.quitar(evento)
+        lugar = clave_lugar(evento["lugar"])
+        intervalos = self._lugares.get(lugar)
+        if intervalos is not None:
+            intervalos.quitar(evento)
+            if not intervalos:
+                del self._lugares[lugar]
+
+    def aplicar(self, evento):
+        """Lleva a la copia la versión actual de un evento cambiado fuera de este almacén.
+
+        Devuelve False si la copia ya tenía esa misma versión (`updated_at`),
+        que entonces no se toca.
+        """
+        if self._cargado_en is None:
+            # Aún sin cargar: la primera lectura ya traerá la versión actual
+            return True
+        actual = self._por_id.get(evento["id"])
+        if actual is not None and evento.get("updated_at") is not None and actual.get("updated_at") == evento["updated_at"]:
+            return False
+        self._desindexar(evento["id"])
+        if evento.get("guild_id") == self._guild_id:
+            self._indexar(evento)
+        return True
+
+    def quitar(self, id):
+        """Quita de la copia un evento borrado fuera de este almacén."""
+        self._desindexar(id)
+
+    async def crear(self, evento):
+        evento = {**evento, "guild_id": self._guild_id, **calcular_momentos(evento, self._zona)}
+        insertado = await self._repositorio.guardar(evento)
+        if insertado:
+            self._indexar(insertado)
+        return insertado
+
+    async def crear_lote(self, eventos):
+        eventos = [{**e, "guild_id": self._guild_id, **calcular_momentos(e, self._zona)} for e in eventos]
+        insertados = await self._repositorio.guardar_lote(eventos)
+        for evento in insertados or []:
+            self._indexar(evento)
+        return insertados
+
+    async def actualizar(self, id, campos, actual=None):
+        # Solo se modifican eventos de este servidor; `actual` es la fila si quien llama ya la tiene
+        actual = actual or await self.obtener(id)
+        if actual is None:
+            return None
+        if any(c in campos for c in CAMPOS_MOMENTO):
+            # Recalcular los instantes con los valores resultantes de la edición
+            campos = {**campos, **calcular_momentos({**actual, **campos}, self._zona)}
+        actualizado = await self._repositorio.actualizar(id, campos)
+        if actualizado:
+            self._desindexar(id)
+            self._indexar(actualizado[0])
+        return actualizado
+
+    async def eliminar(self, id, actual=None):
+        if (actual or await self.obtener(id)) is None:
+            return None
+        eliminado = await self._repositorio.eliminar(id)
+        if eliminado:
+            self._desindexar(id)
+        return eliminado
+
+
+class AlmacenesServidores:
+    """Un `AlmacenEventos` por servidor, creado y cargado con su primer uso.
+
+    Así un proceso que atiende cientos de servidores solo tiene en memoria
+    los eventos de los que se consultan.
+    """
+
+    def __init__(self, repositorio, servidores, max_edad=300, retencion=None):
+        self._repositorio = repositorio
+        self._servidores = servidores
+        self._max_edad = max_edad
+        self._retencion = retencion
+        self._almacenes = {}
+        # Servidor de cada evento presente en alguna copia, para repartir los cambios
+        self._ubicaciones = {}
+        # `updated_at` de las filas de la última tanda de cambios, para las que no tienen copia cargada
+        self._vistos = {}
+
+    def de(self, guild_id):
+        almacen = self._almacenes.get(guild_id)
+        if almacen is None:
+            zona = self._servidores.obtener(guild_id).zona_info
+            almacen = AlmacenEventos(self._repositorio, guild_id, zona, self._max_edad, self._retencion, self._ubicaciones)
+            self._almacenes[guild_id] = almacen
+        return almacen
+
+    def aplicar_cambios(self, eventos, borrados):
+        """Reparte entre las copias cargadas los eventos cambiados y borrados fuera del bot.
+
+        Cada fila va solo a la copia de su servidor y, si cambió de servidor,
+        a la del anterior para que salga de ella. Devuelve los eventos que
+        de verdad han cambiado: las filas que la copia ya tenía con el mismo
+        `updated_at` (p. ej. las que vuelven a llegar por el solape de la
+        sincronización) se descartan, y también las que llegaron iguales en
+        la tanda anterior aunque su servidor no tenga copia cargada.
+        """
+        cambiados = []
+        vistos = {}
+        for evento in eventos:
+            marca = evento.get("updated_at")
+            vistos[evento["id"]] = marca
+            anterior = self._almacenes.get(self._ubicaciones.get(evento["id"]))
+            almacen = self._almacenes.get(evento.get("guild_id"))
+            aplicado = almacen.aplicar(evento) if almacen is not None else True
+            if anterior is not None and anterior is not almacen:
+                aplicado = anterior.aplicar(evento) or aplicado
+            if aplicado and (marca is None or self._vistos.get(evento["id"]) != marca):
+                cambiados.append(evento)
+        # Una fila solo vuelve a llegar en tandas seguidas: basta recordar la última con filas
+        if eventos:
+            self._vistos = vistos
+        for borrado in borrados:
+            almacen = self._almacenes.get(self._ubicaciones.get(borrado["id"]))
+            if almacen is not None:
+                almacen.quitar(borrado["id"])
+        return cambiados
+
+    def olvidar(self, guild_id):
+        """Descarta la copia del servidor; se recrea (p. ej. con otra zona) en el siguiente uso."""
+        almacen = self._almacenes.pop(guild_id, None)
+        if almacen is not None:
+            for id in [id for id, guild in self._ubicaciones.items() if guild == guild_id]:
+                del self._ubicaciones[id]
@@ -0,0 +1,564 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import timezone
+
+from supabase import Client, create_client
+
+
+# Columnas que se pueden escribir en la tabla de eventos
+COLUMNAS = (
+    "guild_id", "nombre", "fecha", "hora", "lugar", "recordatorio", "starts_at", "remind_at", "rrule", "excepciones",
+    "duracion",
+)
+
+# Columnas de la configuración de cada servidor
+COLUMNAS_SERVIDOR = ("guild_id", "canal_id", "zona", "resumen_dia", "resumen_hora")
+
+
+def _utc(momento):
+    # Los instantes se guardan como texto ISO en UTC
+    return momento.astimezone(timezone.utc).isoformat()
+
+
+def _patron(texto):
+    # Solo letras, números y espacios: sin comodines de LIKE ni separadores de los filtros de PostgREST
+    return "%" + " ".join(re.sub(r"[^\w\s]", " ", texto).split()) + "%"
+
+
+def crear_backend():
+    """Backend elegido con la variable ALMACENAMIENTO (supabase o sqlite)."""
+    tipo = os.getenv("ALMACENAMIENTO", "supabase")
+    if tipo == "sqlite":
+        return BackendSQLite(os.getenv("SQLITE_DB", "eventos.db"))
+    if tipo == "supabase":
+        url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+        if not url or not key:
+            raise ValueError("SUPABASE_URL y SUPABASE_KEY son requeridos")
+        return BackendSupabase(create_client(url, key))
+    raise ValueError(f"ALMACENAMIENTO desconocido: {tipo} (usa supabase o sqlite)")
+
+
+class BackendEventos:
+    """Operaciones síncronas sobre la tabla de eventos.
+
+    `RepositorioEventos` las ejecuta en su pool de hilos, así que cada backend
+    puede bloquear sin afectar al event loop. Los errores se propagan; el
+    repositorio se encarga de registrarlos. Los límites de rango y los cursores
+    llegan como instantes con zona y se comparan con `starts_at`; las filas se
+    leen y escriben con los instantes como texto ISO.
+
+    `rango`, `pagina` y `contar` solo ven eventos puntuales; las series (filas
+    con `rrule`) se leen aparte con `series` y se expanden en memoria. Cada
+    evento pertenece a un servidor (`guild_id`): las consultas de calendario
+    son siempre de uno, mientras que `series` sin servidor y `recordatorios`
+    devuelven las de todos para armar los recordatorios.
+
+    Los eventos puntuales pasados se trasladan con `archivar` a una tabla de
+    archivo que solo lee `historial`; ninguna otra consulta la toca.
+    """
+
+    nombre = None
+
+    def cargar(self, guild_id=None, desde=None):
+        """Filas de un servidor, o de todos; con `desde`, solo los puntuales desde ese instante y las series."""
+        raise NotImplementedError
+
+    def obtener(self, id):
+        raise NotImplementedError
+
+    def rango(self, guild_id, desde, hasta):
+        raise NotImplementedError
+
+    def pagina(self, guild_id, desde, despues, limite):
+        raise NotImplementedError
+
+    def contar(self, guild_id, desde):
+        raise NotImplementedError
+
+    def series(self, guild_id=None):
+        """Filas de eventos recurrentes, una por serie."""
+        raise NotImplementedError
+
+    def recordatorios(self, desde, hasta):
+        """Eventos puntuales de todos los servidores con `remind_at` en [desde, hasta)."""
+        raise NotImplementedError
+
+    def cambios(self, desde):
+        """Filas de todos los servidores modificadas desde `desde` y ids borrados desde entonces.
+
+        Devuelve (filas, borrados); cada borrado es un dict con `id` y
+        `guild_id`. Las marcas de modificación y los borrados los anotan
+        triggers de la base de datos, así que incluyen los cambios hechos
+        fuera del bot.
+        """
+        raise NotImplementedError
+
+    def archivar(self, antes, limite):
+        """Traslada al archivo hasta `limite` eventos puntuales que empiezan antes de `antes`.
+
+        Los más antiguos primero y en una sola transacción. Devuelve un dict
+        con `id` y `guild_id` por evento trasladado; como salen de la tabla
+        de eventos, dejan lápida igual que un borrado.
+        """
+        raise NotImplementedError
+
+    def historial(self, guild_id, desde, hasta, texto, despues, limite):
+        """Página del archivo de un servidor, del más reciente al más antiguo.
+
+        `desde` y `hasta` (o None) acotan `starts_at`, `texto` filtra por
+        nombre o lugar y `despues` es la clave (starts_at, id) del último
+        evento de la página anterior.
+        """
+        raise NotImplementedError
+
+    def asignar_servidor(self, guild_id):
+        """Asigna `guild_id` a los eventos sin servidor y devuelve cuántos eran."""
+        raise NotImplementedError
+
+    def cargar_servidores(self):
+        raise NotImplementedError
+
+    def guardar_servidor(self, fila):
+        """Crea o sustituye la configuración de un servidor."""
+        raise NotImplementedError
+
+    def sin_momentos(self, despues_id, limite):
+        """Filas sin `starts_at` con id mayor que `despues_id`, pendientes de migrar."""
+        raise NotImplementedError
+
+    def guardar(self, evento):
+        raise NotImplementedError
+
+    def guardar_lote(self, eventos):
+        """Inserta varios eventos en una sola operación y devuelve las filas creadas."""
+        raise NotImplementedError
+
+    def actualizar(self, id, campos):
+        raise NotImplementedError
+
+    def eliminar(self, id):
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class BackendSupabase(BackendEventos):
+    """Tabla `eventos` en Supabase a través de PostgREST."""
+
+    nombre = "supabase"
+    TABLA = "eventos"
+    TABLA_SERVIDORES = "servidores"
+    TABLA_BORRADOS = "eventos_borrados"
+    TABLA_ARCHIVO = "eventos_archivo"
+
+    def __init__(self, supabase: Client):
+        # El cliente reutiliza su pool de conexiones HTTP entre hilos
+        self._supabase = supabase
+
+    def _tabla(self):
+        return self._supabase.table(self.TABLA)
+
+    def cargar(self, guild_id=None, desde=None):
+        consulta = self._tabla().select("*")
+        if guild_id is not None:
+            consulta = consulta.eq("guild_id", guild_id)
+        if desde is not None:
+            consulta = consulta.or_(f"starts_at.gte.{_utc(desde)},starts_at.is.null,rrule.not.is.null")
+        response = consulta.order("starts_at", desc=False).order("id", desc=False).execute()
+        return response.data or []
+
+    def obtener(self, id):
+        response = self._tabla().select("*").eq("id", id).execute()
+        return response.data[0] if response.data else None
+
+    def rango(self, guild_id, desde, hasta):
+        response = self._tabla().select("*") \
+            .eq("guild_id", guild_id) \
+            .gte("starts_at", _utc(desde)) \
+            .lt("starts_at", _utc(hasta)) \
+            .is_("rrule", "null") \
+            .order("starts_at", desc=False) \
+            .order("id", desc=False) \
+            .execute()
+        return response.data or []
+
+    def pagina(self, guild_id, desde, despues, limite):
+        consulta = self._tabla().select("*") \
+            .eq("guild_id", guild_id) \
+            .gte("starts_at", _utc(desde)) \
+            .is_("rrule", "null")
+        if despues is not None:
+            starts_at, id = despues
+            consulta = consulta.or_(
+                f"starts_at.gt.{_utc(starts_at)},"
+                f"and(starts_at.eq.{_utc(starts_at)},id.gt.{id})"
+            )
+        response = consulta.order("starts_at", desc=False) \
+            .order("id", desc=False) \
+            .limit(limite) \
+            .execute()
+        return response.data or []
+
+    def contar(self, guild_id, desde):
+        # HEAD con count=exact: solo devuelve el total, no las filas
+        response = self._tabla().select("id", count="exact", head=True) \
+            .eq("guild_id", guild_id) \
+            .gte("starts_at", _utc(desde)) \
+            .is_("rrule", "null") \
+            .execute()
+        return response.count or 0
+
+    def series(self, guild_id=None):
+        consulta = self._tabla().select("*").not_.is_("rrule", "null")
+        if guild_id is not None:
+            consulta = consulta.eq("guild_id", guild_id)
+        return consulta.order("id", desc=False).execute().data or []
+
+    def recordatorios(self, desde, hasta):
+        response = self._tabla().select("*") \
+            .gte("remind_at", _utc(desde)) \
+            .lt("remind_at", _utc(hasta)) \
+            .is_("rrule", "null") \
+            .order("remind_at", desc=False) \
+            .execute()
+        return response.data or []
+
+    def cambios(self, desde):
+        filas = self._tabla().select("*").gte("updated_at", _utc(desde)).execute().data or []
+        borrados = self._supabase.table(self.TABLA_BORRADOS).select("id, guild_id") \
+            .gte("borrado_en", _utc(desde)) \
+            .execute().data or []
+        return filas, borrados
+
+    def archivar(self, antes, limite):
+        # Función de esquema_supabase.sql: el traslado necesita una transacción
+        return self._supabase.rpc("archivar_eventos", {"antes": _utc(antes), "limite": limite}).execute().data or []
+
+    def historial(self, guild_id, desde, hasta, texto, despues, limite):
+        consulta = self._supabase.table(self.TABLA_ARCHIVO).select("*").eq("guild_id", guild_id)
+        if desde is not None:
+            consulta = consulta.gte("starts_at", _utc(desde))
+        if hasta is not None:
+            consulta = consulta.lt("starts_at", _utc(hasta))
+        if texto:
+            patron = _patron(texto)
+            consulta = consulta.or_(f"nombre.ilike.{patron},lugar.ilike.{patron}")
+        if despues is not None:
+            starts_at, id = despues
+            consulta = consulta.or_(
+                f"starts_at.lt.{_utc(starts_at)},"
+                f"and(starts_at.eq.{_utc(starts_at)},id.lt.{id})"
+            )
+        response = consulta.order("starts_at", desc=True) \
+            .order("id", desc=True) \
+            .limit(limite) \
+            .execute()
+        return response.data or []
+
+    def asignar_servidor(self, guild_id):
+        return len(self._tabla().update({"guild_id": guild_id}).is_("guild_id", "null").execute().data or [])
+
+    def cargar_servidores(self):
+        return self._supabase.table(self.TABLA_SERVIDORES).select("*").execute().data or []
+
+    def guardar_servidor(self, fila):
+        response = self._supabase.table(self.TABLA_SERVIDORES).upsert(fila).execute()
+        return response.data[0] if response.data else None
+
+    def sin_momentos(self, despues_id, limite):
+        response = self._tabla().select("*") \
+            .is_("starts_at", "null") \
+            .gt("id", despues_id) \
+            .order("id", desc=False) \
+            .limit(limite) \
+            .execute()
+        return response.data or []
+
+    def guardar(self, evento):
+        response = self._tabla().insert(evento).execute()
+        return response.data[0] if response.data else None
+
+    def guardar_lote(self, eventos):
+        # PostgREST inserta la lista entera en una sola petición
+        return self._tabla().insert(eventos, default_to_null=True).execute().data or []
+
+    def actualizar(self, id, campos):
+        return self._tabla().update(campos).eq("id", id).execute().data
+
+    def eliminar(self, id):
+        return self._tabla().delete().eq("id", id).execute().data
+
+
+class BackendSQLite(BackendEventos):
+    """Tabla `eventos` en un fichero SQLite local.
+
+    Usa una conexión por hilo del pool con WAL, de modo que las lecturas no
+    esperan a las escrituras. Las sentencias son constantes con parámetros y
+    sqlite3 las reutiliza compiladas desde su caché por conexión.
+    """
+
+    nombre = "sqlite"
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS eventos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            fecha TEXT NOT NULL,
+            hora TEXT NOT NULL,
+            lugar TEXT NOT NULL,
+            recordatorio TEXT
+        );
+        CREATE TABLE IF NOT EXISTS servidores (
+            guild_id INTEGER PRIMARY KEY,
+            canal_id INTEGER,
+            zona TEXT NOT NULL,
+            resumen_dia INTEGER,
+            resumen_hora INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS eventos_borrados (
+            id INTEGER PRIMARY KEY,
+            guild_id INTEGER,
+            borrado_en REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS eventos_archivo (
+            id INTEGER PRIMARY KEY,
+            archivado_en REAL NOT NULL
+        );
+    """
+
+    # Columnas añadidas después de crear la tabla; se agregan al abrir bases antiguas
+    COLUMNAS_NUEVAS = {
+        "starts_at": "TEXT",
+        "remind_at": "TEXT",
+        "rrule": "TEXT",
+        "excepciones": "TEXT",
+        "guild_id": "INTEGER",
+        "updated_at": "REAL",
+        "duracion": "TEXT",
+    }
+
+    INDICES = """
+        DROP INDEX IF EXISTS eventos_fecha_hora;
+        DROP INDEX IF EXISTS eventos_starts_at;
+        CREATE INDEX IF NOT EXISTS eventos_servidor_starts_at ON eventos (guild_id, starts_at, id);
+        CREATE INDEX IF NOT EXISTS eventos_remind_at ON eventos (remind_at) WHERE remind_at IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS eventos_updated_at ON eventos (updated_at);
+        CREATE INDEX IF NOT EXISTS eventos_borrados_borrado_en ON eventos_borrados (borrado_en);
+        CREATE INDEX IF NOT EXISTS eventos_puntuales_starts_at ON eventos (starts_at) WHERE rrule IS NULL;
+        CREATE INDEX IF NOT EXISTS eventos_archivo_servidor_starts_at ON eventos_archivo (guild_id, starts_at, id);
+    """
+
+    # Marcas para la sincronización incremental, en segundos Unix: cada alta o
+    # modificación anota `updated_at` y cada baja deja una lápida, durante 30 días.
+    # Las escrituras del bot ponen `updated_at` en la propia sentencia para que
+    # RETURNING lo devuelva (no ve lo que cambian los triggers AFTER); los
+    # triggers solo lo anotan en las escrituras externas que no lo hacen.
+    AHORA = "((julianday('now') - 2440587.5) * 86400.0)"
+    TRIGGERS = f"""
+        DROP TRIGGER IF EXISTS eventos_alta;
+        DROP TRIGGER IF EXISTS eventos_cambio;
+        CREATE TRIGGER eventos_alta AFTER INSERT ON eventos WHEN NEW.updated_at IS NULL BEGIN
+            UPDATE eventos SET updated_at = {AHORA} WHERE id = NEW.id;
+        END;
+        CREATE TRIGGER eventos_cambio AFTER UPDATE ON eventos WHEN NEW.updated_at IS OLD.updated_at BEGIN
+            UPDATE eventos SET updated_at = {AHORA} WHERE id = NEW.id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS eventos_baja AFTER DELETE ON eventos BEGIN
+            INSERT OR REPLACE INTO eventos_borrados (id, guild_id, borrado_en) VALUES (OLD.id, OLD.guild_id, {AHORA});
+            DELETE FROM eventos_borrados WHERE borrado_en < {AHORA} - 30 * 86400;
+        END;
+    """
+
+    SQL_CARGAR = "SELECT * FROM eventos ORDER BY starts_at, id"
+    SQL_CARGAR_SERVIDOR = "SELECT * FROM eventos WHERE guild_id = ? ORDER BY starts_at, id"
+    SQL_CARGAR_RECIENTES = (
+        "SELECT * FROM eventos WHERE guild_id = ? AND (starts_at >= ? OR starts_at IS NULL OR rrule IS NOT NULL) "
+        "ORDER BY starts_at, id"
+    )
+    SQL_OBTENER = "SELECT * FROM eventos WHERE id = ?"
+    SQL_RANGO = (
+        "SELECT * FROM eventos WHERE guild_id = ? AND starts_at >= ? AND starts_at < ? AND rrule IS NULL "
+        "ORDER BY starts_at, id"
+    )
+    SQL_PRIMERA_PAGINA = (
+        "SELECT * FROM eventos WHERE guild_id = ? AND starts_at >= ? AND rrule IS NULL "
+        "ORDER BY starts_at, id LIMIT ?"
+    )
+    SQL_PAGINA = (
+        "SELECT * FROM eventos WHERE guild_id = ? AND starts_at >= ? AND (starts_at, id) > (?, ?) AND rrule IS NULL "
+        "ORDER BY starts_at, id LIMIT ?"
+    )
+    SQL_CONTAR = "SELECT COUNT(*) FROM eventos WHERE guild_id = ? AND starts_at >= ? AND rrule IS NULL"
+    SQL_SERIES = "SELECT * FROM eventos WHERE rrule IS NOT NULL ORDER BY id"
+    SQL_SERIES_SERVIDOR = "SELECT * FROM eventos WHERE guild_id = ? AND rrule IS NOT NULL ORDER BY id"
+    SQL_RECORDATORIOS = (
+        "SELECT * FROM eventos WHERE remind_at >= ? AND remind_at < ? AND rrule IS NULL ORDER BY remind_at"
+    )
+    SQL_CAMBIOS = "SELECT * FROM eventos WHERE updated_at >= ?"
+    SQL_BORRADOS = "SELECT id, guild_id FROM eventos_borrados WHERE borrado_en >= ?"
+    SQL_ASIGNAR_SERVIDOR = "UPDATE eventos SET guild_id = ? WHERE guild_id IS NULL"
+    SQL_CARGAR_SERVIDORES = "SELECT * FROM servidores"
+    SQL_GUARDAR_SERVIDOR = (
+        f"INSERT OR REPLACE INTO servidores ({', '.join(COLUMNAS_SERVIDOR)}) "
+        f"VALUES ({', '.join('?' * len(COLUMNAS_SERVIDOR))}) RETURNING *"
+    )
+    SQL_SIN_MOMENTOS = "SELECT * FROM eventos WHERE starts_at IS NULL AND id > ? ORDER BY id LIMIT ?"
+    SQL_ELIMINAR = "DELETE FROM eventos WHERE id = ? RETURNING *"
+    SQL_ARCHIVABLES = "SELECT id FROM eventos WHERE starts_at < ? AND rrule IS NULL ORDER BY starts_at, id LIMIT ?"
+    SQL_ARCHIVAR = (
+        f"INSERT OR IGNORE INTO eventos_archivo (id, {', '.join(COLUMNAS)}, archivado_en) "
+        f"SELECT id, {', '.join(COLUMNAS)}, {AHORA} FROM eventos WHERE id IN (SELECT value FROM json_each(?))"
+    )
+    SQL_ARCHIVADOS = "DELETE FROM eventos WHERE id IN (SELECT value FROM json_each(?)) RETURNING id, guild_id"
+    # Sin filtro de texto el parámetro es NULL; sin `hasta` ni cursor, el cursor inicial es (máximo, 0)
+    SQL_HISTORIAL = (
+        "SELECT * FROM eventos_archivo WHERE guild_id = ? AND starts_at >= ? AND (starts_at, id) < (?, ?) "
+        "AND (? IS NULL OR nombre LIKE ? OR lugar LIKE ?) ORDER BY starts_at DESC, id DESC LIMIT ?"
+    )
+
+    def __init__(self, ruta="eventos.db"):
+        self._ruta = ruta
+        self._local = threading.local()
+        self._conexiones = []
+        self._lock = threading.Lock()
+        with self._conexion() as conexion:
+            conexion.executescript(self.ESQUEMA)
+            existentes = {fila["name"] for fila in conexion.execute("PRAGMA table_info(eventos)")}
+            for columna, tipo in self.COLUMNAS_NUEVAS.items():
+                if columna not in existentes:
+                    conexion.execute(f"ALTER TABLE eventos ADD COLUMN {columna} {tipo}")
+            # El archivo tiene las mismas columnas que la tabla de eventos
+            archivo = {fila["name"] for fila in conexion.execute("PRAGMA table_info(eventos_archivo)")}
+            for fila in conexion.execute("PRAGMA table_info(eventos)").fetchall():
+                if fila["name"] not in archivo:
+                    conexion.execute(f"ALTER TABLE eventos_archivo ADD COLUMN {fila['name']} {fila['type']}")
+            conexion.executescript(self.INDICES)
+            conexion.executescript(self.TRIGGERS)
+
+    def _conexion(self):
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self._ruta, cached_statements=256, check_same_thread=False)
+            conexion.row_factory = sqlite3.Row
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+            with self._lock:
+                self._conexiones.append(conexion)
+        return conexion
+
+    def _consultar(self, sql, parametros=()):
+        return [dict(fila) for fila in self._conexion().execute(sql, parametros)]
+
+    def cargar(self, guild_id=None, desde=None):
+        if guild_id is None:
+            return self._consultar(self.SQL_CARGAR)
+        if desde is None:
+            return self._consultar(self.SQL_CARGAR_SERVIDOR, (guild_id,))
+        return self._consultar(self.SQL_CARGAR_RECIENTES, (guild_id, _utc(desde)))
+
+    def obtener(self, id):
+        filas = self._consultar(self.SQL_OBTENER, (id,))
+        return filas[0] if filas else None
+
+    def rango(self, guild_id, desde, hasta):
+        return self._consultar(self.SQL_RANGO, (guild_id, _utc(desde), _utc(hasta)))
+
+    def pagina(self, guild_id, desde, despues, limite):
+        if despues is None:
+            return self._consultar(self.SQL_PRIMERA_PAGINA, (guild_id, _utc(desde), limite))
+        starts_at, id = despues
+        return self._consultar(self.SQL_PAGINA, (guild_id, _utc(desde), _utc(starts_at), id, limite))
+
+    def contar(self, guild_id, desde):
+        return self._conexion().execute(self.SQL_CONTAR, (guild_id, _utc(desde))).fetchone()[0]
+
+    def series(self, guild_id=None):
+        if guild_id is None:
+            return self._consultar(self.SQL_SERIES)
+        return self._consultar(self.SQL_SERIES_SERVIDOR, (guild_id,))
+
+    def recordatorios(self, desde, hasta):
+        return self._consultar(self.SQL_RECORDATORIOS, (_utc(desde), _utc(hasta)))
+
+    def cambios(self, desde):
+        instante = desde.timestamp()
+        return self._consultar(self.SQL_CAMBIOS, (instante,)), self._consultar(self.SQL_BORRADOS, (instante,))
+
+    def archivar(self, antes, limite):
+        with self._conexion() as conexion:
+            ids = json.dumps([fila[0] for fila in conexion.execute(self.SQL_ARCHIVABLES, (_utc(antes), limite))])
+            conexion.execute(self.SQL_ARCHIVAR, (ids,))
+            return [dict(fila) for fila in conexion.execute(self.SQL_ARCHIVADOS, (ids,)).fetchall()]
+
+    def historial(self, guild_id, desde, hasta, texto, despues, limite):
+        starts_at, id = despues if despues is not None else (hasta, 0)
+        patron = _patron(texto) if texto else None
+        return self._consultar(self.SQL_HISTORIAL, (
+            guild_id,
+            _utc(desde) if desde is not None else "",
+            _utc(starts_at) if starts_at is not None else "\uffff",
+            id, patron, patron, patron, limite,
+        ))
+
+    def asignar_servidor(self, guild_id):
+        with self._conexion() as conexion:
+            return conexion.execute(self.SQL_ASIGNAR_SERVIDOR, (guild_id,)).rowcount
+
+    def cargar_servidores(self):
+        return self._consultar(self.SQL_CARGAR_SERVIDORES)
+
+    def guardar_servidor(self, fila):
+        with self._conexion() as conexion:
+            guardada = conexion.execute(self.SQL_GUARDAR_SERVIDOR, [fila.get(c) for c in COLUMNAS_SERVIDOR]).fetchone()
+        return dict(guardada) if guardada else None
+
+    def sin_momentos(self, despues_id, limite):
+        return self._consultar(self.SQL_SIN_MOMENTOS, (despues_id, limite))
+
+    def _columnas(self, campos):
+        desconocidas = set(campos) - set(COLUMNAS)
+        if desconocidas:
+            raise ValueError(f"Columnas desconocidas: {', '.join(sorted(desconocidas))}")
+        return list(campos)
+
+    def guardar(self, evento):
+        columnas = self._columnas(evento)
+        sql = (
+            f"INSERT INTO eventos ({', '.join(columnas)}, updated_at) "
+            f"VALUES ({', '.join('?' * len(columnas))}, {self.AHORA}) RETURNING *"
+        )
+        with self._conexion() as conexion:
+            fila = conexion.execute(sql, [evento[c] for c in columnas]).fetchone()
+        return dict(fila) if fila else None
+
+    def guardar_lote(self, eventos):
+        columnas = self._columnas({c for e in eventos for c in e})
+        fila = f"({', '.join('?' * len(columnas))}, {self.AHORA})"
+        sql = f"INSERT INTO eventos ({', '.join(columnas)}, updated_at) VALUES {', '.join([fila] * len(eventos))} RETURNING *"
+        parametros = [e.get(c) for e in eventos for c in columnas]
+        with self._conexion() as conexion:
+            filas = conexion.execute(sql, parametros).fetchall()
+        return [dict(f) for f in filas]
+
+    def actualizar(self, id, campos):
+        columnas = self._columnas(campos)
+        sql = f"UPDATE eventos SET {', '.join(f'{c} = ?' for c in columnas)}, updated_at = {self.AHORA} WHERE id = ? RETURNING *"
+        with self._conexion() as conexion:
+            filas = conexion.execute(sql, [campos[c] for c in columnas] + [id]).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def eliminar(self, id):
+        with self._conexion() as conexion:
+            filas = conexion.execute(self.SQL_ELIMINAR, (id,)).fetchall()
+        return [dict(fila) for fila in filas]
+
+    def cerrar(self):
+        with self._lock:
+            for conexion in self._conexiones:
+                conexion.close()
+            self._conexiones.clear()
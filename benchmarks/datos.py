@@ -0,0 +1,49 @@
+"""Generador de conjuntos de eventos sintéticos para las pruebas de carga."""
+import random
+from datetime import date, datetime, timedelta
+
+from recurrencia import Recurrencia
+from tiempo import ZONA, calcular_momentos, serializar_evento
+
+
+NOMBRES = ["Reunión", "Partido", "Ensayo", "Cena", "Taller", "Charla", "Torneo", "Concierto", "Clase", "Excursión"]
+LUGARES = ["Ourense", "Vigo", "Santiago", "A Coruña", "Lugo", "Pontevedra", "Online"]
+RECORDATORIOS = ["15m", "30m", "1h", "2h", "1d", "1d12h"]
+
+
+def generar_eventos(cantidad, servidores, dias=730, proporcion_recordatorio=0.5, proporcion_series=0.001, semilla=1):
+    """Filas listas para el almacenamiento, repartidas entre hoy y `dias` días después.
+
+    Los eventos se reparten por igual entre los servidores; una fracción
+    lleva recordatorio y otra es una serie semanal.
+    """
+    azar = random.Random(semilla)
+    hoy = datetime.now(ZONA).date()
+    for id in range(1, cantidad + 1):
+        dia = hoy + timedelta(days=azar.randrange(dias))
+        evento = {
+            "id": id,
+            "guild_id": servidores[id % len(servidores)],
+            "nombre": f"{azar.choice(NOMBRES)} {id}",
+            "fecha": dia.isoformat(),
+            "hora": f"{azar.randrange(8, 23):02d}:{azar.choice((0, 15, 30, 45)):02d}",
+            "lugar": azar.choice(LUGARES),
+            "recordatorio": azar.choice(RECORDATORIOS) if azar.random() < proporcion_recordatorio else None,
+            "rrule": None,
+            "excepciones": None,
+        }
+        if azar.random() < proporcion_series:
+            evento["rrule"] = str(Recurrencia("WEEKLY", cuenta=azar.randrange(4, 52)))
+        evento.update(calcular_momentos(evento))
+        yield serializar_evento(evento)
+
+
+def csv_importacion(filas, semilla=2):
+    """Contenido de un CSV de /importar con `filas` eventos válidos."""
+    azar = random.Random(semilla)
+    hoy = date.today()
+    lineas = ["nombre,fecha,hora,lugar,recordatorio"]
+    for i in range(filas):
+        dia = hoy + timedelta(days=azar.randrange(1, 365))
+        lineas.append(f"Importado {i},{dia:%d-%m-%Y},{azar.randrange(8, 23):02d}:00,{azar.choice(LUGARES)},1h")
+    return ("\n".join(lineas) + "\n").encode("utf-8")
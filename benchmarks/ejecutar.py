@@ -0,0 +1,277 @@
+"""Pruebas de carga del bot con Supabase y Discord simulados.
+
+Uso: python benchmarks/ejecutar.py [--tamanos 1000,10000,100000] [--latencia-ms 20]
+                                   [--servidores 1] [--concurrencia 10]
+                                   [--salida bench_output.json]
+
+Cada tamaño de la tabla de eventos se mide en un proceso aparte, con `main`
+importado desde cero sobre un `SupabaseFalso` precargado. Se mide:
+
+- latencia p50/p99 de cada orden de barra con `--concurrencia` peticiones a la vez
+- duración de `on_ready` (carga de eventos y programación de recordatorios)
+  y de la primera carga del almacén de un servidor
+- memoria del planificador por recordatorio pendiente
+- coste de `resumen_semanal`
+
+El resultado es un JSON con una entrada por tamaño, pensado para guardarlo y
+compararlo entre versiones.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from datos import csv_importacion, generar_eventos  # noqa: E402
+from falso_discord import AdjuntoFalso, CanalFalso, InteraccionFalsa, ServidorFalso  # noqa: E402
+from falso_supabase import SupabaseFalso  # noqa: E402
+
+
+# Repeticiones por orden; las que recorren todo el servidor se repiten menos
+REPETICIONES = {
+    "crear_evento": 200,
+    "modificar_evento": 200,
+    "eliminar_evento": 100,
+    "omitir": 50,
+    "listar_eventos": 200,
+    "semana": 200,
+    "mes": 200,
+    "configurar": 50,
+    "importar": 10,
+    "exportar": 3,
+    "refrescar": 3,
+}
+# Dentro de la ráfaga que admite el despachador en un canal, para no medir su espera
+REPETICIONES_RESUMEN = 5
+
+
+def _percentil(ordenadas, p):
+    return ordenadas[min(len(ordenadas) - 1, round(p / 100 * (len(ordenadas) - 1)))]
+
+
+def resumen(segundos):
+    ordenadas = sorted(segundos)
+    return {
+        "n": len(ordenadas),
+        "p50_ms": round(_percentil(ordenadas, 50) * 1000, 3),
+        "p99_ms": round(_percentil(ordenadas, 99) * 1000, 3),
+        "max_ms": round(ordenadas[-1] * 1000, 3),
+    }
+
+
+def preparar(directorio, tamano, servidores, latencia):
+    """Importa `main` sobre un Supabase falso con `tamano` eventos y un Discord falso."""
+    os.environ.update({
+        "TOKEN": "benchmark",
+        "SUPABASE_URL": "https://benchmark.invalid",
+        "SUPABASE_KEY": "benchmark",
+        "ALMACENAMIENTO": "supabase",
+        "ESTADO_DB": os.path.join(directorio, "estado.db"),
+        "CACHE_MAX_EDAD": "86400",
+    })
+    for variable in ("GUILD_ID", "CHANNEL_ID", "SHARDS", "SHARD_IDS"):
+        os.environ.pop(variable, None)
+
+    falso = SupabaseFalso(latencia)
+    falso.tablas["eventos"].cargar(generar_eventos(tamano, servidores))
+    falso.tablas["servidores"].cargar(
+        {"guild_id": g, "canal_id": g + 1, "zona": "Europe/Madrid", "resumen_dia": 6, "resumen_hora": 20}
+        for g in servidores
+    )
+
+    import almacenamiento
+    almacenamiento.create_client = lambda url, key: falso
+    # main escribe bot.log en el directorio actual
+    os.chdir(directorio)
+    import main
+    logging.getLogger().setLevel(logging.WARNING)
+
+    canales = {g + 1: CanalFalso(g + 1) for g in servidores}
+    guilds = {g: ServidorFalso(g, canales[g + 1]) for g in servidores}
+    main.client.get_channel = canales.get
+    main.client.get_guild = guilds.get
+
+    async def sincronizar(guild=None):
+        return []
+    main.tree.sync = sincronizar
+    return main, falso
+
+
+async def medir(nombre, orden, repeticiones, concurrencia, guild_id):
+    tiempos = []
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def una(i):
+        async with semaforo:
+            interaccion = InteraccionFalsa(guild_id, guild_id + 1)
+            inicio = time.perf_counter()
+            await orden(interaccion, i)
+            tiempos.append(time.perf_counter() - inicio)
+
+    await asyncio.gather(*(una(i) for i in range(repeticiones)))
+    return resumen(tiempos)
+
+
+def memoria_por_recordatorio(eventos):
+    from programador import ProgramadorRecordatorios
+    programador = ProgramadorRecordatorios(None)
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    for evento in eventos:
+        programador.programar(evento["id"], evento["remind_at"], evento)
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return round((despues - antes) / len(eventos), 1) if eventos else None
+
+
+async def medir_tamano(tamano, servidores, latencia, concurrencia):
+    directorio = tempfile.mkdtemp(prefix="bench-")
+    main, falso = preparar(directorio, tamano, servidores, latencia)
+    from recurrencia import ocurrencias
+
+    resultado = {"eventos": tamano, "servidores": len(servidores)}
+
+    inicio = time.perf_counter()
+    await main.on_ready()
+    resultado["on_ready_s"] = round(time.perf_counter() - inicio, 3)
+    resultado["recordatorios_pendientes"] = len(main.programador)
+
+    guild_id = servidores[0]
+    inicio = time.perf_counter()
+    await main.almacenes.de(guild_id).refrescar()
+    resultado["carga_almacen_s"] = round(time.perf_counter() - inicio, 3)
+
+    ahora = datetime.now(timezone.utc)
+    eventos = await main.repositorio.cargar()
+    con_recordatorio = [e for e in eventos if e["remind_at"] is not None and e["remind_at"] > ahora]
+    resultado["memoria_por_recordatorio_bytes"] = memoria_por_recordatorio(con_recordatorio)
+
+    del eventos, con_recordatorio
+    almacen = main.almacenes.de(guild_id)
+    ids = [e["id"] for e in await almacen.todos() if not e.get("rrule")]
+    series = await almacen.series()
+    hoy = datetime.now(main.servidores.obtener(guild_id).zona_info)
+
+    async def crear(interaccion, i):
+        fecha = (hoy + timedelta(days=1 + i % 300)).strftime("%d-%m-%Y")
+        await main.crear_evento.callback(interaccion, f"Bench {i}", fecha, "18:30", "Ourense", "1h")
+
+    async def modificar(interaccion, i):
+        await main.modificar_evento.callback(interaccion, ids[i * 7919 % len(ids)], "lugar", "Vigo")
+
+    async def eliminar(interaccion, i):
+        await main.eliminar_evento.callback(interaccion, creados[i % len(creados)])
+
+    async def omitir(interaccion, i):
+        serie = series[i % len(series)]
+        siguientes = ocurrencias(serie, hoy)
+        for _ in range(i // len(series)):
+            next(siguientes, None)
+        ocurrencia = next(siguientes, None)
+        fecha = ocurrencia["starts_at"] if ocurrencia else hoy
+        await main.omitir.callback(interaccion, serie["id"], fecha.strftime("%d-%m-%Y"))
+
+    async def configurar(interaccion, i):
+        await main.configurar.callback(interaccion, None, None, None, i % 24)
+
+    async def importar(interaccion, i):
+        await main.importar.callback(interaccion, AdjuntoFalso("eventos.csv", csv_importacion(100, semilla=i)))
+
+    comandos = {
+        "crear_evento": crear,
+        "modificar_evento": modificar,
+        "listar_eventos": lambda interaccion, i: main.listar_eventos.callback(interaccion),
+        "semana": lambda interaccion, i: main.semana.callback(interaccion, None),
+        "mes": lambda interaccion, i: main.mes.callback(interaccion, None),
+        "omitir": omitir,
+        "eliminar_evento": eliminar,
+        "configurar": configurar,
+        "importar": importar,
+        "exportar": lambda interaccion, i: main.exportar.callback(interaccion, "csv"),
+        "refrescar": lambda interaccion, i: main.refrescar.callback(interaccion),
+    }
+    resultado["comandos"] = {}
+    creados = []
+    for nombre, orden in comandos.items():
+        if nombre == "omitir" and not series:
+            continue
+        if nombre == "eliminar_evento":
+            creados = [f["id"] for f in falso.tablas["eventos"].filas.values() if f["nombre"].startswith("Bench ")]
+        resultado["comandos"][nombre] = await medir(nombre, orden, REPETICIONES[nombre], concurrencia, guild_id)
+
+    tiempos = []
+    for _ in range(REPETICIONES_RESUMEN):
+        inicio = time.perf_counter()
+        await main.resumen_semanal(guild_id, datetime.now(timezone.utc))
+        tiempos.append(time.perf_counter() - inicio)
+    resultado["resumen_semanal"] = resumen(tiempos)
+
+    main.programador.detener()
+    main.despachador.detener()
+    return resultado
+
+
+def ejecutar_tamano(args, tamano):
+    """Mide un tamaño en un proceso nuevo para que no arrastre estado del anterior."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as parcial:
+        ruta = parcial.name
+    comando = [
+        sys.executable, os.path.abspath(__file__),
+        "--tamano", str(tamano),
+        "--latencia-ms", str(args.latencia_ms),
+        "--servidores", str(args.servidores),
+        "--concurrencia", str(args.concurrencia),
+        "--salida", ruta,
+    ]
+    inicio = time.perf_counter()
+    subprocess.run(comando, check=True, stdout=subprocess.DEVNULL)
+    with open(ruta, encoding="utf-8") as f:
+        resultado = json.load(f)
+    os.unlink(ruta)
+    print(f"{tamano} eventos medidos en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanos", default="1000,10000,100000", help="Tamaños de la tabla separados por comas")
+    parser.add_argument("--tamano", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--latencia-ms", type=float, default=20, help="Latencia simulada de cada consulta")
+    parser.add_argument("--servidores", type=int, default=1, help="Servidores entre los que se reparten los eventos")
+    parser.add_argument("--concurrencia", type=int, default=10, help="Órdenes en curso a la vez")
+    parser.add_argument("--salida", default="bench_output.json", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    if args.tamano is not None:
+        servidores = [1000 + i for i in range(args.servidores)]
+        resultado = asyncio.run(medir_tamano(args.tamano, servidores, args.latencia_ms / 1000, args.concurrencia))
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f)
+        sys.exit(0)
+
+    salida = os.path.abspath(args.salida)
+    informe = {
+        "generado": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "latencia_ms": args.latencia_ms,
+            "servidores": args.servidores,
+            "concurrencia": args.concurrencia,
+            "repeticiones": REPETICIONES,
+        },
+        "resultados": [ejecutar_tamano(args, int(t)) for t in args.tamanos.split(",")],
+    }
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {salida}", file=sys.stderr)
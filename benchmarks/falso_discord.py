@@ -0,0 +1,81 @@
+"""Sustitutos mínimos de los objetos de discord.py que tocan los comandos.
+
+Las respuestas no salen a ningún sitio: solo se cuentan, para que las
+mediciones reflejen el trabajo del bot y no la red.
+"""
+import itertools
+
+
+_ids_mensaje = itertools.count(1)
+
+
+class MensajeFalso:
+    def __init__(self, canal, contenido):
+        self.id = next(_ids_mensaje)
+        self.channel = canal
+        self.contenido = contenido
+
+
+class CanalFalso:
+    def __init__(self, id):
+        self.id = id
+        self.enviados = 0
+
+    async def send(self, content=None, **kwargs):
+        self.enviados += 1
+        return MensajeFalso(self, content)
+
+
+class ServidorFalso:
+    def __init__(self, id, canal):
+        self.id = id
+        self.system_channel = canal
+
+
+class UsuarioFalso:
+    def __init__(self, id):
+        self.id = id
+
+
+class RespuestaFalsa:
+    def __init__(self):
+        self._hecha = False
+
+    def is_done(self):
+        return self._hecha
+
+    async def send_message(self, content=None, **kwargs):
+        self._hecha = True
+
+    async def defer(self, **kwargs):
+        self._hecha = True
+
+    async def edit_message(self, **kwargs):
+        self._hecha = True
+
+
+class SeguimientoFalso:
+    async def send(self, content=None, **kwargs):
+        return MensajeFalso(None, content)
+
+
+class InteraccionFalsa:
+    """Interacción de una orden de barra con lo que usan los manejadores de `main`."""
+
+    def __init__(self, guild_id, channel_id, user_id=1):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.user = UsuarioFalso(user_id)
+        self.response = RespuestaFalsa()
+        self.followup = SeguimientoFalso()
+
+
+class AdjuntoFalso:
+    def __init__(self, filename, contenido, content_type=None):
+        self.filename = filename
+        self.content_type = content_type
+        self._contenido = contenido
+        self.size = len(contenido)
+
+    async def read(self):
+        return self._contenido
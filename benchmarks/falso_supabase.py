@@ -0,0 +1,263 @@
+"""Sustituto en proceso del cliente de Supabase para las pruebas de carga.
+
+Implementa solo la parte de la API de tablas de postgrest que usa
+`almacenamiento.BackendSupabase`. Las filas viven en memoria y cada
+`execute()` duerme `latencia` segundos para simular el viaje de red; las
+consultas se resuelven recorriendo la tabla, como haría Postgres sin índice.
+Imita también los triggers de `esquema_supabase.sql`: cada alta o
+modificación anota `updated_at` y cada baja deja una lápida en
+`eventos_borrados`; y la función `archivar_eventos`.
+"""
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class Respuesta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _valor(columna, texto):
+    # Los filtros de PostgREST llegan como texto; los ids se comparan como números
+    return int(texto) if columna in ("id", "guild_id") else texto
+
+
+_OPERADORES = {
+    "eq": lambda a, b: a is not None and a == b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+}
+
+
+def _filtro_or(expresion):
+    """Traduce `a.gt.x,and(a.eq.x,id.gt.n)` (el cursor de las páginas) a un predicado."""
+    alternativas = []
+    for parte in _partir(expresion):
+        if parte.startswith("and(") and parte.endswith(")"):
+            condiciones = [_condicion(c) for c in _partir(parte[4:-1])]
+            alternativas.append(lambda fila, cs=condiciones: all(c(fila) for c in cs))
+        else:
+            alternativas.append(_condicion(parte))
+    return lambda fila: any(a(fila) for a in alternativas)
+
+
+def _partir(texto):
+    partes, profundidad, actual = [], 0, ""
+    for caracter in texto:
+        if caracter == "," and profundidad == 0:
+            partes.append(actual)
+            actual = ""
+            continue
+        profundidad += caracter == "("
+        profundidad -= caracter == ")"
+        actual += caracter
+    partes.append(actual)
+    return partes
+
+
+def _condicion(texto):
+    columna, operador, valor = texto.split(".", 2)
+    if operador == "not":
+        # columna.not.is.null
+        return lambda fila: fila.get(columna) is not None
+    if operador == "is":
+        return lambda fila: fila.get(columna) is None
+    valor = _valor(columna, valor)
+    return lambda fila: _OPERADORES[operador](fila.get(columna), valor)
+
+
+class Consulta:
+    def __init__(self, tabla, operacion, datos=None, count=None, head=False):
+        self._tabla = tabla
+        self._operacion = operacion
+        self._datos = datos
+        self._count = count
+        self._head = head
+        self._filtros = []
+        self._orden = []
+        self._limite = None
+        self._negar = False
+
+    def _filtrar(self, predicado):
+        if self._negar:
+            self._negar = False
+            self._filtros.append(lambda fila: not predicado(fila))
+        else:
+            self._filtros.append(predicado)
+        return self
+
+    @property
+    def not_(self):
+        self._negar = True
+        return self
+
+    def eq(self, columna, valor):
+        return self._filtrar(lambda fila: fila.get(columna) == valor)
+
+    def gt(self, columna, valor):
+        return self._filtrar(lambda fila: _OPERADORES["gt"](fila.get(columna), valor))
+
+    def gte(self, columna, valor):
+        return self._filtrar(lambda fila: _OPERADORES["gte"](fila.get(columna), valor))
+
+    def lt(self, columna, valor):
+        return self._filtrar(lambda fila: _OPERADORES["lt"](fila.get(columna), valor))
+
+    def is_(self, columna, valor):
+        return self._filtrar(lambda fila: fila.get(columna) is None)
+
+    def or_(self, expresion):
+        return self._filtrar(_filtro_or(expresion))
+
+    def order(self, columna, desc=False):
+        self._orden.append((columna, desc))
+        return self
+
+    def limit(self, limite):
+        self._limite = limite
+        return self
+
+    def _coinciden(self, filas):
+        return [fila for fila in filas if all(f(fila) for f in self._filtros)]
+
+    def execute(self):
+        time.sleep(self._tabla.latencia)
+        with self._tabla.lock:
+            return getattr(self, f"_{self._operacion}")()
+
+    def _select(self):
+        filas = self._coinciden(self._tabla.filas.values())
+        for columna, desc in reversed(self._orden):
+            filas.sort(key=lambda fila: (fila.get(columna) is None, fila.get(columna)), reverse=desc)
+        total = len(filas) if self._count else None
+        if self._head:
+            return Respuesta([], total)
+        if self._limite is not None:
+            filas = filas[:self._limite]
+        return Respuesta([dict(fila) for fila in filas], total)
+
+    def _insert(self):
+        filas = self._datos if isinstance(self._datos, list) else [self._datos]
+        insertadas = []
+        for fila in filas:
+            fila = dict(fila)
+            fila.setdefault(self._tabla.clave, self._tabla.siguiente_id())
+            self._tabla.marcar(fila)
+            self._tabla.filas[fila[self._tabla.clave]] = fila
+            insertadas.append(dict(fila))
+        return Respuesta(insertadas)
+
+    def _upsert(self):
+        return self._insert()
+
+    def _update(self):
+        actualizadas = self._coinciden(self._tabla.filas.values())
+        for fila in actualizadas:
+            fila.update(self._datos)
+            self._tabla.marcar(fila)
+        return Respuesta([dict(fila) for fila in actualizadas])
+
+    def _delete(self):
+        borradas = self._coinciden(self._tabla.filas.values())
+        for fila in borradas:
+            del self._tabla.filas[fila[self._tabla.clave]]
+            if self._tabla.borrados is not None:
+                self._tabla.borrados.filas[fila["id"]] = {
+                    "id": fila["id"], "guild_id": fila.get("guild_id"), "borrado_en": _ahora()}
+        return Respuesta([dict(fila) for fila in borradas])
+
+
+def _ahora():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Tabla:
+    def __init__(self, latencia, clave="id", borrados=None):
+        self.latencia = latencia
+        self.clave = clave
+        # Tabla de lápidas si esta lleva marcas de modificación
+        self.borrados = borrados
+        self.filas = {}
+        self.lock = threading.Lock()
+        self._ultimo_id = 0
+
+    def marcar(self, fila):
+        if self.borrados is not None:
+            fila["updated_at"] = _ahora()
+
+    def siguiente_id(self):
+        self._ultimo_id += 1
+        return self._ultimo_id
+
+    def cargar(self, filas):
+        for fila in filas:
+            self.filas[fila[self.clave]] = fila
+            if self.clave == "id":
+                self._ultimo_id = max(self._ultimo_id, fila["id"])
+
+
+class ConstructorTabla:
+    def __init__(self, tabla):
+        self._tabla = tabla
+
+    def select(self, columnas="*", count=None, head=False):
+        return Consulta(self._tabla, "select", count=count, head=head)
+
+    def insert(self, datos, default_to_null=False):
+        return Consulta(self._tabla, "insert", datos)
+
+    def upsert(self, datos):
+        return Consulta(self._tabla, "upsert", datos)
+
+    def update(self, datos):
+        return Consulta(self._tabla, "update", datos)
+
+    def delete(self):
+        return Consulta(self._tabla, "delete")
+
+
+class Llamada:
+    def __init__(self, cliente, funcion, parametros):
+        self._cliente = cliente
+        self._funcion = funcion
+        self._parametros = parametros
+
+    def execute(self):
+        return getattr(self._cliente, f"_{self._funcion}")(**self._parametros)
+
+
+class SupabaseFalso:
+    """Cliente con las tablas `eventos`, `eventos_borrados`, `eventos_archivo` y `servidores` en memoria."""
+
+    def __init__(self, latencia=0.0):
+        borrados = Tabla(latencia)
+        self.latencia = latencia
+        self.tablas = {
+            "eventos": Tabla(latencia, borrados=borrados),
+            "servidores": Tabla(latencia, clave="guild_id"),
+            "eventos_borrados": borrados,
+            "eventos_archivo": Tabla(latencia),
+        }
+
+    def table(self, nombre):
+        return ConstructorTabla(self.tablas[nombre])
+
+    def rpc(self, funcion, parametros):
+        return Llamada(self, funcion, parametros)
+
+    def _archivar_eventos(self, antes, limite):
+        time.sleep(self.latencia)
+        eventos, archivo = self.tablas["eventos"], self.tablas["eventos_archivo"]
+        with eventos.lock:
+            candidatas = sorted(
+                (f for f in eventos.filas.values() if f.get("rrule") is None and (f.get("starts_at") or "") < antes),
+                key=lambda f: (f["starts_at"], f["id"]),
+            )[:limite]
+            for fila in candidatas:
+                del eventos.filas[fila["id"]]
+                eventos.borrados.filas[fila["id"]] = {"id": fila["id"], "guild_id": fila.get("guild_id"), "borrado_en": _ahora()}
+                archivo.filas.setdefault(fila["id"], {**fila, "archivado_en": _ahora()})
+        return Respuesta([{"id": f["id"], "guild_id": f.get("guild_id")} for f in candidatas])
@@ -0,0 +1,89 @@
+import atexit
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+from datetime import date, datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+FORMATO_TEXTO = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Atributos que se pasan con `extra=` y que el formato JSON saca como campos propios
+CAMPOS = ("comando", "guild", "evento", "duracion")
+
+
+class FormatoJSON(logging.Formatter):
+    """Un objeto JSON por línea con los campos de `CAMPOS` que traiga el registro."""
+
+    def format(self, record):
+        linea = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensaje": record.getMessage(),
+        }
+        for campo in CAMPOS:
+            valor = getattr(record, campo, None)
+            if valor is not None:
+                linea[campo] = valor
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+def _comprimir(origen, destino):
+    with open(origen, "rb") as entrada, gzip.open(destino, "wb") as salida:
+        shutil.copyfileobj(entrada, salida)
+    os.remove(origen)
+
+
+class FicheroRotativo(RotatingFileHandler):
+    """Fichero que rota al superar `maxBytes` o al cambiar de día; las copias se guardan en gzip."""
+
+    def __init__(self, ruta, max_bytes, copias):
+        super().__init__(ruta, maxBytes=max_bytes, backupCount=copias, encoding="utf-8", delay=True)
+        self.namer = lambda nombre: nombre + ".gz"
+        self.rotator = _comprimir
+        self._dia = date.today()
+
+    def shouldRollover(self, record):
+        if date.today() != self._dia and os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._dia = date.today()
+
+
+def configurar_logging():
+    """Envía los registros a una cola que un hilo aparte escribe en consola y en fichero.
+
+    Quien registra solo encola, así que el event loop no espera al disco.
+    Variables: LOG_NIVEL, LOG_FICHERO, LOG_FORMATO (texto o json),
+    LOG_MAX_MB y LOG_COPIAS.
+    """
+    formato = FormatoJSON() if os.getenv("LOG_FORMATO", "texto") == "json" else logging.Formatter(FORMATO_TEXTO)
+    consola = logging.StreamHandler(sys.stdout)
+    fichero = FicheroRotativo(
+        os.getenv("LOG_FICHERO", "bot.log"),
+        max_bytes=int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024),
+        copias=int(os.getenv("LOG_COPIAS", "7")),
+    )
+    for manejador in (consola, fichero):
+        manejador.setFormatter(formato)
+
+    cola = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    raiz.setLevel(os.getenv("LOG_NIVEL", "INFO").upper())
+    raiz.handlers[:] = [QueueHandler(cola)]
+    escritor = QueueListener(cola, consola, fichero, respect_handler_level=True)
+    escritor.start()
+    # Vaciar la cola antes de salir para no perder las últimas líneas
+    atexit.register(escritor.stop)
+
+    # El cliente de Supabase registra cada petición HTTP a nivel INFO
+    for ruidoso in ("httpx", "httpcore", "hpack"):
+        logging.getLogger(ruidoso).setLevel(logging.WARNING)
+    return escritor
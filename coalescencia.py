@@ -0,0 +1,60 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class LlamadasCompartidas:
+    """Une las llamadas concurrentes con la misma clave en una sola.
+
+    La primera lanza la corrutina y las que llegan mientras sigue en curso
+    esperan su mismo resultado (o su excepción) en lugar de repetirla. En
+    cuanto termina, la siguiente llamada con esa clave vuelve a ejecutarse.
+    Si quien espera se cancela, la llamada compartida sigue para los demás.
+    """
+
+    def __init__(self):
+        self._en_curso = {}
+
+    def __len__(self):
+        return len(self._en_curso)
+
+    def __contains__(self, clave):
+        return clave in self._en_curso
+
+    async def llamar(self, clave, funcion, *args):
+        tarea = self._en_curso.get(clave)
+        if tarea is None:
+            tarea = asyncio.ensure_future(funcion(*args))
+            self._en_curso[clave] = tarea
+            tarea.add_done_callback(lambda _: self._en_curso.pop(clave, None))
+        return await asyncio.shield(tarea)
+
+
+class MemoVersionado:
+    """Valores calculados por clave, válidos mientras no cambie su versión ni pasen `ttl` segundos.
+
+    Guarda como mucho `maximo` entradas y descarta primero la usada hace más
+    tiempo.
+    """
+
+    def __init__(self, ttl=30, maximo=256):
+        self._ttl = ttl
+        self._maximo = maximo
+        self._entradas = OrderedDict()
+
+    def obtener(self, clave, version):
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        guardada, caduca, valor = entrada
+        if guardada != version or time.monotonic() >= caduca:
+            del self._entradas[clave]
+            return None
+        self._entradas.move_to_end(clave)
+        return valor
+
+    def guardar(self, clave, version, valor):
+        self._entradas[clave] = (version, time.monotonic() + self._ttl, valor)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self._maximo:
+            self._entradas.popitem(last=False)
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import aiohttp
+import discord
+
+from metricas import ENVIOS_FALLIDOS
+
+
+logger = logging.getLogger(__name__)
+
+# Límites de Discord para mensajes: 5 por canal cada 5 s y 50 peticiones por segundo en total
+CAPACIDAD_CANAL = 5
+PERIODO_CANAL = 5.0
+CAPACIDAD_GLOBAL = 50
+PERIODO_GLOBAL = 1.0
+
+# Discord admite como mucho 25 campos por embed y 10 embeds por mensaje
+CAMPOS_POR_EMBED = 25
+EMBEDS_POR_MENSAJE = 10
+
+
+class CuboTokens:
+    """Cubo de tokens: `capacidad` envíos seguidos y uno más cada `periodo / capacidad` segundos."""
+
+    def __init__(self, capacidad, periodo):
+        self._capacidad = capacidad
+        self._ritmo = capacidad / periodo
+        self._tokens = float(capacidad)
+        self._actualizado = time.monotonic()
+        self._bloqueado_hasta = 0.0
+
+    def _rellenar(self, ahora):
+        self._tokens = min(self._capacidad, self._tokens + (ahora - self._actualizado) * self._ritmo)
+        self._actualizado = ahora
+
+    def espera(self):
+        """Segundos hasta poder enviar; si es 0 se consume el token."""
+        ahora = time.monotonic()
+        if ahora < self._bloqueado_hasta:
+            return self._bloqueado_hasta - ahora
+        self._rellenar(ahora)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self._ritmo
+
+    def devolver(self):
+        """Devuelve el token consumido por un envío que al final no se hizo."""
+        self._tokens = min(self._capacidad, self._tokens + 1)
+
+    def bloquear(self, segundos):
+        """Vacía el cubo durante `segundos`, como pide un 429 de Discord; después admite un envío."""
+        self._bloqueado_hasta = max(self._bloqueado_hasta, time.monotonic() + segundos)
+        self._tokens = 1.0
+        self._actualizado = self._bloqueado_hasta
+
+
+def _reintentar_en(error, intento):
+    """Segundos antes de reintentar un envío fallido, o None si no tiene sentido reintentar."""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    if isinstance(error, discord.HTTPException):
+        if error.status == 429:
+            cabeceras = getattr(error.response, "headers", {}) or {}
+            return float(cabeceras.get("Retry-After") or cabeceras.get("X-RateLimit-Reset-After") or 1)
+        if error.status < 500:
+            # Permisos, canal borrado o mensaje inválido: reintentar no lo arregla
+            return None
+    elif not isinstance(error, (OSError, aiohttp.ClientError, asyncio.TimeoutError)):
+        return None
+    return min(2 ** intento, 60)
+
+
+class Despachador:
+    """Cola única de salida para los mensajes que el bot publica por su cuenta.
+
+    Cada canal tiene su cola y su cubo de tokens, y todos comparten uno
+    global, de modo que una ráfaga se reparte al ritmo que permite Discord en
+    lugar de acabar en 429. Si aun así llega un 429, se respeta su Retry-After
+    antes de reintentar; los errores de red y los 5xx se reintentan con
+    espera exponencial. Cada canal se atiende con una tarea que termina al
+    vaciarse su cola.
+
+    Los recordatorios que vencen dentro de `ventana` segundos en un mismo
+    canal se agrupan en un solo mensaje.
+    """
+
+    def __init__(self, ventana=2.0, max_intentos=5, aviso_cola=50):
+        self._ventana = ventana
+        self._max_intentos = max_intentos
+        self._aviso_cola = aviso_cola
+        self._colas = {}
+        self._cubos = {}
+        self._tareas = {}
+        self._global = CuboTokens(CAPACIDAD_GLOBAL, PERIODO_GLOBAL)
+        self._agrupando = {}
+
+    def profundidad(self):
+        """Mensajes pendientes por canal, incluidos los recordatorios que se están agrupando."""
+        pendientes = {canal_id: len(cola) for canal_id, cola in self._colas.items() if cola}
+        for canal_id, (_, grupo) in self._agrupando.items():
+            pendientes[canal_id] = pendientes.get(canal_id, 0) + len(grupo)
+        return pendientes
+
+    def __len__(self):
+        return sum(self.profundidad().values())
+
+    def enviar(self, canal, **mensaje):
+        """Encola un mensaje y devuelve un futuro con el `discord.Message` enviado."""
+        futuro = asyncio.get_running_loop().create_future()
+        cola = self._colas.setdefault(canal.id, deque())
+        cola.append((canal, mensaje, futuro))
+        if len(cola) == self._aviso_cola:
+            logger.warning(f"Cola de salida del canal {canal.id} con {len(cola)} mensajes pendientes")
+        tarea = self._tareas.get(canal.id)
+        if tarea is None or tarea.done():
+            self._tareas[canal.id] = asyncio.create_task(self._atender(canal.id))
+        return futuro
+
+    def recordatorio(self, canal, evento, texto):
+        """Encola un recordatorio; los del mismo canal dentro de la ventana salen juntos.
+
+        Devuelve un futuro que se resuelve cuando sale el mensaje que lo incluye.
+        """
+        futuro = asyncio.get_running_loop().create_future()
+        if canal.id not in self._agrupando:
+            self._agrupando[canal.id] = (canal, [])
+            asyncio.get_running_loop().call_later(self._ventana, self._vaciar_grupo, canal.id)
+        self._agrupando[canal.id][1].append((evento, texto, futuro))
+        return futuro
+
+    def _vaciar_grupo(self, canal_id):
+        canal, grupo = self._agrupando.pop(canal_id)
+        if len(grupo) == 1:
+            _, texto, _ = grupo[0]
+            envios = [self.enviar(canal, content=f"⏰ **Recordatorio:** {texto}")]
+        else:
+            campos = [(evento["nombre"], texto) for evento, texto, _ in grupo]
+            envios = [self.enviar(canal, embeds=embeds) for embeds in embeds_recordatorios(campos, "⏰ Recordatorios")]
+        resultado = asyncio.gather(*envios)
+
+        def repartir(resultado):
+            for _, _, futuro in grupo:
+                if futuro.done():
+                    continue
+                if resultado.cancelled():
+                    futuro.cancel()
+                elif resultado.exception() is not None:
+                    futuro.set_exception(resultado.exception())
+                else:
+                    futuro.set_result(resultado.result())
+        resultado.add_done_callback(repartir)
+
+    async def _atender(self, canal_id):
+        cola = self._colas[canal_id]
+        cubo = self._cubos.setdefault(canal_id, CuboTokens(CAPACIDAD_CANAL, PERIODO_CANAL))
+        intento = 0
+        while cola:
+            canal, mensaje, futuro = cola[0]
+            if futuro.done():
+                cola.popleft()
+                continue
+            espera = cubo.espera()
+            if espera == 0:
+                espera = self._global.espera()
+                if espera > 0:
+                    cubo.devolver()
+            if espera > 0:
+                await asyncio.sleep(espera)
+                continue
+            try:
+                enviado = await canal.send(**mensaje)
+            except Exception as e:
+                intento += 1
+                reintentar_en = _reintentar_en(e, intento)
+                if reintentar_en is None or intento >= self._max_intentos:
+                    ENVIOS_FALLIDOS.incrementar(resultado="descartado")
+                    logger.error(f"Mensaje al canal {canal_id} descartado tras {intento} intentos: {e}")
+                    cola.popleft()
+                    futuro.set_exception(e)
+                    intento = 0
+                    continue
+                ENVIOS_FALLIDOS.incrementar(resultado="reintento")
+                logger.warning(f"Envío al canal {canal_id} fallido ({e}); reintento en {reintentar_en:.1f} s")
+                cubo.bloquear(reintentar_en)
+                continue
+            cola.popleft()
+            futuro.set_result(enviado)
+            intento = 0
+        # Sin mensajes pendientes el canal no necesita tarea ni cola
+        del self._colas[canal_id]
+
+    def detener(self):
+        for tarea in self._tareas.values():
+            tarea.cancel()
+        self._tareas.clear()
+
+
+def embeds_recordatorios(campos, titulo, descripcion=None):
+    """Reparte (nombre, texto) en embeds y los agrupa por mensaje según los límites de Discord."""
+    embeds = []
+    for i in range(0, len(campos), CAMPOS_POR_EMBED):
+        embed = discord.Embed(title=titulo, description=descripcion, color=0xFFA500)
+        for nombre, texto in campos[i:i + CAMPOS_POR_EMBED]:
+            embed.add_field(name=nombre, value=texto, inline=False)
+        embeds.append(embed)
+    return [embeds[i:i + EMBEDS_POR_MENSAJE] for i in range(0, len(embeds), EMBEDS_POR_MENSAJE)]
@@ -0,0 +1,135 @@
+-- Esquema de la tabla de eventos en Supabase (Postgres).
+-- Se puede ejecutar varias veces desde el editor SQL del proyecto.
+
+create table if not exists eventos (
+    id bigint generated by default as identity primary key,
+    nombre text not null,
+    fecha date not null,
+    hora time not null,
+    lugar text not null,
+    recordatorio text
+);
+
+-- Instantes precalculados al escribir (ver tiempo.calcular_momentos).
+-- Después de añadirlos, rellenar las filas existentes con: python migrar_fechas.py
+alter table eventos add column if not exists starts_at timestamptz;
+alter table eventos add column if not exists remind_at timestamptz;
+
+create index if not exists eventos_starts_at on eventos (starts_at, id);
+create index if not exists eventos_remind_at on eventos (remind_at) where remind_at is not null;
+
+-- Eventos recurrentes: una fila por serie con la regla (ver recurrencia.Recurrencia)
+-- y las fechas excluidas separadas por comas; las ocurrencias no se guardan.
+alter table eventos add column if not exists rrule text;
+alter table eventos add column if not exists excepciones text;
+
+create index if not exists eventos_series on eventos (id) where rrule is not null;
+
+-- Varios servidores: cada evento pertenece a uno. Las filas anteriores sin
+-- servidor se asignan al de GUILD_ID cuando arranca el bot.
+alter table eventos add column if not exists guild_id bigint;
+
+drop index if exists eventos_starts_at;
+create index if not exists eventos_servidor_starts_at on eventos (guild_id, starts_at, id);
+
+-- Configuración de cada servidor (ver servidores.ConfigServidor)
+create table if not exists servidores (
+    guild_id bigint primary key,
+    canal_id bigint,
+    zona text not null default 'Europe/Madrid',
+    resumen_dia smallint,
+    resumen_hora smallint
+);
+
+-- Sincronización incremental: cada alta o modificación anota updated_at y
+-- cada baja deja una lápida en eventos_borrados (se guardan 30 días). Los
+-- triggers recogen también los cambios hechos desde el panel de Supabase.
+alter table eventos add column if not exists updated_at timestamptz;
+
+create index if not exists eventos_updated_at on eventos (updated_at);
+
+create or replace function eventos_marcar_cambio() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := clock_timestamp();
+    return new;
+end;
+$$;
+
+drop trigger if exists eventos_cambio on eventos;
+create trigger eventos_cambio before insert or update on eventos
+    for each row execute function eventos_marcar_cambio();
+
+create table if not exists eventos_borrados (
+    id bigint primary key,
+    guild_id bigint,
+    borrado_en timestamptz not null default clock_timestamp()
+);
+
+create index if not exists eventos_borrados_borrado_en on eventos_borrados (borrado_en);
+
+create or replace function eventos_registrar_borrado() returns trigger
+language plpgsql as $$
+begin
+    insert into eventos_borrados (id, guild_id) values (old.id, old.guild_id)
+        on conflict (id) do update set borrado_en = clock_timestamp();
+    delete from eventos_borrados where borrado_en < now() - interval '30 days';
+    return old;
+end;
+$$;
+
+drop trigger if exists eventos_borrado on eventos;
+create trigger eventos_borrado after delete on eventos
+    for each row execute function eventos_registrar_borrado();
+
+-- Duración opcional de cada evento, con el formato de los recordatorios (p. ej.
+-- 1h30m). Sin ella el bot cuenta una hora al buscar solapes y huecos libres.
+alter table eventos add column if not exists duracion text;
+
+-- Archivo: los eventos puntuales que empezaron hace más de la retención
+-- (ARCHIVO_RETENCION_DIAS) se trasladan aquí por lotes con archivar_eventos.
+-- Solo los lee /historial; la tabla de eventos queda con los actuales.
+create table if not exists eventos_archivo (
+    id bigint primary key,
+    guild_id bigint,
+    nombre text not null,
+    fecha date not null,
+    hora time not null,
+    lugar text not null,
+    recordatorio text,
+    starts_at timestamptz,
+    remind_at timestamptz,
+    rrule text,
+    excepciones text,
+    duracion text,
+    archivado_en timestamptz not null default clock_timestamp()
+);
+
+create index if not exists eventos_archivo_servidor_starts_at on eventos_archivo (guild_id, starts_at, id);
+create index if not exists eventos_puntuales_starts_at on eventos (starts_at) where rrule is null;
+
+-- Mueve en una transacción los `limite` eventos puntuales más antiguos que
+-- empiezan antes de `antes`; el borrado deja lápida como cualquier otro.
+create or replace function archivar_eventos(antes timestamptz, limite integer)
+returns table (id bigint, guild_id bigint)
+language sql as $$
+    with movidos as (
+        delete from eventos
+        where eventos.id in (
+            select e.id from eventos e
+            where e.rrule is null and e.starts_at < antes
+            order by e.starts_at, e.id
+            limit limite
+        )
+        returning *
+    ), archivados as (
+        insert into eventos_archivo (id, guild_id, nombre, fecha, hora, lugar, recordatorio,
+                                     starts_at, remind_at, rrule, excepciones, duracion)
+        select m.id, m.guild_id, m.nombre, m.fecha, m.hora, m.lugar, m.recordatorio,
+               m.starts_at, m.remind_at, m.rrule, m.excepciones, m.duracion
+        from movidos m
+        on conflict (id) do nothing
+    )
+    -- Todos los borrados de eventos, aunque ya estuvieran archivados de un intento anterior
+    select m.id, m.guild_id from movidos m;
+$$;
@@ -0,0 +1,26 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+
+class EstadoLocal:
+    """Base de datos SQLite local del proceso (`estado.db`).
+
+    Una sola conexión y un único hilo aparte para todos los registros que
+    guardan ahí su estado: las operaciones no bloquean el event loop, se
+    ejecutan de una en una y la conexión nunca se usa desde dos hilos a la vez.
+    """
+
+    def __init__(self, ruta="estado.db"):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="estado")
+        self.conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+
+    async def ejecutar(self, operacion, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, operacion, *args)
+
+    def cerrar(self):
+        self._executor.shutdown(wait=True)
+        self.conexion.close()
@@ -0,0 +1,209 @@
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+from datetime import timedelta
+
+from tiempo import duracion_evento, fin_evento
+
+
+_PALABRA = re.compile(r"\w+")
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: "Reunión" y "reunion" se escriben igual."""
+    descompuesto = unicodedata.normalize("NFKD", texto.casefold())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def palabras(texto):
+    return _PALABRA.findall(normalizar(texto or ""))
+
+
+def clave_lugar(lugar):
+    """Lugar normalizado: "Sala  Nº1" y "sala nº 1" no se distinguen, "Sala 1" sí."""
+    return " ".join(palabras(lugar))
+
+
+def _terminos(evento):
+    # Palabras del nombre y el id como texto: "12" encuentra el evento 123
+    return set(palabras(evento["nombre"])) | {str(evento["id"])}
+
+
+class IndicePrefijos:
+    """Palabras de los nombres y ids de los eventos, ordenados para buscarlos por prefijo.
+
+    Cada entrada es (palabra, id) en una lista ordenada: los términos que
+    empiezan por un prefijo ocupan un tramo contiguo que se localiza con dos
+    búsquedas binarias, sin recorrer los eventos.
+    """
+
+    def __init__(self, eventos=()):
+        self._entradas = sorted({(p, e["id"]) for e in eventos for p in _terminos(e)})
+
+    def agregar(self, evento):
+        for palabra in _terminos(evento):
+            insort(self._entradas, (palabra, evento["id"]))
+
+    def quitar(self, evento):
+        for palabra in _terminos(evento):
+            posicion = bisect_left(self._entradas, (palabra, evento["id"]))
+            if posicion < len(self._entradas) and self._entradas[posicion] == (palabra, evento["id"]):
+                del self._entradas[posicion]
+
+    def _con_prefijo(self, prefijo):
+        inicio = bisect_left(self._entradas, (prefijo,))
+        # "\uffff" ordena detrás de cualquier continuación del prefijo
+        fin = bisect_left(self._entradas, (prefijo + "\uffff",))
+        return {id for _, id in self._entradas[inicio:fin]}
+
+    def buscar(self, consulta):
+        """Ids de los eventos con un término (palabra del nombre o id) que empieza por cada palabra de la consulta."""
+        encontrados = None
+        for prefijo in palabras(consulta):
+            ids = self._con_prefijo(prefijo)
+            encontrados = ids if encontrados is None else encontrados & ids
+            if not encontrados:
+                break
+        return encontrados or set()
+
+
+# Peso de una coincidencia según el campo; una palabra en el nombre cuenta más que en el lugar
+PESOS = {"nombre": 2, "lugar": 1}
+
+
+def _pesos(evento):
+    pesos = {}
+    for campo, peso in PESOS.items():
+        for palabra in palabras(evento.get(campo)):
+            pesos[palabra] = max(pesos.get(palabra, 0), peso)
+    return pesos
+
+
+class IndiceTexto:
+    """Índice invertido palabra → {id: peso} sobre el nombre y el lugar de los eventos.
+
+    Se mantiene con cada alta, modificación y baja en lugar de reconstruirse.
+    Una búsqueda exige todas sus palabras; la última vale también como
+    prefijo ("ouren" encuentra "Ourense") a mitad de peso, y los prefijos se
+    localizan con búsqueda binaria en el vocabulario ordenado.
+    """
+
+    def __init__(self, eventos=()):
+        self._listas = {}
+        for evento in eventos:
+            for palabra, peso in _pesos(evento).items():
+                self._listas.setdefault(palabra, {})[evento["id"]] = peso
+        self._vocabulario = sorted(self._listas)
+
+    def agregar(self, evento):
+        for palabra, peso in _pesos(evento).items():
+            lista = self._listas.get(palabra)
+            if lista is None:
+                lista = self._listas[palabra] = {}
+                insort(self._vocabulario, palabra)
+            lista[evento["id"]] = peso
+
+    def quitar(self, evento):
+        for palabra in _pesos(evento):
+            lista = self._listas.get(palabra)
+            if lista is None:
+                continue
+            lista.pop(evento["id"], None)
+            if not lista:
+                del self._listas[palabra]
+                del self._vocabulario[bisect_left(self._vocabulario, palabra)]
+
+    def _puntuar(self, palabra, prefijo):
+        puntos = {id: float(peso) for id, peso in self._listas.get(palabra, {}).items()}
+        if prefijo:
+            inicio = bisect_left(self._vocabulario, palabra)
+            fin = bisect_left(self._vocabulario, palabra + "\uffff")
+            for completa in self._vocabulario[inicio:fin]:
+                for id, peso in self._listas[completa].items():
+                    puntos[id] = max(puntos.get(id, 0.0), peso / 2)
+        return puntos
+
+    def buscar(self, consulta):
+        """Puntuación por id de los eventos que contienen todas las palabras de la consulta."""
+        terminos = palabras(consulta)
+        resultado = None
+        for i, termino in enumerate(terminos):
+            puntos = self._puntuar(termino, prefijo=i == len(terminos) - 1)
+            if resultado is None:
+                resultado = puntos
+            else:
+                resultado = {id: resultado[id] + p for id, p in puntos.items() if id in resultado}
+            if not resultado:
+                return {}
+        return resultado or {}
+
+
+class IndiceIntervalos:
+    """Intervalos [inicio, fin) de los eventos, ordenados por inicio.
+
+    Además se guarda la duración más larga indexada: todo evento que se
+    solapa con [desde, hasta) empieza entre `desde - duración máxima` y
+    `hasta`, un tramo contiguo de la lista que se localiza con dos búsquedas
+    binarias. Una consulta cuesta O(log n + k) con k los eventos de ese
+    tramo. Al quitar eventos la duración máxima no baja: sigue siendo una
+    cota válida hasta que el índice se reconstruye.
+    """
+
+    def __init__(self, eventos=()):
+        eventos = sorted(eventos, key=lambda e: (e["starts_at"], e["id"]))
+        self._claves = [(e["starts_at"], e["id"]) for e in eventos]
+        self._eventos = eventos
+        self._duracion_max = max(map(duracion_evento, eventos), default=timedelta(0))
+
+    def __len__(self):
+        return len(self._eventos)
+
+    def agregar(self, evento):
+        clave = (evento["starts_at"], evento["id"])
+        posicion = bisect_left(self._claves, clave)
+        self._claves.insert(posicion, clave)
+        self._eventos.insert(posicion, evento)
+        self._duracion_max = max(self._duracion_max, duracion_evento(evento))
+
+    def quitar(self, evento):
+        clave = (evento["starts_at"], evento["id"])
+        posicion = bisect_left(self._claves, clave)
+        if posicion < len(self._claves) and self._claves[posicion] == clave:
+            del self._claves[posicion]
+            del self._eventos[posicion]
+
+    def solapes(self, desde, hasta):
+        """Eventos que empiezan antes de `hasta` y terminan después de `desde`, por inicio."""
+        inicio = bisect_left(self._claves, (desde - self._duracion_max,))
+        fin = bisect_left(self._claves, (hasta,))
+        return [e for e in self._eventos[inicio:fin] if fin_evento(e) > desde]
+
+
+def fusionar(intervalos):
+    """Une los intervalos (inicio, fin), ordenados por inicio, que se solapan o se tocan."""
+    fusionados = []
+    for inicio, fin in intervalos:
+        if fusionados and inicio <= fusionados[-1][1]:
+            if fin > fusionados[-1][1]:
+                fusionados[-1] = (fusionados[-1][0], fin)
+        else:
+            fusionados.append((inicio, fin))
+    return fusionados
+
+
+def huecos(ocupados, desde, hasta, minimo=timedelta(0)):
+    """Tramos libres de [desde, hasta) de al menos `minimo` entre los intervalos de `fusionar`."""
+    libres = []
+    cursor = desde
+    # Los intervalos fusionados no se solapan: solo el anterior al primero que empieza en `desde` puede cubrirlo
+    primero = max(0, bisect_right(ocupados, (desde,)) - 1)
+    for posicion in range(primero, len(ocupados)):
+        inicio, fin = ocupados[posicion]
+        if inicio >= hasta:
+            break
+        if inicio > cursor and inicio - cursor >= minimo:
+            libres.append((cursor, inicio))
+        cursor = max(cursor, fin)
+    if hasta > cursor and hasta - cursor >= minimo:
+        libres.append((cursor, hasta))
+    return libres
@@ -0,0 +1,324 @@
+"""Importación y exportación de eventos en CSV e ICS.
+
+Los lectores son generadores que recorren el fichero línea a línea y producen
+(número, evento, error) por cada registro, de modo que la importación puede
+validar e insertar por lotes sin tener el fichero analizado entero en memoria.
+Los escritores reciben páginas de eventos y las vuelcan según llegan.
+"""
+import csv
+import re
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from recurrencia import Recurrencia, excepciones
+from tiempo import ZONA, formatear_duracion, parse_recordatorio
+
+
+COLUMNAS_CSV = ["id", "nombre", "fecha", "hora", "lugar", "recordatorio", "rrule", "excepciones", "duracion"]
+
+_PATRON_RECORDATORIO = re.compile(r"^(\d+[dhm])+$")
+_PATRON_DURACION_ICS = re.compile(
+    r"^(?P<signo>[-+]?)P(?:(?P<semanas>\d+)W)?(?:(?P<dias>\d+)D)?"
+    r"(?:T(?:(?P<horas>\d+)H)?(?:(?P<minutos>\d+)M)?(?:\d+S)?)?$"
+)
+
+
+def validar_evento(datos):
+    """Normaliza un registro importado o lanza ValueError con el motivo.
+
+    La fecha se acepta como DD-MM-YYYY (la de /crear_evento) o YYYY-MM-DD.
+    """
+    nombre = (datos.get("nombre") or "").strip()
+    lugar = (datos.get("lugar") or "").strip()
+    if not nombre:
+        raise ValueError("falta el nombre")
+    if not lugar:
+        raise ValueError("falta el lugar")
+
+    fecha = (datos.get("fecha") or "").strip()
+    for formato in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            fecha_db = datetime.strptime(fecha, formato).strftime("%Y-%m-%d")
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"fecha inválida '{fecha}'")
+
+    hora = (datos.get("hora") or "").strip()
+    for formato in ("%H:%M", "%H:%M:%S"):
+        try:
+            hora_db = datetime.strptime(hora, formato).strftime("%H:%M")
+            break
+        except ValueError:
+            continue
+    else:
+        raise ValueError(f"hora inválida '{hora}'")
+
+    evento = {"nombre": nombre, "fecha": fecha_db, "hora": hora_db, "lugar": lugar}
+    recordatorio = (datos.get("recordatorio") or "").strip()
+    if recordatorio:
+        if not _PATRON_RECORDATORIO.match(recordatorio):
+            raise ValueError(f"recordatorio inválido '{recordatorio}'")
+        evento["recordatorio"] = recordatorio
+    duracion = (datos.get("duracion") or "").strip()
+    if duracion:
+        if not _PATRON_RECORDATORIO.match(duracion) or not parse_recordatorio(duracion):
+            raise ValueError(f"duración inválida '{duracion}'")
+        evento["duracion"] = duracion
+    rrule = (datos.get("rrule") or "").strip()
+    if rrule:
+        evento["rrule"] = str(Recurrencia.parse(rrule))
+        fechas = excepciones(datos)
+        if fechas:
+            evento["excepciones"] = ",".join(d.isoformat() for d in sorted(fechas))
+    return evento
+
+
+def leer_csv(lineas):
+    """Registros de un CSV con cabecera; las columnas desconocidas se ignoran."""
+    lector = csv.DictReader(lineas)
+    faltan = {"nombre", "fecha", "hora", "lugar"} - set(lector.fieldnames or [])
+    if faltan:
+        raise ValueError(f"Faltan columnas en el CSV: {', '.join(sorted(faltan))}")
+    for datos in lector:
+        try:
+            yield lector.line_num, validar_evento(datos), None
+        except ValueError as e:
+            yield lector.line_num, None, str(e)
+
+
+def _desplegar(lineas):
+    # RFC 5545: una línea que empieza por espacio o tabulador continúa la anterior
+    actual = None
+    for numero, linea in enumerate(lineas, 1):
+        linea = linea.rstrip("\r\n")
+        if linea[:1] in (" ", "\t") and actual is not None:
+            actual = (actual[0], actual[1] + linea[1:])
+            continue
+        if actual is not None:
+            yield actual
+        actual = (numero, linea)
+    if actual is not None:
+        yield actual
+
+
+def _texto_ics(valor):
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), valor)
+
+
+def _inicio_ics(parametros, valor, zona):
+    parametros = {clave.upper(): valor for clave, _, valor in (p.partition("=") for p in parametros)}
+    if parametros.get("VALUE", "").upper() == "DATE":
+        return datetime.strptime(valor, "%Y%m%d").replace(tzinfo=zona)
+    if valor.endswith("Z"):
+        return datetime.strptime(valor, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc).astimezone(zona)
+    origen = ZoneInfo(parametros["TZID"].strip('"')) if "TZID" in parametros else zona
+    return datetime.strptime(valor, "%Y%m%dT%H%M%S").replace(tzinfo=origen).astimezone(zona)
+
+
+def _delta_ics(valor):
+    match = _PATRON_DURACION_ICS.match(valor)
+    if not match:
+        return None
+    dias = int(match["semanas"] or 0) * 7 + int(match["dias"] or 0)
+    delta = timedelta(days=dias, hours=int(match["horas"] or 0), minutes=int(match["minutos"] or 0))
+    return -delta if match["signo"] == "-" else delta
+
+
+def _recordatorio_ics(valor):
+    # Solo los TRIGGER anteriores al inicio del evento se convierten en recordatorio
+    delta = _delta_ics(valor)
+    if delta is None or delta >= timedelta(0):
+        return None
+    return formatear_duracion(-delta) or None
+
+
+def leer_ics(lineas, zona=ZONA):
+    """Registros de los VEVENT de un calendario ICS.
+
+    Usa SUMMARY, DTSTART, DTEND o DURATION, LOCATION, RRULE, EXDATE y el
+    TRIGGER relativo del primer VALARM. Las horas se pasan a la zona `zona` (la del servidor); los eventos de día completo quedan
+    a las 00:00.
+    """
+    datos = None
+    inicio = fin = None
+    inicio_evento = 0
+    en_alarma = False
+    for numero, linea in _desplegar(lineas):
+        nombre, _, valor = linea.partition(":")
+        propiedad, *parametros = nombre.split(";")
+        propiedad = propiedad.upper()
+        if propiedad == "BEGIN" and valor.upper() == "VEVENT":
+            datos, inicio_evento = {}, numero
+            inicio = fin = None
+        elif datos is None:
+            continue
+        elif propiedad == "BEGIN" and valor.upper() == "VALARM":
+            en_alarma = True
+        elif propiedad == "END" and valor.upper() == "VALARM":
+            en_alarma = False
+        elif propiedad == "END" and valor.upper() == "VEVENT":
+            if inicio is not None and fin is not None and "duracion" not in datos:
+                datos["duracion"] = formatear_duracion(fin - inicio)
+            try:
+                if "error" in datos:
+                    raise ValueError(datos["error"])
+                yield inicio_evento, validar_evento(datos), None
+            except ValueError as e:
+                yield inicio_evento, None, str(e)
+            datos = None
+        elif en_alarma:
+            if propiedad == "TRIGGER" and "recordatorio" not in datos:
+                datos["recordatorio"] = _recordatorio_ics(valor) or ""
+        elif propiedad == "SUMMARY":
+            datos["nombre"] = _texto_ics(valor)
+        elif propiedad == "LOCATION":
+            datos["lugar"] = _texto_ics(valor)
+        elif propiedad == "DTSTART":
+            try:
+                inicio = _inicio_ics(parametros, valor, zona)
+                datos["fecha"], datos["hora"] = inicio.strftime("%Y-%m-%d"), inicio.strftime("%H:%M")
+            except (ValueError, KeyError) as e:
+                datos["error"] = f"DTSTART inválido '{valor}': {e}"
+        elif propiedad == "DTEND":
+            try:
+                fin = _inicio_ics(parametros, valor, zona)
+            except (ValueError, KeyError):
+                fin = None
+        elif propiedad == "DURATION":
+            delta = _delta_ics(valor)
+            if delta is not None and delta > timedelta(0):
+                datos["duracion"] = formatear_duracion(delta)
+        elif propiedad == "RRULE":
+            datos["rrule"] = valor
+        elif propiedad == "EXDATE":
+            try:
+                fechas = [_inicio_ics(parametros, v, zona).date().isoformat() for v in valor.split(",")]
+                datos["excepciones"] = ",".join(filter(None, [datos.get("excepciones"), *fechas]))
+            except (ValueError, KeyError) as e:
+                datos["error"] = f"EXDATE inválido '{valor}': {e}"
+
+
+def en_lotes(registros, tamaño):
+    """Agrupa un iterable en listas de como mucho `tamaño` elementos."""
+    lote = []
+    for registro in registros:
+        lote.append(registro)
+        if len(lote) >= tamaño:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class EscritorCSV:
+    def __init__(self, destino):
+        self._escritor = csv.DictWriter(destino, fieldnames=COLUMNAS_CSV, extrasaction="ignore")
+        self._escritor.writeheader()
+
+    def escribir(self, eventos):
+        for e in eventos:
+            self._escritor.writerow({
+                **e,
+                "recordatorio": e.get("recordatorio") or "",
+                "rrule": e.get("rrule") or "",
+                "excepciones": e.get("excepciones") or "",
+                "duracion": e.get("duracion") or "",
+            })
+
+    def cerrar(self):
+        pass
+
+
+def _duracion_ics(delta, signo="-"):
+    minutos = int(delta.total_seconds() // 60)
+    dias, minutos = divmod(minutos, 1440)
+    horas, minutos = divmod(minutos, 60)
+    tiempo = (f"{horas}H" if horas else "") + (f"{minutos}M" if minutos else "")
+    return f"{signo}P{f'{dias}D' if dias else ''}{f'T{tiempo}' if tiempo else ''}" if dias or tiempo else f"{signo}PT0M"
+
+
+def _utc_ics(momento):
+    return f"{momento.astimezone(timezone.utc):%Y%m%dT%H%M%SZ}"
+
+
+def _local_ics(momento, zona):
+    return f"TZID={zona.key}:{momento.astimezone(zona):%Y%m%dT%H%M%S}"
+
+
+def _regla_ics(evento, zona):
+    # Con DTSTART en hora local y TZID, RFC 5545 exige UNTIL en UTC: el final del último día local
+    regla = Recurrencia.parse(evento["rrule"])
+    hasta, regla.hasta = regla.hasta, None
+    texto = str(regla)
+    if hasta:
+        texto += f";UNTIL={_utc_ics(datetime.combine(hasta, time(23, 59, 59), tzinfo=zona))}"
+    return texto
+
+
+def _exdate_ics(evento, zona):
+    # En la misma hora local que DTSTART, para que coincida con la ocurrencia también tras un cambio de hora
+    hora = evento["starts_at"].astimezone(zona).time()
+    fechas = sorted(excepciones(evento))
+    return f"TZID={zona.key}:" + ",".join(f"{datetime.combine(d, hora):%Y%m%dT%H%M%S}" for d in fechas)
+
+
+def _escapar_ics(valor):
+    return valor.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _plegar(linea):
+    # RFC 5545: líneas de como mucho 75 octetos, continuadas con un espacio
+    partes = []
+    while len(linea.encode("utf-8")) > 75:
+        corte = 75
+        while len(linea[:corte].encode("utf-8")) > 75:
+            corte -= 1
+        partes.append(linea[:corte])
+        linea = " " + linea[corte:]
+    partes.append(linea)
+    return "\r\n".join(partes) + "\r\n"
+
+
+class EscritorICS:
+    def __init__(self, destino, zona=ZONA):
+        self._destino = destino
+        self._zona = zona
+        self._sello = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self._linea("BEGIN:VCALENDAR")
+        self._linea("VERSION:2.0")
+        self._linea("PRODID:-//OurenseOntime//Botcalendario24h//ES")
+        self._linea(f"X-WR-TIMEZONE:{zona.key}")
+
+    def _linea(self, texto):
+        self._destino.write(_plegar(texto))
+
+    def escribir(self, eventos):
+        for e in eventos:
+            self._linea("BEGIN:VEVENT")
+            self._linea(f"UID:evento-{e['id']}@botcalendario24h")
+            self._linea(f"DTSTAMP:{self._sello}")
+            if e.get("rrule"):
+                # Las series se expanden en hora local, como en el bot, y no en UTC
+                self._linea(f"DTSTART;{_local_ics(e['starts_at'], self._zona)}")
+            else:
+                self._linea(f"DTSTART:{_utc_ics(e['starts_at'])}")
+            if e.get("duracion"):
+                self._linea(f"DURATION:{_duracion_ics(parse_recordatorio(e['duracion']), signo='')}")
+            if e.get("rrule"):
+                self._linea(f"RRULE:{_regla_ics(e, self._zona)}")
+                if e.get("excepciones"):
+                    self._linea(f"EXDATE;{_exdate_ics(e, self._zona)}")
+            self._linea(f"SUMMARY:{_escapar_ics(e['nombre'])}")
+            self._linea(f"LOCATION:{_escapar_ics(e['lugar'])}")
+            if e.get("recordatorio"):
+                self._linea("BEGIN:VALARM")
+                self._linea("ACTION:DISPLAY")
+                self._linea(f"DESCRIPTION:{_escapar_ics(e['nombre'])}")
+                self._linea(f"TRIGGER:{_duracion_ics(parse_recordatorio(e['recordatorio']))}")
+                self._linea("END:VALARM")
+            self._linea("END:VEVENT")
+
+    def cerrar(self):
+        self._linea("END:VCALENDAR")
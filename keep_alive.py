@@ -1,15 +1,43 @@
-from flask import Flask
-from threading import Thread
+import json
 
-app = Flask(__name__)
+from aiohttp import web
 
-@app.route('/')
-def home():
-    return "Bot activo", 200
+from metricas import registro
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+def crear_app(comprobar):
+    """Aplicación de salud y métricas.
+
+    `/livez` responde mientras el event loop atiende peticiones. `/readyz`
+    espera a `comprobar()`, que devuelve un dict nombre → bool, y contesta 503
+    si alguna comprobación falla.
+    """
+    async def home(request):
+        return web.Response(text="Bot activo")
+
+    async def livez(request):
+        return web.Response(text="ok")
+
+    async def readyz(request):
+        comprobaciones = await comprobar()
+        estado = 200 if all(comprobaciones.values()) else 503
+        return web.Response(status=estado, text=json.dumps(comprobaciones), content_type="application/json")
+
+    async def metrics(request):
+        return web.Response(body=registro.exponer().encode("utf-8"),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/livez', livez)
+    app.router.add_get('/readyz', readyz)
+    app.router.add_get('/metrics', metrics)
+    return app
+
+
+async def keep_alive(comprobar, puerto=8080):
+    """Arranca el servidor en el event loop actual y devuelve su runner para pararlo."""
+    runner = web.AppRunner(crear_app(comprobar), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', puerto).start()
+    return runner
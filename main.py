@@ -1,158 +1,563 @@
 import discord
 import asyncio
+import io
 import json
-import re
 import os
 import logging
+import math
 import sys
-from threading import Thread
+import time
+import tempfile
 from keep_alive import keep_alive
-from discord.ext import tasks, commands
+from discord.ext import commands
 from discord import app_commands
-from datetime import datetime, timedelta
-from supabase import create_client, Client
-from zoneinfo import ZoneInfo
+from datetime import date, datetime, timedelta, timezone
+from tiempo import DURACION_POR_DEFECTO, calcular_momentos, formatear_duracion, inicio_dia, parse_recordatorio
+from almacenamiento import crear_backend
+from repositorio import RepositorioEventos
+from almacen import AlmacenesServidores, clave_evento
+from recurrencia import Recurrencia, excepciones, ocurrencias
+from programador import ProgramadorRecordatorios
+from estado_local import EstadoLocal
+from registro_recordatorios import RegistroRecordatorios
+from periodicas import ReglaCalendario, RegistroEjecuciones, TareaPeriodica
+from servidores import ConfigServidor, ConfiguracionServidores
+from vistas import VistaPaginada
+from coalescencia import LlamadasCompartidas, MemoVersionado
+from bitacora import configurar_logging
+from despachador import Despachador, embeds_recordatorios
+from intercambio import EscritorCSV, EscritorICS, en_lotes, leer_csv, leer_ics
+import metricas
+from metricas import medir_comando
 
 
 # Cargar variables de entorno
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 TOKEN = os.getenv("TOKEN")
-CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
-GUILD_ID = int(os.getenv("GUILD_ID"))
-
-
-
-
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("SUPABASE_URL y SUPABASE_KEY son requeridos")
-
-
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Opcionales: servidor y canal de las instalaciones de un solo servidor. Sus
+# eventos sin servidor se le asignan al arrancar y el canal pasa a ser el de
+# anuncios si el servidor aún no tiene configuración.
+GUILD_ID = int(os.getenv("GUILD_ID") or 0)
+CHANNEL_ID = int(os.getenv("CHANNEL_ID") or 0)
+# Shards: vacío para no usarlos, "auto" para los que indique Discord o un número.
+# Con SHARD_IDS ("0,1") cada proceso atiende solo esos shards.
+SHARDS = os.getenv("SHARDS", "")
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS", "").split(",") if i.strip()]
+PUERTO = int(os.getenv("PORT", "8080"))
+
+
+def zona_servidor(guild_id):
+    return servidores.obtener(guild_id).zona_info
+
+backend = crear_backend()
+repositorio = RepositorioEventos(
+    backend, max_workers=int(os.getenv("ALMACENAMIENTO_MAX_WORKERS", "4")), zona_de=zona_servidor
+)
+servidores = ConfiguracionServidores(repositorio)
+# Los eventos puntuales que empezaron hace más de la retención pasan al archivo
+# (0: no se archiva nada); las copias en memoria solo cargan los posteriores
+RETENCION_ARCHIVO = timedelta(days=int(os.getenv("ARCHIVO_RETENCION_DIAS", "90")))
+ARCHIVO_LOTE = min(int(os.getenv("ARCHIVO_LOTE", "200")), 500)
+ARCHIVO_HORA = int(os.getenv("ARCHIVO_HORA", "4"))
+PAUSA_ARCHIVO = 0.5
+# Eventos actualizados a la vez al recalcular los instantes tras cambiar la zona de un servidor
+RECALCULO_LOTE = 50
+# Sin caducidad por defecto: la sincronización incremental mantiene las copias al día
+almacenes = AlmacenesServidores(
+    repositorio, servidores,
+    max_edad=int(os.getenv("CACHE_MAX_EDAD", "0")) or None,
+    retencion=RETENCION_ARCHIVO or None
+)
+estado = EstadoLocal(os.getenv("ESTADO_DB", "estado.db"))
+registro = RegistroRecordatorios(estado, zona_de=zona_servidor)
+ejecuciones = RegistroEjecuciones(estado)
+GRACIA_RECORDATORIOS = timedelta(minutes=int(os.getenv("RECORDATORIOS_GRACIA", "60")))
+# Solo se arman los recordatorios que vencen dentro del horizonte; la ventana se amplía cada PASO_HORIZONTE
+HORIZONTE_RECORDATORIOS = timedelta(hours=int(os.getenv("RECORDATORIOS_HORIZONTE", "48")))
+PASO_HORIZONTE = timedelta(hours=1)
+SINCRONIZACION_INTERVALO = float(os.getenv("SINCRONIZACION_INTERVALO", "15"))
+# Tramo anterior a la última consulta que se vuelve a leer: cubre transacciones
+# que confirman tarde y el desfase entre el reloj del bot y el de la base de datos
+SOLAPE_SINCRONIZACION = timedelta(seconds=30)
+despachador = Despachador(ventana=float(os.getenv("RECORDATORIOS_VENTANA", "2")))
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log', mode='a')
-    ]
-)
+configurar_logging()
 
 logger = logging.getLogger(__name__)
 
 # Configurar intents
 intents = discord.Intents.default()
 intents.message_content = True
-client = commands.Bot(command_prefix="/", intents=intents)
-tree = client.tree
 
-    
-def cargar_eventos():
+
+def crear_cliente():
+    # Las esperas por 429 de más de 30 s llegan al despachador como RateLimited
+    # en lugar de bloquear la petición dentro de discord.py
+    opciones = {"max_ratelimit_timeout": 30.0}
+    if not SHARDS:
+        return commands.Bot(command_prefix="/", intents=intents, **opciones)
+    if SHARDS != "auto":
+        opciones["shard_count"] = int(SHARDS)
+        if SHARD_IDS:
+            opciones["shard_ids"] = SHARD_IDS
+    return commands.AutoShardedBot(command_prefix="/", intents=intents, **opciones)
+
+
+client = crear_cliente()
+tree = client.tree
+comandos_sincronizados = False
+tareas_resumen = {}
+tarea_metricas = None
+tarea_horizonte = None
+tarea_sincronizacion = None
+# Instante desde el que se piden cambios a la base de datos
+marca_sincronizacion = None
+# Fin de la ventana de recordatorios cargada; None hasta la primera carga
+horizonte = None
+
+
+def servidor_de(evento):
+    # Los recordatorios registrados antes de haber varios servidores no llevan guild_id
+    return evento.get("guild_id") or GUILD_ID
+
+def servidor_propio(guild_id):
+    """True si el servidor está en los shards de este proceso"""
+    return client.get_guild(guild_id) is not None
+
+def canal_anuncios(guild_id):
+    config = servidores.obtener(guild_id)
+    return client.get_channel(config.canal_id) if config.canal_id else None
+
+def canal_recordatorios(guild_id):
+    """Canal de anuncios del servidor o, si no tiene, su canal de sistema"""
+    canal = canal_anuncios(guild_id)
+    if canal is None:
+        guild = client.get_guild(guild_id)
+        canal = guild.system_channel if guild else None
+    return canal
+
+async def publicar(interaction, aviso, **mensaje):
+    """Publica la respuesta de una orden en el canal de anuncios del servidor
+
+    Si la orden llegó por otro canal allí solo queda `aviso`, en privado; sin
+    canal de anuncios se responde donde se usó la orden.
+    """
+    canal = canal_anuncios(interaction.guild_id)
+    responder = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+    if canal is None or canal.id == interaction.channel_id:
+        await responder(**mensaje)
+        return
+    await responder(aviso, ephemeral=True)
+    # La orden ya está respondida: un fallo del canal solo se registra
     try:
-        response = supabase.table("eventos").select("*").execute()
-        return response.data if response.data else []
+        await despachador.enviar(canal, **mensaje)
     except Exception as e:
-        logger.error(f"Error cargando eventos desde Supabase: {e}")
-        return []
+        logger.error(f"Error publicando en el canal {canal.id}: {e}", extra={"guild": interaction.guild_id})
 
-def guardar_evento(evento):
+async def responder_error(interaction, texto):
+    """Avisa en privado del fallo de una orden, tanto si ya se había respondido como si no"""
     try:
-        response = supabase.table("eventos").insert(evento).execute()
-        return response.data[0] if response.data else None
+        if interaction.response.is_done():
+            await interaction.followup.send(texto, ephemeral=True)
+        else:
+            await interaction.response.send_message(texto, ephemeral=True)
     except Exception as e:
-        logger.error(f"Error guardando evento en Supabase: {e}")
-        return None
-    
-def actualizar_evento(id, campo, valor):
+        logger.error(f"Error avisando del fallo de la orden: {e}")
+
+
+def texto_recordatorio(evento):
+    return f"\"{evento['nombre']}\" es el {evento['fecha']} a las {evento['hora']} en {evento['lugar']}."
+
+async def enviar_recordatorio(evento, momento):
+    # Reclamar en el registro antes de enviar: un recordatorio nunca sale dos veces.
+    # Solo el del momento programado: si entretanto se reprogramó, este ya no vale
+    if not await registro.reclamar(evento["id"], momento):
+        return
+    guild_id = servidor_de(evento)
+    try:
+        canal = canal_recordatorios(guild_id)
+        if not canal:
+            raise RuntimeError(f"Servidor {guild_id} sin canal para recordatorios")
+        await despachador.recordatorio(canal, evento, texto_recordatorio(evento))
+    except Exception:
+        await registro.liberar(evento["id"], momento)
+        raise
+    if evento.get("rrule"):
+        # Armar el recordatorio de la siguiente ocurrencia de la serie
+        serie = await almacenes.de(guild_id).obtener(evento["id"])
+        if serie:
+            await programar_recordatorio(serie)
+
+async def enviar_recordatorios_atrasados(atrasados):
+    """Envía en un solo mensaje por servidor los recordatorios que vencieron con el bot desconectado"""
+    por_servidor = {}
+    for evento_id, momento, evento in atrasados:
+        if await registro.reclamar(evento_id, momento):
+            por_servidor.setdefault(servidor_de(evento), []).append((momento, evento))
+    await asyncio.gather(*(enviar_atrasados_servidor(g, reclamados) for g, reclamados in por_servidor.items()))
+
+async def enviar_atrasados_servidor(guild_id, reclamados):
     try:
-        data = {campo: valor}
-        response = supabase.table("eventos").update(data).eq("id", id).execute()
-        return response.data
+        canal = canal_recordatorios(guild_id)
+        if not canal:
+            raise RuntimeError(f"Servidor {guild_id} sin canal para recordatorios")
+        mensajes = embeds_recordatorios(
+            [(evento["nombre"], texto_recordatorio(evento)) for _, evento in reclamados],
+            "⏰ Recordatorios pendientes",
+            "Recordatorios que vencieron mientras el bot estaba desconectado"
+        )
+        await asyncio.gather(*(despachador.enviar(canal, embeds=embeds) for embeds in mensajes))
+        logger.info(f"{len(reclamados)} recordatorios atrasados enviados al servidor {guild_id}")
     except Exception as e:
-        logger.error(f"Error actualizando evento {id}: {e}")
+        logger.error(f"Error enviando recordatorios atrasados al servidor {guild_id}: {e}")
+        for momento, evento in reclamados:
+            await registro.liberar(evento["id"], momento)
+
+programador = ProgramadorRecordatorios(enviar_recordatorio)
+
+def recordatorio_vigente(evento, ahora):
+    """(evento u ocurrencia, momento) del recordatorio que toca armar, o None si no hay que armar ninguno
+
+    De una serie solo se arma la siguiente ocurrencia; al enviarla se arma la próxima.
+    De los eventos puntuales solo se arman los que vencen antes del horizonte.
+    """
+    es_serie = bool(evento.get("rrule"))
+    if es_serie and evento.get("remind_at") is not None:
+        zona = servidores.obtener(servidor_de(evento)).zona_info
+        evento = next((o for o in ocurrencias(evento, ahora, zona=zona) if o["remind_at"] > ahora), evento)
+    momento_envio = evento.get("remind_at")
+    if momento_envio is None or momento_envio <= ahora:
         return None
-
-def parse_recordatorio(valor):
-    dias = horas = minutos = 0
-    for match in re.finditer(r"(\d+)([dhm])", valor):
-        cantidad, unidad = int(match.group(1)), match.group(2)
-        if unidad == "d":
-            dias += cantidad
-        elif unidad == "h":
-            horas += cantidad
-        elif unidad == "m":
-            minutos += cantidad
-    return timedelta(days=dias, hours=horas, minutes=minutos)
-
-def eliminar_evento(id):
+    # Los puntuales más allá del horizonte los armará ampliar_horizonte cuando entren en la ventana
+    if not es_serie and horizonte is not None and momento_envio >= horizonte:
+        return None
+    return evento, momento_envio
+
+async def programar_recordatorios(eventos):
+    """Programa, reprograma o cancela los recordatorios de varios eventos según sus datos actuales
+
+    El registro se escribe en una sola transacción para todos.
+    """
+    ahora = datetime.now(timezone.utc)
+    armar, cancelar = [], []
+    for evento in eventos:
+        vigente = recordatorio_vigente(evento, ahora)
+        if vigente is None:
+            cancelar.append(evento["id"])
+        else:
+            armar.append((evento["id"], vigente[1], vigente[0]))
     try:
-        response = supabase.table("eventos").delete().eq("id", id).execute()
-        return response.data
+        await cancelar_recordatorios(cancelar)
+        for (id, momento, evento), armado in zip(armar, await registro.programar_lote(armar)):
+            if armado:
+                programador.programar(id, momento, evento)
+            else:
+                # Ya enviado o caducado: el registro ha quitado el pendiente
+                programador.cancelar(id)
     except Exception as e:
-        logger.error(f"Error eliminando evento {id}: {e}")
-        return None
+        logger.error(f"Error programando recordatorios: {e}")
 
 async def programar_recordatorio(evento):
-    if "recordatorio" not in evento:
+    await programar_recordatorios([evento])
+
+async def cancelar_recordatorios(ids):
+    for id in ids:
+        programador.cancelar(id)
+    await registro.cancelar_lote(ids)
+
+async def cancelar_recordatorio(id):
+    await cancelar_recordatorios([id])
+
+async def recuperar_recordatorios():
+    """Arma los recordatorios pendientes del registro y envía los atrasados dentro del margen"""
+    ahora = datetime.now(timezone.utc)
+    atrasados, futuros = await registro.recuperar(ahora, GRACIA_RECORDATORIOS)
+    # Con varios procesos cada uno solo arma los de los servidores de sus shards
+    futuros = [f for f in futuros if servidor_propio(servidor_de(f[2]))]
+    atrasados = [a for a in atrasados if servidor_propio(servidor_de(a[2]))]
+    fuera_de_ventana = []
+    for evento_id, momento, evento in futuros:
+        if horizonte is not None and momento >= horizonte and not evento.get("rrule"):
+            # Pendientes de antes de usar el horizonte: se volverán a armar al entrar en la ventana
+            fuera_de_ventana.append(evento_id)
+            continue
+        programador.programar(evento_id, momento, evento)
+    await registro.cancelar_lote(fuera_de_ventana)
+    await enviar_recordatorios_atrasados(atrasados)
+    # Las series avanzan a su siguiente ocurrencia aunque la última se enviara o caducara offline
+    await programar_recordatorios([s for s in await repositorio.series() if servidor_propio(servidor_de(s))])
+    await registro.purgar(ahora - timedelta(days=30))
+    logger.info(f"{len(futuros)} recordatorios pendientes recuperados del registro")
+
+async def ampliar_horizonte(desde, hasta):
+    """Arma los recordatorios de eventos puntuales que vencen en [desde, hasta) y extiende la ventana
+
+    Los ya vencidos solo se anotan en el registro: recuperar_recordatorios
+    decide si aún están dentro del margen para enviarse.
+    """
+    global horizonte
+    eventos = await repositorio.recordatorios(desde, hasta)
+    if eventos is None:
+        return False
+    horizonte = hasta
+    ahora = datetime.now(timezone.utc)
+    propios = [e for e in eventos if servidor_propio(servidor_de(e))]
+    # Los que vencen en este instante quedan en el registro y los envía el barrido de atrasados
+    await registro.programar_lote([(e["id"], e["remind_at"], e) for e in propios if e["remind_at"] <= ahora])
+    await programar_recordatorios([e for e in propios if e["remind_at"] > ahora])
+    return True
+
+async def mantener_horizonte():
+    """Cada PASO_HORIZONTE carga solo el tramo nuevo de la ventana de recordatorios"""
+    while True:
+        await asyncio.sleep(PASO_HORIZONTE.total_seconds())
+        ahora = datetime.now(timezone.utc)
+        try:
+            desde = horizonte if horizonte is not None else ahora - GRACIA_RECORDATORIOS
+            if not await ampliar_horizonte(desde, ahora + HORIZONTE_RECORDATORIOS):
+                logger.warning("No se pudo ampliar la ventana de recordatorios; se reintentará")
+        except Exception as e:
+            logger.error(f"Error ampliando la ventana de recordatorios: {e}")
+
+async def sincronizar_cambios():
+    """Lleva a las copias en memoria y al planificador lo que cambió en la base de datos
+
+    Solo se leen las filas modificadas y las lápidas de los borrados desde la
+    última consulta, nunca la tabla entera.
+    """
+    global marca_sincronizacion
+    inicio = datetime.now(timezone.utc)
+    cambios = await repositorio.cambios(marca_sincronizacion - SOLAPE_SINCRONIZACION)
+    if cambios is None:
+        return False
+    eventos, borrados = cambios
+    cambiados = almacenes.aplicar_cambios(eventos, borrados)
+    await programar_recordatorios([e for e in cambiados if servidor_propio(servidor_de(e))])
+    await cancelar_recordatorios([borrado["id"] for borrado in borrados])
+    marca_sincronizacion = inicio
+    return True
+
+async def mantener_sincronizacion():
+    while True:
+        await asyncio.sleep(SINCRONIZACION_INTERVALO)
+        try:
+            if not await sincronizar_cambios():
+                logger.warning("No se pudieron leer los cambios de la base de datos; se reintentará")
+        except Exception as e:
+            logger.error(f"Error sincronizando cambios: {e}")
+
+async def recalcular_momentos(guild_id, zona):
+    """Recalcula `starts_at` y `remind_at` de los eventos del servidor en su nueva zona y rearma sus recordatorios
+
+    `fecha` y `hora` son la hora local que se escribió y no cambian; los
+    instantes guardados se calcularon con la zona anterior. Se actualizan por
+    lotes solo los que cambian. Devuelve False si alguno no se pudo guardar.
+    """
+    eventos = await repositorio.cargar(guild_id)
+    if eventos is None:
+        return False
+    cambiados = []
+    for evento in eventos:
+        momentos = calcular_momentos(evento, zona)
+        if any(momentos[c] != evento.get(c) for c in momentos):
+            cambiados.append((evento["id"], momentos))
+    completo = True
+    for lote in en_lotes(cambiados, RECALCULO_LOTE):
+        resultados = await asyncio.gather(*(repositorio.actualizar(id, momentos) for id, momentos in lote))
+        completo = completo and all(resultados)
+        await programar_recordatorios([fila for filas in resultados if filas for fila in filas])
+    logger.info(f"Servidor {guild_id}: {len(cambiados)} eventos recalculados en la zona {zona.key}")
+    return completo
+
+async def archivar_pasados(momento):
+    """Traslada al archivo, por lotes, los eventos que empezaron antes de la retención
+
+    Cada lote es una transacción en la base de datos; los eventos salen
+    también de las copias en memoria. Si un lote falla la tarea periódica
+    lo reintenta más tarde y continúa por donde iba.
+    """
+    antes = momento - RETENCION_ARCHIVO
+    total = 0
+    while True:
+        archivados = await repositorio.archivar(antes, ARCHIVO_LOTE)
+        if archivados is None:
+            raise RuntimeError(f"archivado interrumpido tras {total} eventos")
+        almacenes.aplicar_cambios([], archivados)
+        total += len(archivados)
+        if len(archivados) < ARCHIVO_LOTE:
+            break
+        # Dejar hueco en el pool a las consultas de las órdenes entre lote y lote
+        await asyncio.sleep(PAUSA_ARCHIVO)
+    logger.info(f"Archivados {total} eventos anteriores a {antes:%Y-%m-%d}")
+
+archivado = TareaPeriodica("archivar_eventos", ReglaCalendario(ARCHIVO_HORA), archivar_pasados, ejecuciones)
+
+def armar_resumen(config):
+    """Crea, sustituye o detiene la tarea del resumen semanal de un servidor"""
+    anterior = tareas_resumen.pop(config.guild_id, None)
+    if anterior:
+        anterior.detener()
+    regla = config.regla_resumen()
+    if regla is None or not servidor_propio(config.guild_id):
         return
-    try:
-        fecha_evento = datetime.strptime(f"{evento['fecha']} {evento['hora']}", "%Y-%m-%d %H:%M:%S")
-        recordatorio_delta = parse_recordatorio(evento["recordatorio"])
-        momento_envio = fecha_evento - recordatorio_delta
-        espera = (momento_envio - datetime.now()).total_seconds()
-        
-        if espera > 0:
-            await asyncio.sleep(espera)
-            canal = client.get_channel(CHANNEL_ID) if CHANNEL_ID else None
-            if canal:
-                await canal.send(
-                    f"⏰ **Recordatorio:** \"{evento['nombre']}\" es el {evento['fecha']} a las {evento['hora']} en {evento['lugar']}."
-                )
-    except Exception as e:
-        logger.error(f"Error programando recordatorio: {e}")
+    tarea = TareaPeriodica(
+        f"resumen_semanal:{config.guild_id}",
+        regla,
+        lambda momento: resumen_semanal(config.guild_id, momento),
+        ejecuciones
+    )
+    tareas_resumen[config.guild_id] = tarea
+    tarea.iniciar()
+
+async def adoptar_servidor_heredado():
+    """Pasa la instalación de un solo servidor (GUILD_ID/CHANNEL_ID) al modo multiservidor"""
+    config = servidores.obtener(GUILD_ID)
+    if CHANNEL_ID and config.canal_id is None:
+        config.canal_id = CHANNEL_ID
+        await servidores.guardar(config)
+    asignados = await repositorio.asignar_servidor(GUILD_ID)
+    if asignados:
+        logger.info(f"{asignados} eventos sin servidor asignados a {GUILD_ID}")
+
+async def sincronizar_comandos():
+    """Publica los comandos globalmente; una vez por proceso y solo desde el shard 0"""
+    global comandos_sincronizados
+    # commands.Bot no tiene shard_ids; AutoShardedBot lo deja en None si atiende todos
+    shard_ids = getattr(client, "shard_ids", None)
+    if comandos_sincronizados or (shard_ids is not None and 0 not in shard_ids):
+        return
+    sincronizados = await tree.sync()
+    logger.info(f"{len(sincronizados)} comandos sincronizados globalmente")
+    if GUILD_ID:
+        # Quitar las copias que se sincronizaban antes solo en el servidor heredado
+        tree.clear_commands(guild=discord.Object(id=GUILD_ID))
+        await tree.sync(guild=discord.Object(id=GUILD_ID))
+    comandos_sincronizados = True
+
+# Un recordatorio vencido hace más de esto indica un planificador atascado
+RETRASO_MAX_PROGRAMADOR = 300
+
+async def comprobar_salud():
+    """Comprobaciones de /readyz: gateway, almacenamiento y planificador."""
+    proximo = programador.proximo()
+    return {
+        "gateway": client.is_ready() and not client.is_closed() and math.isfinite(client.latency),
+        "almacenamiento": await repositorio.comprobar(),
+        "programador": programador.activo() and (proximo is None or time.time() - proximo < RETRASO_MAX_PROGRAMADOR),
+    }
+
+@client.event
+async def setup_hook():
+    # Antes de conectar al gateway, para que /livez responda durante el arranque
+    await keep_alive(comprobar_salud, PUERTO)
+    logger.info(f"Servidor de salud escuchando en el puerto {PUERTO}")
+
+def muestrear_metricas():
+    """Actualiza los indicadores que se leen del estado del bot; corre en el event loop."""
+    metricas.RECORDATORIOS_PENDIENTES.fijar(len(programador))
+    metricas.PROXIMO_RECORDATORIO.fijar(programador.proximo() or 0)
+    metricas.COLA_SALIDA.fijar(len(despachador))
+    metricas.LATENCIA_GATEWAY.fijar(client.latency)
 
 @client.event
 async def on_ready():
-    logger.info(f"Bot conectado como {client.user}")
+    global tarea_metricas, tarea_horizonte, tarea_sincronizacion, marca_sincronizacion
+    logger.info(f"Bot conectado como {client.user} en {len(client.guilds)} servidores")
     try:
-        # Sincronizar comandos directamente en tu servidor
-        guild_obj = discord.Object(id=GUILD_ID)
-        logger.info(f"Sincronizando comandos en el servidor {GUILD_ID}...")
-        await tree.sync(guild=guild_obj)
-        logger.info(f"6 comandos sincronizados en guild {GUILD_ID}")
-        
-        # Programar recordatorios existentes
-        eventos = cargar_eventos()
-        for e in eventos:
-            asyncio.create_task(programar_recordatorio(e))
+        # Antes de cualquier lectura: lo que cambie desde aquí llega por sincronizar_cambios
+        if marca_sincronizacion is None:
+            marca_sincronizacion = datetime.now(timezone.utc)
+        if await servidores.cargar() and GUILD_ID:
+            await adoptar_servidor_heredado()
+        await sincronizar_comandos()
+
+        # Solo se consultan los recordatorios que vencen dentro del horizonte
+        # (y los vencidos dentro del margen); en reconexiones la ventana ya está cargada
+        if horizonte is None:
+            ahora = datetime.now(timezone.utc)
+            await ampliar_horizonte(ahora - GRACIA_RECORDATORIOS, ahora + HORIZONTE_RECORDATORIOS)
+        await recuperar_recordatorios()
         
-        # Iniciar tareas en background
-        resumen_semanal.start()
-        logger.info("Bot completamente inicializado con comandos limpios")
+        # Iniciar tareas en background (on_ready se repite en cada reconexión)
+        programador.iniciar()
+        if tarea_metricas is None or tarea_metricas.done():
+            tarea_metricas = asyncio.create_task(metricas.vigilar(muestrear_metricas))
+        if tarea_horizonte is None or tarea_horizonte.done():
+            tarea_horizonte = asyncio.create_task(mantener_horizonte())
+        if tarea_sincronizacion is None or tarea_sincronizacion.done():
+            tarea_sincronizacion = asyncio.create_task(mantener_sincronizacion())
+        if RETENCION_ARCHIVO:
+            archivado.iniciar()
+        for config in servidores.configurados():
+            if config.guild_id not in tareas_resumen:
+                armar_resumen(config)
+        logger.info("Bot completamente inicializado")
     except Exception as e:
         logger.error(f"Error en on_ready: {e}")
 
 # Comandos slash
-guild_obj = discord.Object(id=GUILD_ID) if GUILD_ID else None
+DIAS_ES = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+EVENTOS_POR_PAGINA = 10  # Límite de campos razonable por embed
+IMPORTACION_LOTE = min(int(os.getenv("IMPORTACION_LOTE", "100")), 500)
+IMPORTACION_MAX_BYTES = int(os.getenv("IMPORTACION_MAX_KB", "5120")) * 1024
+EXPORTACION_PAGINA = 500
+EXPORTACION_DESDE = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Segundos que se reutiliza el embed de /semana y /mes mientras los eventos no cambien
+VISTAS_TTL = float(os.getenv("VISTAS_TTL", "30"))
+vistas_en_curso = LlamadasCompartidas()
+vistas_memo = MemoVersionado(ttl=VISTAS_TTL)
+SOLAPES_MOSTRADOS = 5
+# Franja de cada día en la que /libre busca huecos; con cierre 00:00 llega hasta la medianoche
+APERTURA_LIBRE, CIERRE_LIBRE = (
+    datetime.strptime(h.strip(), "%H:%M").time() for h in os.getenv("HORARIO_LIBRE", "08:00-22:00").split("-")
+)
+LIBRE_MAX_DIAS = 31
 
-@tree.command(name="crear_evento", description="Crea un nuevo evento", guild=guild_obj)
+
+def anotar_solapes(embed, conflictos):
+    """Añade al embed el aviso de los eventos que coinciden en el tiempo con el guardado."""
+    if not conflictos:
+        return
+    lineas = [
+        f"{'📍' if mismo_lugar else '🕒'} #{otro['id']} {otro['nombre']} · <t:{int(otro['starts_at'].timestamp())}:f>"
+        + (" (mismo lugar)" if mismo_lugar else "")
+        for otro, mismo_lugar in conflictos[:SOLAPES_MOSTRADOS]
+    ]
+    if len(conflictos) > SOLAPES_MOSTRADOS:
+        lineas.append(f"… y {len(conflictos) - SOLAPES_MOSTRADOS} más")
+    embed.add_field(name="⚠️ Coincide con", value="\n".join(lineas)[:1024], inline=False)
+
+
+@tree.command(name="crear_evento", description="Crea un nuevo evento")
+@app_commands.guild_only()
 @app_commands.describe(
     nombre="Nombre del evento", 
     fecha="Fecha en formato DD-MM-YYYY",  # <-- Cambiar descripción
     hora="Hora en formato HH:MM", 
     lugar="Ubicación del evento", 
-    recordatorio="Recordatorio (ej: 2d12h30m) - opcional"
+    recordatorio="Recordatorio (ej: 2d12h30m) - opcional",
+    duracion="Duración (ej: 1h30m) - opcional",
+    repetir="Repetir el evento - opcional",
+    intervalo="Cada cuántos días/semanas/meses se repite (por defecto 1)",
+    hasta="Última fecha de la serie en formato DD-MM-YYYY - opcional",
+    veces="Número total de repeticiones - opcional"
 )
-async def crear_evento(interaction: discord.Interaction, nombre: str, fecha: str, hora: str, lugar: str, recordatorio: str = None):
+@app_commands.choices(repetir=[
+    app_commands.Choice(name="Cada día", value="DAILY"),
+    app_commands.Choice(name="Cada semana", value="WEEKLY"),
+    app_commands.Choice(name="Cada mes", value="MONTHLY"),
+])
+@medir_comando
+async def crear_evento(interaction: discord.Interaction, nombre: str, fecha: str, hora: str, lugar: str, recordatorio: str = None,
+                       duracion: str = None, repetir: str = None, intervalo: int = 1, hasta: str = None, veces: int = None):
     try:
+        almacen = almacenes.de(interaction.guild_id)
         # Validar formato de fecha y hora (input DD-MM-YYYY)
         fecha_obj = datetime.strptime(fecha, "%d-%m-%Y")
         # Convertir a formato YYYY-MM-DD para la base de datos
         fecha_db = fecha_obj.strftime("%Y-%m-%d")
-        # Validar hora
-        datetime.strptime(hora, "%H:%M")
+        # Validar hora y guardarla como HH:MM
+        hora = datetime.strptime(hora, "%H:%M").strftime("%H:%M")
         
         nuevo = {
             "nombre": nombre,
@@ -162,8 +567,20 @@ async def crear_evento(interaction: discord.Interaction, nombre: str, fecha: str
         }
         if recordatorio:
             nuevo["recordatorio"] = recordatorio
+        if duracion:
+            if not parse_recordatorio(duracion):
+                await interaction.response.send_message("❌ Duración no válida. Usa el formato del recordatorio (ej: 1h30m)", ephemeral=True)
+                return
+            nuevo["duracion"] = duracion
+        if repetir:
+            try:
+                hasta_obj = datetime.strptime(hasta, "%d-%m-%Y").date() if hasta else None
+                nuevo["rrule"] = str(Recurrencia(repetir, intervalo, hasta_obj, veces))
+            except ValueError as e:
+                await interaction.response.send_message(f"❌ Repetición no válida: {e}", ephemeral=True)
+                return
 
-        evento_insertado = guardar_evento(nuevo)
+        evento_insertado = await almacen.crear(nuevo)
         if not evento_insertado:
             await interaction.response.send_message("❌ Error al guardar en la base de datos.", ephemeral=True)
             return
@@ -175,31 +592,33 @@ async def crear_evento(interaction: discord.Interaction, nombre: str, fecha: str
         )
         if recordatorio:
             embed.add_field(name="🔔 Recordatorio", value=recordatorio, inline=False)
+        if duracion:
+            embed.add_field(name="⏱️ Duración", value=duracion, inline=False)
+        if repetir:
+            embed.add_field(name="🔁 Repetición", value=nuevo["rrule"], inline=False)
+        anotar_solapes(embed, await almacen.conflictos(evento_insertado))
         
-        # Enviar respuesta en el canal específico si es diferente
-        if interaction.channel.id != CHANNEL_ID:
-            await interaction.response.send_message("✅ Evento creado (respuesta enviada al canal principal)", ephemeral=True)
-            canal = client.get_channel(CHANNEL_ID)
-            if canal:
-                await canal.send(embed=embed)
-        else:
-            await interaction.response.send_message(embed=embed)
+        # Programar recordatorio antes de responder: el evento ya está guardado
+        await programar_recordatorio(evento_insertado)
         
-        # Programar recordatorio
-        asyncio.create_task(programar_recordatorio(nuevo))
-        logger.info(f"Evento creado: {nombre}")
+        # Enviar respuesta en el canal específico si es diferente
+        await publicar(interaction, "✅ Evento creado (respuesta enviada al canal principal)", embed=embed)
+        logger.info(f"Evento creado: {nombre}", extra={"guild": interaction.guild_id, "evento": evento_insertado["id"]})
         
     except ValueError:
         await interaction.response.send_message("❌ Formato de fecha u hora incorrecto. Usa DD-MM-YYYY para fecha y HH:MM para hora.", ephemeral=True)
     except Exception as e:
         logger.error(f"Error creando evento: {e}")
-        await interaction.response.send_message("❌ Error al crear el evento.", ephemeral=True)
+        await responder_error(interaction, "❌ Error al crear el evento.")
  
-@tree.command(name="modificar_evento", description="Modifica un campo de un evento", guild=guild_obj)
-@app_commands.describe(id="ID del evento", campo="Campo a modificar", valor="Nuevo valor")
+@tree.command(name="modificar_evento", description="Modifica un campo de un evento")
+@app_commands.guild_only()
+@app_commands.describe(id="Evento: escribe parte del nombre o el ID", campo="Campo a modificar", valor="Nuevo valor")
+@medir_comando
 async def modificar_evento(interaction: discord.Interaction, id: int, campo: str, valor: str):
     try:
-        campos_validos = ["nombre", "fecha", "hora", "lugar", "recordatorio"]
+        almacen = almacenes.de(interaction.guild_id)
+        campos_validos = ["nombre", "fecha", "hora", "lugar", "recordatorio", "duracion"]
 
         if campo not in campos_validos:
             await interaction.response.send_message(
@@ -223,16 +642,20 @@ async def modificar_evento(interaction: discord.Interaction, id: int, campo: str
                 await interaction.response.send_message("❌ Hora inválida. Usa el formato HH:MM", ephemeral=True)
                 return
 
+        if campo == "duracion" and not parse_recordatorio(valor):
+            await interaction.response.send_message("❌ Duración inválida. Usa el formato del recordatorio (ej: 1h30m)", ephemeral=True)
+            return
+
         # Verificar que el evento exista
-        evento_res = supabase.table("eventos").select("*").eq("id", id).execute()
-        if not evento_res.data:
+        evento = await almacen.obtener(id)
+        if not evento:
             await interaction.response.send_message("❌ Evento no encontrado", ephemeral=True)
             return
 
         # Realizar la actualización
-        response = supabase.table("eventos").update({campo: valor}).eq("id", id).execute()
+        actualizado = await almacen.actualizar(id, {campo: valor}, actual=evento)
 
-        if response.status_code != 200:
+        if not actualizado:
             await interaction.response.send_message("❌ Error al actualizar en la base de datos", ephemeral=True)
             return
 
@@ -242,40 +665,36 @@ async def modificar_evento(interaction: discord.Interaction, id: int, campo: str
             description=f"**ID {id}:** {campo} actualizado a '{valor}'",
             color=0xFFD700
         )
+        if campo in ("fecha", "hora", "lugar", "duracion"):
+            anotar_solapes(embed, await almacen.conflictos(actualizado[0]))
 
-        if interaction.channel.id != CHANNEL_ID:
-            await interaction.response.send_message("✏️ Evento modificado (respuesta enviada al canal principal)", ephemeral=True)
-            canal = client.get_channel(CHANNEL_ID)
-            if canal:
-                await canal.send(embed=embed)
-        else:
-            await interaction.response.send_message(embed=embed)
+        await programar_recordatorio(actualizado[0])
 
-        logger.info(f"Evento {id} modificado: {campo} = {valor}")
+        await publicar(interaction, "✏️ Evento modificado (respuesta enviada al canal principal)", embed=embed)
+        logger.info(f"Evento {id} modificado: {campo} = {valor}", extra={"guild": interaction.guild_id, "evento": id})
 
     except Exception as e:
         logger.error(f"Error modificando evento: {e}")
-        await interaction.response.send_message("❌ Error al modificar el evento.", ephemeral=True)
+        await responder_error(interaction, "❌ Error al modificar el evento.")
 
         
-@tree.command(name="eliminar_evento", description="Elimina un evento", guild=guild_obj)
-@app_commands.describe(id="ID del evento a eliminar")
+@tree.command(name="eliminar_evento", description="Elimina un evento")
+@app_commands.guild_only()
+@app_commands.describe(id="Evento a eliminar: escribe parte del nombre o el ID")
+@medir_comando
 async def eliminar_evento(interaction: discord.Interaction, id: int):
     try:
+        almacen = almacenes.de(interaction.guild_id)
         await interaction.response.defer(ephemeral=True)  # ✅ Reservamos la interacción
 
         # Verificar si el evento existe antes de eliminar
-        response = supabase.table("eventos").select("*").eq("id", id).execute()
-        if not response.data:
+        evento_eliminado = await almacen.obtener(id)
+        if not evento_eliminado:
             await interaction.followup.send("❌ Evento no encontrado")
             return
 
-        evento_eliminado = response.data[0]
-
         # Ejecutar la eliminación
-        delete_response = supabase.table("eventos").delete().eq("id", id).execute()
-
-        if delete_response.data == []:
+        if not await almacen.eliminar(id, actual=evento_eliminado):
             await interaction.followup.send("❌ Error al eliminar el evento de la base de datos.")
             return
 
@@ -285,33 +704,92 @@ async def eliminar_evento(interaction: discord.Interaction, id: int):
             color=0xFF0000
         )
 
-        if interaction.channel.id != CHANNEL_ID:
-            await interaction.followup.send("🗑️ Evento eliminado (respuesta enviada al canal principal)")
-            canal = client.get_channel(CHANNEL_ID)
-            if canal:
-                await canal.send(embed=embed)
-        else:
-            await interaction.followup.send(embed=embed)
+        await cancelar_recordatorio(id)
 
-        logger.info(f"Evento eliminado: {evento_eliminado['nombre']} - ID {id}")
+        await publicar(interaction, "🗑️ Evento eliminado (respuesta enviada al canal principal)", embed=embed)
+        logger.info(f"Evento eliminado: {evento_eliminado['nombre']} - ID {id}", extra={"guild": interaction.guild_id, "evento": id})
 
     except Exception as e:
         logger.error(f"Error eliminando evento: {e}")
-        try:
-            await interaction.followup.send("❌ Error al eliminar el evento.")
-        except:
-            pass  # Silenciar si ya fue respondido
+        await responder_error(interaction, "❌ Error al eliminar el evento.")
 
 
         
-@tree.command(name="listar_eventos", description="Muestra todos los eventos próximos", guild=guild_obj)
+@tree.command(name="omitir", description="Quita una fecha de un evento que se repite")
+@app_commands.guild_only()
+@app_commands.describe(id="Serie: escribe parte del nombre o el ID", fecha="Fecha a omitir en formato DD-MM-YYYY")
+@medir_comando
+async def omitir(interaction: discord.Interaction, id: int, fecha: str):
+    try:
+        almacen = almacenes.de(interaction.guild_id)
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        dia = datetime.strptime(fecha, "%d-%m-%Y").date()
+        serie = await almacen.obtener(id)
+        if not serie or not serie.get("rrule"):
+            await interaction.response.send_message("❌ No existe un evento que se repita con ese ID", ephemeral=True)
+            return
+        dia_siguiente = inicio_dia(dia + timedelta(days=1), zona)
+        if next(ocurrencias(serie, inicio_dia(dia, zona), dia_siguiente, zona), None) is None:
+            await interaction.response.send_message("❌ La serie no tiene ninguna ocurrencia ese día", ephemeral=True)
+            return
+
+        fechas = sorted(excepciones(serie) | {dia})
+        actualizado = await almacen.actualizar(id, {"excepciones": ",".join(d.isoformat() for d in fechas)}, actual=serie)
+        if not actualizado:
+            await interaction.response.send_message("❌ Error al actualizar en la base de datos", ephemeral=True)
+            return
+
+        await programar_recordatorio(actualizado[0])
+        await interaction.response.send_message(f"🚫 **{serie['nombre']}** (ID {id}) no se celebrará el {fecha}")
+        logger.info(f"Ocurrencia {dia} omitida en la serie {id}", extra={"guild": interaction.guild_id, "evento": id})
+
+    except ValueError:
+        await interaction.response.send_message("❌ Fecha inválida. Usa el formato DD-MM-YYYY", ephemeral=True)
+    except Exception as e:
+        logger.error(f"Error omitiendo ocurrencia: {e}")
+        await responder_error(interaction, "❌ Error al omitir la fecha.")
+
+
+def opcion_evento(evento, zona):
+    """Texto de un evento en las sugerencias de autocompletado (máx. 100 caracteres)"""
+    momento = evento["starts_at"].astimezone(zona).strftime("%d-%m-%Y %H:%M")
+    repite = " 🔁" if evento.get("rrule") else ""
+    texto = f"{evento['id']} · {evento['nombre']} · {momento}{repite}"
+    return texto if len(texto) <= 100 else texto[:99] + "…"
+
+async def sugerir_eventos(interaction, actual, solo_series=False):
+    try:
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        eventos = await almacenes.de(interaction.guild_id).sugerencias(actual, solo_series=solo_series)
+        return [app_commands.Choice(name=opcion_evento(e, zona), value=e["id"]) for e in eventos]
+    except Exception as e:
+        logger.error(f"Error autocompletando eventos: {e}")
+        return []
+
+@modificar_evento.autocomplete("id")
+async def autocompletar_modificar(interaction: discord.Interaction, actual: str):
+    return await sugerir_eventos(interaction, actual)
+
+@eliminar_evento.autocomplete("id")
+async def autocompletar_eliminar(interaction: discord.Interaction, actual: str):
+    return await sugerir_eventos(interaction, actual)
+
+@omitir.autocomplete("id")
+async def autocompletar_omitir(interaction: discord.Interaction, actual: str):
+    return await sugerir_eventos(interaction, actual, solo_series=True)
+
+@tree.command(name="listar_eventos", description="Muestra todos los eventos próximos")
+@app_commands.guild_only()
+@medir_comando
 async def listar_eventos(interaction: discord.Interaction):
     try:
-        # Obtener eventos ordenados por fecha y hora
-        response = supabase.table("eventos").select("*").order("fecha", desc=False).order("hora", desc=False).execute()
-        eventos = response.data if response.data else []
+        almacen = almacenes.de(interaction.guild_id)
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        # Solo eventos próximos, paginados por (starts_at, id)
+        ahora = datetime.now(zona)
+        total = await almacen.contar(ahora)
 
-        if not eventos:
+        if not total:
             embed = discord.Embed(
                 title="📭 No hay eventos",
                 description="No hay eventos programados actualmente.",
@@ -320,124 +798,113 @@ async def listar_eventos(interaction: discord.Interaction):
             await interaction.response.send_message(embed=embed)
             return
 
-        embed = discord.Embed(
-            title="📅 Eventos Programados",
-            color=0x0099FF
-        )
-
-        for e in eventos[:10]:  # Limitar a 10 para evitar límite de caracteres
-            try:
-                evento_time = datetime.strptime(f"{e['fecha']} {e['hora']}", "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                evento_time = datetime.strptime(f"{e['fecha']} {e['hora']}", "%Y-%m-%d %H:%M")
-            # Si tus horas están en UTC en la base de datos, usa la siguiente línea:
-            # evento_time = evento_time.replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo("Europe/Madrid"))
-            # Si ya están en hora de Madrid, solo:
-            evento_time = evento_time.replace(tzinfo=ZoneInfo("Europe/Madrid"))
-            timestamp = int(evento_time.timestamp())
-
-            embed.add_field(
-                name=f"#{e['id']} - {e['nombre']}",
-                value=f"📅 <t:{timestamp}:F>\n📍 {e['lugar']}",
-                inline=False
+        def construir_embed(eventos, pagina):
+            embed = discord.Embed(
+                title="📅 Eventos Programados",
+                color=0x0099FF
             )
+            for e in eventos:
+                timestamp = int(e["starts_at"].timestamp())
 
-        if len(eventos) > 10:
-            embed.set_footer(text=f"Mostrando 10 de {len(eventos)} eventos")
+                embed.add_field(
+                    name=f"#{e['id']} - {e['nombre']}",
+                    value=f"📅 <t:{timestamp}:F>\n📍 {e['lugar']}",
+                    inline=False
+                )
+            # Las series no tienen fin conocido: se cuentan una vez y no hay total de páginas
+            embed.set_footer(text=f"Página {pagina} · {total} eventos próximos")
+            return embed
+
+        vista = VistaPaginada(
+            lambda cursor, limite: almacen.pagina(ahora, cursor, limite),
+            clave_evento,
+            construir_embed,
+            interaction.user.id,
+            por_pagina=EVENTOS_POR_PAGINA
+        )
+        embed = await vista.mostrar()
 
         # Enviar respuesta en canal correcto
-        if interaction.channel.id != CHANNEL_ID:
-            await interaction.response.send_message("📋 Lista de eventos enviada al canal principal", ephemeral=True)
-            canal = client.get_channel(CHANNEL_ID)
-            if canal:
-                await canal.send(embed=embed)
-        else:
-            await interaction.response.send_message(embed=embed)
+        await publicar(interaction, "📋 Lista de eventos enviada al canal principal", embed=embed, view=vista)
 
         logger.info("Lista de eventos enviada")
 
     except Exception as e:
         logger.error(f"Error listando eventos: {e}")
-        try:
-            if not interaction.response.is_done():
-                await interaction.response.send_message("❌ Error al listar eventos.", ephemeral=True)
-            else:
-                await interaction.followup.send("❌ Error al listar eventos.", ephemeral=True)
-        except Exception:
-            pass
+        await responder_error(interaction, "❌ Error al listar eventos.")
         
         
-@tree.command(name="semana", description="Muestra los eventos de una semana específica", guild=guild_obj)
+async def vista_compartida(guild_id, clave, construir):
+    """Embed de una vista de calendario; `clave` identifica la orden y su ventana
+
+    `construir(almacen)` se ejecuta una sola vez para todas las peticiones
+    simultáneas de la misma vista, y su resultado se reutiliza durante
+    VISTAS_TTL segundos mientras la versión de los eventos del servidor no
+    cambie. Cada petición recibe su propia copia del embed.
+    """
+    almacen = almacenes.de(guild_id)
+    version = await almacen.version_actual()
+    clave = (guild_id, *clave)
+    embed = vistas_memo.obtener(clave, version)
+    if embed is None:
+        metricas.VISTAS.incrementar(resultado="compartida" if (clave, version) in vistas_en_curso else "construida")
+        embed = await vistas_en_curso.llamar((clave, version), construir, almacen)
+        vistas_memo.guardar(clave, version, embed)
+    else:
+        metricas.VISTAS.incrementar(resultado="memo")
+    return embed.copy()
+
+
+@tree.command(name="semana", description="Muestra los eventos de una semana específica")
+@app_commands.guild_only()
 @app_commands.describe(numero="Número de semana (1-53), si no se especifica usa la semana actual")
+@medir_comando
 async def semana(interaction: discord.Interaction, numero: int = None):
     try:
-        hoy = datetime.now()
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        hoy = datetime.now(zona)
         año = hoy.year
         semana_obj = numero or hoy.isocalendar()[1]
 
         lunes = datetime.fromisocalendar(año, semana_obj, 1).date()
         domingo = lunes + timedelta(days=6)
 
-        # Diccionario para traducir días de la semana al español
-        dias_es = {
-            "Monday": "Lunes",
-            "Tuesday": "Martes",
-            "Wednesday": "Miércoles",
-            "Thursday": "Jueves",
-            "Friday": "Viernes",
-            "Saturday": "Sábado",
-            "Sunday": "Domingo"
-        }
-
-        # Consulta a supabase con filtro entre lunes y domingo
-        response = supabase.table("eventos").select("*") \
-            .gte("fecha", lunes.isoformat()) \
-            .lte("fecha", domingo.isoformat()) \
-            .order("fecha", desc=False) \
-            .order("hora", desc=False) \
-            .execute()
-            
-        eventos_semana = response.data if response.data else []
+        async def construir(almacen):
+            # Consulta con filtro entre lunes y domingo
+            eventos_semana = await almacen.rango(lunes, domingo + timedelta(days=1))
 
-        embed = discord.Embed(
-            title=f"📅 Semana {semana_obj} ({lunes.strftime('%d/%m')} - {domingo.strftime('%d/%m')})",
-            color=0x0099FF
-        )
+            embed = discord.Embed(
+                title=f"📅 Semana {semana_obj} ({lunes.strftime('%d/%m')} - {domingo.strftime('%d/%m')})",
+                color=0x0099FF
+            )
 
-        if not eventos_semana:
-            embed.description = "No hay eventos programados para esta semana."
-        else:
-            for e in eventos_semana:
-                # Asegurarse de que el formato de hora sea compatible
-                try:
-                    evento_time = datetime.strptime(f"{e['fecha']} {e['hora']}", "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    evento_time = datetime.strptime(f"{e['fecha']} {e['hora']}", "%Y-%m-%d %H:%M")
-                dia_semana_en = evento_time.strftime('%A')
-                dia_semana = dias_es.get(dia_semana_en, dia_semana_en)
-                embed.add_field(
-                    name=f"{dia_semana} - {e['nombre']}",
-                    value=f"🕒 {e['hora']} | 📍 {e['lugar']}",
-                    inline=False
-                )
+            if not eventos_semana:
+                embed.description = "No hay eventos programados para esta semana."
+            else:
+                for e in eventos_semana:
+                    inicio = e["starts_at"].astimezone(zona)
+                    embed.add_field(
+                        name=f"{DIAS_ES[inicio.weekday()]} - {e['nombre']}",
+                        value=f"🕒 {inicio:%H:%M} | 📍 {e['lugar']}",
+                        inline=False
+                    )
+            return embed
 
-        if interaction.channel.id != CHANNEL_ID:
-            await interaction.response.send_message("📅 Vista semanal enviada al canal principal", ephemeral=True)
-            canal = client.get_channel(CHANNEL_ID)
-            if canal:
-                await canal.send(embed=embed)
-        else:
-            await interaction.response.send_message(embed=embed)
+        embed = await vista_compartida(interaction.guild_id, ("semana", lunes), construir)
+        await publicar(interaction, "📅 Vista semanal enviada al canal principal", embed=embed)
     except Exception as e:
         logger.error(f"Error mostrando semana: {e}")
-        await interaction.response.send_message("❌ Error al mostrar eventos de la semana.", ephemeral=True)
+        await responder_error(interaction, "❌ Error al mostrar eventos de la semana.")
 
 
-@tree.command(name="mes", description="Muestra los eventos de un mes específico", guild=guild_obj)
+@tree.command(name="mes", description="Muestra los eventos de un mes específico")
+@app_commands.guild_only()
 @app_commands.describe(numero="Número de mes (1-12), si no se especifica usa el mes actual")
+@medir_comando
 async def mes(interaction: discord.Interaction, numero: int = None):
     try:
-        hoy = datetime.now()
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        hoy = datetime.now(zona)
         año = hoy.year
         mes_num = numero or hoy.month
 
@@ -445,19 +912,13 @@ async def mes(interaction: discord.Interaction, numero: int = None):
             await interaction.response.send_message("❌ El número del mes debe estar entre 1 y 12.", ephemeral=True)
             return
 
-        # Consulta a supabase
-        response = supabase.table("eventos") \
-            .select("*") \
-            .gte("fecha", f"{año}-{mes_num:02d}-01") \
-            .lt("fecha", f"{año}-{mes_num+1:02d}-01" if mes_num < 12 else f"{año+1}-01-01") \
-            .order("fecha", desc=False) \
-            .order("hora", desc=False) \
-            .execute()
-
-        eventos_mes = response.data if response.data else []
-        if not eventos_mes:
-            embed.description = "No hay eventos programados para este mes."
-        else:
+        # Consulta del mes completo
+        primer_dia = date(año, mes_num, 1)
+        siguiente_mes = date(año + 1, 1, 1) if mes_num == 12 else date(año, mes_num + 1, 1)
+
+        async def construir(almacen):
+            eventos_mes = await almacen.rango(primer_dia, siguiente_mes)
+
             nombres_meses = ["", "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
                             "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"]
             embed = discord.Embed(
@@ -469,104 +930,427 @@ async def mes(interaction: discord.Interaction, numero: int = None):
                 embed.description = "No hay eventos programados para este mes."
             else:
                 for e in eventos_mes:
-                    fecha_obj = datetime.strptime(e["fecha"], "%Y-%m-%d")
+                    inicio = e["starts_at"].astimezone(zona)
                     embed.add_field(
-                        name=f"Día {fecha_obj.day} - {e['nombre']}",
-                        value=f"🕒 {e['hora']} | 📍 {e['lugar']}",
+                        name=f"Día {inicio.day} - {e['nombre']}",
+                        value=f"🕒 {inicio:%H:%M} | 📍 {e['lugar']}",
                         inline=False
                     )
+            return embed
 
-        if interaction.channel.id != CHANNEL_ID:
-            await interaction.response.send_message("📅 Vista mensual enviada al canal principal", ephemeral=True)
-            canal = client.get_channel(CHANNEL_ID)
-            if canal:
-                await canal.send(embed=embed)
-        else:
-            await interaction.response.send_message(embed=embed)
+        embed = await vista_compartida(interaction.guild_id, ("mes", primer_dia), construir)
+        await publicar(interaction, "📅 Vista mensual enviada al canal principal", embed=embed)
 
     except Exception as e:
         logger.error(f"Error mostrando mes: {e}")
-        await interaction.response.send_message("❌ Error al mostrar eventos del mes.", ephemeral=True)
+        await responder_error(interaction, "❌ Error al mostrar eventos del mes.")
 
 
-@tasks.loop(minutes=1)
-async def resumen_semanal():
+@tree.command(name="buscar", description="Busca eventos por nombre o lugar")
+@app_commands.guild_only()
+@app_commands.describe(
+    texto="Palabras del nombre o del lugar (sin importar mayúsculas ni tildes)",
+    desde="Solo eventos desde esta fecha (DD-MM-YYYY)",
+    hasta="Solo eventos hasta esta fecha incluida (DD-MM-YYYY)"
+)
+@medir_comando
+async def buscar(interaction: discord.Interaction, texto: str, desde: str = None, hasta: str = None):
     try:
-        ahora = datetime.now(ZoneInfo("Europe/Madrid"))
-        # Diccionario para traducir días de la semana al español
-        dias_es = {
-            "Monday": "Lunes",
-            "Tuesday": "Martes",
-            "Wednesday": "Miércoles",
-            "Thursday": "Jueves",
-            "Friday": "Viernes",
-            "Saturday": "Sábado",
-            "Sunday": "Domingo"
-        }
-        # Enviar resumen los domingos a las 20:00 y para depuración hoy lunes a las 19:41
-        enviar = False
-        if ahora.weekday() == 6 and ahora.hour == 20:
-            enviar = True
-
-        if enviar:
-            proximo_lunes = ahora + timedelta(days=(7 - ahora.weekday())) if ahora.weekday() != 0 else ahora
-            proximo_lunes = proximo_lunes.replace(hour=0, minute=0, second=0, microsecond=0)
-            siguiente_domingo = proximo_lunes + timedelta(days=6)
-
-            # Filtrar eventos entre próximo lunes y siguiente domingo
-            response = supabase.table("eventos") \
-                .select("*") \
-                .gte("fecha", proximo_lunes.strftime("%Y-%m-%d")) \
-                .lte("fecha", siguiente_domingo.strftime("%Y-%m-%d")) \
-                .order("fecha", desc=False) \
-                .order("hora", desc=False) \
-                .execute()
-            
-            embed = discord.Embed(
-                title=f"📅 Planificación Semanal",
-                description=f"Eventos del {proximo_lunes.strftime('%d/%m')} al {siguiente_domingo.strftime('%d/%m')}",
-                color=0x0099FF
+        almacen = almacenes.de(interaction.guild_id)
+        try:
+            dia_desde = datetime.strptime(desde, "%d-%m-%Y").date() if desde else None
+            dia_hasta = datetime.strptime(hasta, "%d-%m-%Y").date() + timedelta(days=1) if hasta else None
+        except ValueError:
+            await interaction.response.send_message("❌ Fecha inválida. Usa el formato DD-MM-YYYY", ephemeral=True)
+            return
+
+        # Lista completa ya ordenada por relevancia; las páginas son tramos de ella
+        resultados = list(enumerate(await almacen.buscar(texto, dia_desde, dia_hasta)))
+        if not resultados:
+            await interaction.response.send_message(f"🔎 Ningún evento coincide con \"{texto}\".", ephemeral=True)
+            return
+
+        async def cargar_pagina(cursor, limite):
+            inicio = 0 if cursor is None else cursor + 1
+            return resultados[inicio:inicio + limite]
+
+        def construir_embed(pagina_resultados, pagina):
+            embed = discord.Embed(title=f"🔎 Resultados para \"{texto}\"", color=0x0099FF)
+            for _, e in pagina_resultados:
+                repite = " 🔁" if e.get("rrule") else ""
+                embed.add_field(
+                    name=f"#{e['id']} - {e['nombre']}{repite}",
+                    value=f"📅 <t:{int(e['starts_at'].timestamp())}:F>\n📍 {e['lugar']}",
+                    inline=False
+                )
+            paginas = -(-len(resultados) // EVENTOS_POR_PAGINA)
+            embed.set_footer(text=f"Página {pagina} de {paginas} · {len(resultados)} eventos")
+            return embed
+
+        vista = VistaPaginada(
+            cargar_pagina,
+            lambda resultado: resultado[0],
+            construir_embed,
+            interaction.user.id,
+            por_pagina=EVENTOS_POR_PAGINA
+        )
+        embed = await vista.mostrar()
+        await interaction.response.send_message(embed=embed, view=vista, ephemeral=True)
+
+    except Exception as e:
+        logger.error(f"Error buscando eventos: {e}")
+        await responder_error(interaction, "❌ Error al buscar eventos.")
+
+
+@tree.command(name="historial", description="Consulta los eventos pasados ya archivados")
+@app_commands.guild_only()
+@app_commands.describe(
+    texto="Palabras del nombre o del lugar - opcional",
+    desde="Desde esta fecha (DD-MM-YYYY) - opcional",
+    hasta="Hasta esta fecha incluida (DD-MM-YYYY) - opcional"
+)
+@medir_comando
+async def historial(interaction: discord.Interaction, texto: str = None, desde: str = None, hasta: str = None):
+    try:
+        guild_id = interaction.guild_id
+        zona = servidores.obtener(guild_id).zona_info
+        try:
+            inicio = inicio_dia(datetime.strptime(desde, "%d-%m-%Y").date(), zona) if desde else None
+            fin = inicio_dia(datetime.strptime(hasta, "%d-%m-%Y").date() + timedelta(days=1), zona) if hasta else None
+        except ValueError:
+            await interaction.response.send_message("❌ Fecha inválida. Usa el formato DD-MM-YYYY", ephemeral=True)
+            return
+
+        # Del más reciente al más antiguo, paginado por (starts_at, id) sobre la tabla de archivo
+        async def cargar_pagina(cursor, limite):
+            return await repositorio.historial(guild_id, inicio, fin, texto, cursor, limite)
+
+        def construir_embed(eventos, pagina):
+            embed = discord.Embed(title="🗄️ Historial de eventos", color=0x808080)
+            for e in eventos:
+                embed.add_field(
+                    name=f"#{e['id']} - {e['nombre']}",
+                    value=f"📅 <t:{int(e['starts_at'].timestamp())}:F>\n📍 {e['lugar']}",
+                    inline=False
+                )
+            if not eventos:
+                embed.description = "No hay eventos archivados que coincidan."
+            embed.set_footer(text=f"Página {pagina} · eventos de hace más de {RETENCION_ARCHIVO.days} días")
+            return embed
+
+        vista = VistaPaginada(cargar_pagina, clave_evento, construir_embed, interaction.user.id, por_pagina=EVENTOS_POR_PAGINA)
+        await interaction.response.defer(ephemeral=True)
+        embed = await vista.mostrar()
+        await interaction.followup.send(embed=embed, view=vista)
+
+    except Exception as e:
+        logger.error(f"Error consultando el historial: {e}")
+        await responder_error(interaction, "❌ Error al consultar el historial.")
+
+
+@tree.command(name="libre", description="Busca huecos libres entre dos fechas")
+@app_commands.guild_only()
+@app_commands.describe(
+    desde="Primera fecha en formato DD-MM-YYYY",
+    hasta="Última fecha en formato DD-MM-YYYY (por defecto, la misma)",
+    lugar="Tener en cuenta solo los eventos de este lugar - opcional",
+    duracion="Duración mínima del hueco (ej: 1h30m) - opcional"
+)
+@medir_comando
+async def libre(interaction: discord.Interaction, desde: str, hasta: str = None, lugar: str = None, duracion: str = None):
+    try:
+        almacen = almacenes.de(interaction.guild_id)
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        try:
+            dia_desde = datetime.strptime(desde, "%d-%m-%Y").date()
+            dia_hasta = datetime.strptime(hasta, "%d-%m-%Y").date() if hasta else dia_desde
+        except ValueError:
+            await interaction.response.send_message("❌ Fecha inválida. Usa el formato DD-MM-YYYY", ephemeral=True)
+            return
+        if not 0 <= (dia_hasta - dia_desde).days < LIBRE_MAX_DIAS:
+            await interaction.response.send_message(
+                f"❌ La fecha final debe ser igual o posterior a la inicial y el rango de como mucho {LIBRE_MAX_DIAS} días.",
+                ephemeral=True
             )
+            return
 
-            semanales = response.data if response.data else []
-            
-            if not semanales:
-                embed.description = "No hay eventos programados para esta semana."
+        cierre = CIERRE_LIBRE if CIERRE_LIBRE > APERTURA_LIBRE else None
+        minimo = parse_recordatorio(duracion) if duracion else timedelta(0)
+        huecos = await almacen.libres(dia_desde, dia_hasta + timedelta(days=1), lugar, minimo, APERTURA_LIBRE, cierre)
+
+        por_dia = {}
+        for inicio, fin in huecos:
+            inicio, fin = inicio.astimezone(zona), fin.astimezone(zona)
+            hasta_texto = "24:00" if fin.date() > inicio.date() else f"{fin:%H:%M}"
+            por_dia.setdefault(inicio.date(), []).append(f"{inicio:%H:%M}–{hasta_texto}")
+        lineas = []
+        dia = dia_desde
+        while dia <= dia_hasta:
+            tramos = " · ".join(por_dia.get(dia, [])) or "sin huecos"
+            lineas.append(f"**{DIAS_ES[dia.weekday()]} {dia:%d-%m}:** {tramos}")
+            dia += timedelta(days=1)
 
-            if semanales and CHANNEL_ID:
-                canal = client.get_channel(CHANNEL_ID)
-                if canal:
-                    for e in semanales:
-                        fecha_obj = datetime.strptime(e["fecha"], "%Y-%m-%d")
-                        dia_semana_en = fecha_obj.strftime('%A')
-                        dia_semana = dias_es.get(dia_semana_en, dia_semana_en)
-                        embed.add_field(
-                            name=f"{dia_semana} - {e['nombre']}",
-                            value=f"🕒 {e['hora']} | 📍 {e['lugar']}",
-                            inline=False
-                        )
-
-                    await canal.send(embed=embed)
-                    logger.info("Resumen semanal enviado")
+        embed = discord.Embed(
+            title="🟢 Huecos libres" + (f" en {lugar}" if lugar else ""),
+            description="\n".join(lineas)[:4096],
+            color=0x00FF00
+        )
+        embed.set_footer(text=(
+            f"Franja {APERTURA_LIBRE:%H:%M}–{f'{cierre:%H:%M}' if cierre else '24:00'} · "
+            f"los eventos sin duración ocupan {formatear_duracion(DURACION_POR_DEFECTO)}"
+        ))
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
     except Exception as e:
-        logger.error(f"Error en resumen semanal: {e}")
+        logger.error(f"Error buscando huecos libres: {e}")
+        await responder_error(interaction, "❌ Error al buscar huecos libres.")
+
+
+@tree.command(name="importar", description="Importa eventos desde un fichero CSV o ICS")
+@app_commands.guild_only()
+@app_commands.describe(archivo="Fichero .csv (nombre, fecha, hora, lugar, recordatorio, duracion) o .ics")
+@app_commands.default_permissions(manage_guild=True)
+@medir_comando
+async def importar(interaction: discord.Interaction, archivo: discord.Attachment):
+    try:
+        almacen = almacenes.de(interaction.guild_id)
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        await interaction.response.defer(ephemeral=True)
+
+        if archivo.size > IMPORTACION_MAX_BYTES:
+            await interaction.followup.send(f"❌ El fichero supera el máximo de {IMPORTACION_MAX_BYTES // 1024} KB.")
+            return
+
+        es_ics = archivo.filename.lower().endswith(".ics") or (archivo.content_type or "").startswith("text/calendar")
+        lineas = io.TextIOWrapper(io.BytesIO(await archivo.read()), encoding="utf-8-sig", newline="")
+        registros = leer_ics(lineas, zona) if es_ics else leer_csv(lineas)
+
+        creados = 0
+        errores = []
+        # Validar e insertar por lotes: una sola llamada al almacenamiento por lote
+        for lote in en_lotes(registros, IMPORTACION_LOTE):
+            validos = []
+            for numero, evento, error in lote:
+                if error:
+                    errores.append(f"Línea {numero}: {error}")
+                else:
+                    validos.append((numero, evento))
+            if not validos:
+                continue
+            insertados = await almacen.crear_lote([evento for _, evento in validos])
+            if insertados is None:
+                errores.extend(f"Línea {numero}: error al guardar en la base de datos" for numero, _ in validos)
+                continue
+            await programar_recordatorios(insertados)
+            creados += len(insertados)
+
+        embed = discord.Embed(
+            title="📥 Importación terminada",
+            description=f"**{creados}** eventos creados desde `{archivo.filename}`",
+            color=0x00FF00 if not errores else 0xFFA500
+        )
+        if errores:
+            detalle = "\n".join(errores[:15])
+            if len(errores) > 15:
+                detalle += f"\n… y {len(errores) - 15} más"
+            embed.add_field(name=f"⚠️ {len(errores)} filas con errores", value=detalle[:1024], inline=False)
+        await interaction.followup.send(embed=embed)
+        logger.info(f"Importación de {archivo.filename}: {creados} creados, {len(errores)} errores")
+
+    except ValueError as e:
+        await interaction.followup.send(f"❌ Fichero no válido: {e}")
+    except Exception as e:
+        logger.error(f"Error importando eventos: {e}")
+        try:
+            await interaction.followup.send("❌ Error al importar los eventos.")
+        except Exception:
+            pass
+
+
+@tree.command(name="exportar", description="Exporta los eventos actuales a un fichero (los archivados, en /historial)")
+@app_commands.guild_only()
+@app_commands.describe(formato="Formato del fichero")
+@app_commands.choices(formato=[
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="iCalendar (ICS)", value="ics"),
+])
+@medir_comando
+async def exportar(interaction: discord.Interaction, formato: str = "csv"):
+    try:
+        almacen = almacenes.de(interaction.guild_id)
+        zona = servidores.obtener(interaction.guild_id).zona_info
+        await interaction.response.defer(ephemeral=True)
+
+        # Se escribe página a página; el fichero pasa a disco si crece
+        destino = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        texto = io.TextIOWrapper(destino, encoding="utf-8", newline="")
+        escritor = EscritorICS(texto, zona) if formato == "ics" else EscritorCSV(texto)
+
+        total = 0
+        cursor = None
+        while True:
+            pagina = await almacen.pagina(EXPORTACION_DESDE, cursor, EXPORTACION_PAGINA, expandir=False)
+            if not pagina:
+                break
+            escritor.escribir(pagina)
+            total += len(pagina)
+            cursor = clave_evento(pagina[-1])
+        # Las series se exportan una vez, con su regla, en lugar de expandidas
+        series = await almacen.series()
+        escritor.escribir(series)
+        total += len(series)
+        escritor.cerrar()
+        texto.flush()
+        texto.detach()
+        destino.seek(0)
+
+        await interaction.followup.send(
+            f"📤 {total} eventos exportados",
+            file=discord.File(destino, filename=f"eventos.{formato}")
+        )
+        destino.close()
+        logger.info(f"Exportación {formato}: {total} eventos")
+
+    except Exception as e:
+        logger.error(f"Error exportando eventos: {e}")
+        try:
+            await interaction.followup.send("❌ Error al exportar los eventos.")
+        except Exception:
+            pass
+
+
+def texto_resumen(config):
+    if config.resumen_dia is None:
+        return "Desactivado"
+    return f"{DIAS_ES[config.resumen_dia]} a las {config.resumen_hora:02d}:00"
+
+@tree.command(name="configurar", description="Configura el bot en este servidor")
+@app_commands.guild_only()
+@app_commands.describe(
+    canal="Canal de anuncios, recordatorios y resumen semanal",
+    zona="Zona horaria IANA de las fechas (ej: Europe/Madrid, America/Mexico_City)",
+    resumen_dia="Día del resumen semanal",
+    resumen_hora="Hora del resumen semanal (0-23)"
+)
+@app_commands.choices(resumen_dia=[
+    *(app_commands.Choice(name=dia, value=numero) for numero, dia in enumerate(DIAS_ES)),
+    app_commands.Choice(name="Sin resumen", value=-1),
+])
+@app_commands.default_permissions(manage_guild=True)
+@medir_comando
+async def configurar(interaction: discord.Interaction, canal: discord.TextChannel = None, zona: str = None,
+                     resumen_dia: int = None, resumen_hora: app_commands.Range[int, 0, 23] = None):
+    try:
+        actual = servidores.obtener(interaction.guild_id)
+        config = actual
+        if canal or zona or resumen_dia is not None or resumen_hora is not None:
+            try:
+                config = ConfigServidor(
+                    interaction.guild_id,
+                    canal.id if canal else actual.canal_id,
+                    zona or actual.zona,
+                    actual.resumen_dia if resumen_dia is None else (None if resumen_dia < 0 else resumen_dia),
+                    actual.resumen_hora if resumen_hora is None else resumen_hora
+                )
+            except (KeyError, ValueError):
+                await interaction.response.send_message(f"❌ Zona horaria desconocida: {zona}", ephemeral=True)
+                return
+            # Con la zona indicada se recalcula siempre: repetir la orden completa un recálculo a medias
+            recalcular = zona is not None
+            if recalcular:
+                # Recalcular los eventos puede tardar más que el plazo de respuesta
+                await interaction.response.defer(ephemeral=True)
+            if not await servidores.guardar(config):
+                await responder_error(interaction, "❌ Error al guardar la configuración.")
+                return
+            if recalcular:
+                # Los días de las consultas y los instantes de los eventos cambian con la zona
+                almacenes.olvidar(interaction.guild_id)
+                if not await recalcular_momentos(interaction.guild_id, config.zona_info):
+                    await responder_error(
+                        interaction,
+                        "⚠️ Zona guardada, pero no se pudieron recalcular todos los eventos. Repite /configurar con la misma zona."
+                    )
+                    return
+            armar_resumen(config)
+            logger.info(f"Servidor {interaction.guild_id} configurado: {config.fila()}")
+
+        embed = discord.Embed(title="⚙️ Configuración del servidor", color=0x0099FF)
+        embed.add_field(name="Canal", value=f"<#{config.canal_id}>" if config.canal_id else "Donde se use cada orden", inline=False)
+        embed.add_field(name="Zona horaria", value=config.zona, inline=False)
+        embed.add_field(name="Resumen semanal", value=texto_resumen(config), inline=False)
+        responder = interaction.followup.send if interaction.response.is_done() else interaction.response.send_message
+        await responder(embed=embed, ephemeral=True)
+
+    except Exception as e:
+        logger.error(f"Error configurando el servidor: {e}")
+        await responder_error(interaction, "❌ Error al configurar el servidor.")
+
+
+@tree.command(name="refrescar", description="Recarga los eventos desde la base de datos")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@medir_comando
+async def refrescar(interaction: discord.Interaction):
+    try:
+        almacen = almacenes.de(interaction.guild_id)
+        await interaction.response.defer(ephemeral=True)
+        if await almacen.refrescar():
+            await interaction.followup.send("🔄 Eventos recargados desde la base de datos")
+        else:
+            await interaction.followup.send("❌ Error al recargar los eventos.")
+    except Exception as e:
+        logger.error(f"Error refrescando eventos: {e}")
+        await responder_error(interaction, "❌ Error al recargar los eventos.")
+
+
+async def resumen_semanal(guild_id, momento):
+    """Publica los eventos de la semana siguiente de un servidor; lo dispara su tarea en `tareas_resumen`"""
+    config = servidores.obtener(guild_id)
+    zona = config.zona_info
+    momento = momento.astimezone(zona)
+    proximo_lunes = momento + timedelta(days=(7 - momento.weekday())) if momento.weekday() != 0 else momento
+    proximo_lunes = proximo_lunes.replace(hour=0, minute=0, second=0, microsecond=0)
+    siguiente_domingo = proximo_lunes + timedelta(days=6)
+
+    # Filtrar eventos entre próximo lunes y siguiente domingo
+    semanales = await almacenes.de(guild_id).rango(proximo_lunes.date(), siguiente_domingo.date() + timedelta(days=1))
+    if not semanales:
+        return
+
+    canal = canal_anuncios(guild_id)
+    if not canal:
+        raise RuntimeError(f"Canal {config.canal_id} del servidor {guild_id} no disponible")
+
+    embed = discord.Embed(
+        title=f"📅 Planificación Semanal",
+        description=f"Eventos del {proximo_lunes.strftime('%d/%m')} al {siguiente_domingo.strftime('%d/%m')}",
+        color=0x0099FF
+    )
+    for e in semanales:
+        inicio = e["starts_at"].astimezone(zona)
+        embed.add_field(
+            name=f"{DIAS_ES[inicio.weekday()]} - {e['nombre']}",
+            value=f"🕒 {inicio:%H:%M} | 📍 {e['lugar']}",
+            inline=False
+        )
+
+    await despachador.enviar(canal, embed=embed)
+    logger.info(f"Resumen semanal enviado al servidor {guild_id}")
 
 
 def main():
-    """Función principal para iniciar el bot con keep-alive"""
+    """Función principal para iniciar el bot; el servidor de salud arranca en setup_hook"""
     try:
         if not TOKEN:
             raise ValueError("DISCORD_BOT_TOKEN es requerido")
         
-        # Iniciar servidor keep-alive en thread separado
-        logger.info("Iniciando servidor keep-alive...")
-        keep_alive_thread = Thread(target=keep_alive, daemon=True)
-        keep_alive_thread.start()
-        
         # Iniciar bot
         logger.info("Iniciando Discord bot...")
-        client.run(TOKEN)
+        # Los registros de discord.py van por la misma cola que los del bot
+        client.run(TOKEN, log_handler=None)
+        repositorio.cerrar()
+        estado.cerrar()
         
     except KeyboardInterrupt:
         logger.info("Bot detenido por usuario")
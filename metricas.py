@@ -0,0 +1,199 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# Límites por defecto de los histogramas de duración, en segundos
+LIMITES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_BUCLE = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra=""):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    if valor != valor:
+        return "NaN"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, registro, nombre, ayuda, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = registro.lock
+        self._valores = {}
+
+    def _clave(self, etiquetas):
+        return tuple(etiquetas[nombre] for nombre in self.etiquetas)
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for clave, valor in sorted(self._valores.items()):
+            lineas.extend(self._muestras(clave, valor))
+        return lineas
+
+    def _muestras(self, clave, valor):
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def incrementar(self, cantidad=1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+
+class Indicador(_Metrica):
+    tipo = "gauge"
+
+    def fijar(self, valor, **etiquetas):
+        with self._lock:
+            self._valores[self._clave(etiquetas)] = valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, registro, nombre, ayuda, etiquetas, limites=LIMITES):
+        super().__init__(registro, nombre, ayuda, etiquetas)
+        self.limites = tuple(limites)
+
+    def observar(self, valor, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            cubetas, suma, total = self._valores.get(clave) or ([0] * len(self.limites), 0.0, 0)
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    cubetas[i] += 1
+            self._valores[clave] = (cubetas, suma + valor, total + 1)
+
+    def _muestras(self, clave, valor):
+        cubetas, suma, total = valor
+        lineas = []
+        for limite, cubeta in zip(self.limites + (float("inf"),), cubetas + [total]):
+            le = 'le="' + _numero(limite) + '"'
+            lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {cubeta}")
+        lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}")
+        lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}")
+        return lineas
+
+
+class Registro:
+    """Conjunto de métricas que se exponen juntas en el formato de texto de Prometheus.
+
+    Se actualizan desde el event loop y se leen desde el servidor HTTP, así
+    que todas comparten un cerrojo.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metricas = []
+
+    def _registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Contador(self, nombre, ayuda, etiquetas))
+
+    def indicador(self, nombre, ayuda, etiquetas=()):
+        return self._registrar(Indicador(self, nombre, ayuda, etiquetas))
+
+    def histograma(self, nombre, ayuda, etiquetas=(), limites=LIMITES):
+        return self._registrar(Histograma(self, nombre, ayuda, etiquetas, limites))
+
+    def exponer(self):
+        with self.lock:
+            lineas = [linea for metrica in self._metricas for linea in metrica.exponer()]
+        return "\n".join(lineas) + "\n"
+
+
+registro = Registro()
+
+COMANDOS = registro.histograma(
+    "bot_comando_segundos", "Duración de las órdenes de barra", ("comando", "resultado"))
+LLAMADAS_BD = registro.histograma(
+    "bot_bd_segundos", "Duración de las llamadas al almacenamiento", ("operacion",))
+ERRORES_BD = registro.contador(
+    "bot_bd_errores_total", "Llamadas al almacenamiento que fallaron", ("operacion",))
+RECORDATORIOS_PENDIENTES = registro.indicador(
+    "bot_recordatorios_pendientes", "Recordatorios en el planificador")
+PROXIMO_RECORDATORIO = registro.indicador(
+    "bot_proximo_recordatorio_timestamp", "Instante Unix del siguiente recordatorio (0 si no hay)")
+COLA_SALIDA = registro.indicador(
+    "bot_cola_salida_mensajes", "Mensajes pendientes en el despachador")
+ENVIOS_FALLIDOS = registro.contador(
+    "bot_envios_fallidos_total", "Envíos a Discord que fallaron", ("resultado",))
+RETRASO_BUCLE = registro.histograma(
+    "bot_retraso_bucle_segundos", "Retraso del event loop sobre lo previsto", limites=LIMITES_BUCLE)
+LATENCIA_GATEWAY = registro.indicador(
+    "bot_latencia_gateway_segundos", "Latencia del heartbeat con el gateway de Discord")
+VISTAS = registro.contador(
+    "bot_vistas_total", "Vistas de /semana y /mes: construidas, compartidas con una en curso o del memo", ("resultado",))
+
+
+@contextmanager
+def cronometrar(histograma, errores=None, **etiquetas):
+    """Observa la duración del bloque; si lanza una excepción la cuenta en `errores`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if errores is not None:
+            errores.incrementar(**etiquetas)
+        raise
+    finally:
+        histograma.observar(time.perf_counter() - inicio, **etiquetas)
+
+
+def medir_comando(funcion):
+    """Decorador para los manejadores de órdenes: registra su duración y si terminaron con error."""
+    @functools.wraps(funcion)
+    async def manejador(interaction, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = "error"
+        try:
+            respuesta = await funcion(interaction, *args, **kwargs)
+            resultado = "ok"
+            return respuesta
+        finally:
+            duracion = time.perf_counter() - inicio
+            COMANDOS.observar(duracion, comando=funcion.__name__, resultado=resultado)
+            logger.info(f"Orden {funcion.__name__} ({resultado}) en {duracion * 1000:.0f} ms", extra={
+                "comando": funcion.__name__, "guild": interaction.guild_id, "duracion": round(duracion, 4)})
+    return manejador
+
+
+async def vigilar(muestrear, intervalo=1.0):
+    """Mide cada `intervalo` el retraso del event loop y llama a `muestrear` para los indicadores.
+
+    El retraso es lo que tarda en despertar un `sleep` más allá de lo pedido:
+    cuánto tiempo pasó el loop ocupado con otra cosa.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        inicio = loop.time()
+        await asyncio.sleep(intervalo)
+        RETRASO_BUCLE.observar(max(0.0, loop.time() - inicio - intervalo))
+        muestrear()
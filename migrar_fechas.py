@@ -0,0 +1,65 @@
+"""Rellena starts_at y remind_at en los eventos guardados antes de que existieran.
+
+Uso: python migrar_fechas.py [--lote N]
+
+Usa la misma configuración de almacenamiento que el bot (ALMACENAMIENTO,
+SUPABASE_URL, SUPABASE_KEY, SQLITE_DB). En Supabase hay que crear antes las
+columnas con esquema_supabase.sql; en SQLite se añaden solas al abrir la base.
+Cada evento se interpreta en la zona horaria configurada para su servidor.
+"""
+import argparse
+import logging
+import sys
+
+from almacenamiento import crear_backend
+from servidores import ConfigServidor
+from tiempo import ZONA, calcular_momentos, serializar_evento
+
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("migrar_fechas")
+
+
+def zonas_servidores(backend):
+    zonas = {}
+    for fila in backend.cargar_servidores() or []:
+        try:
+            zonas[fila["guild_id"]] = ConfigServidor.desde_fila(fila).zona_info
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Zona del servidor {fila.get('guild_id')} ignorada: {e}")
+    return zonas
+
+
+def migrar(backend, lote=500):
+    zonas = zonas_servidores(backend)
+    migrados = fallidos = 0
+    ultimo_id = 0
+    while True:
+        filas = backend.sin_momentos(ultimo_id, lote)
+        if not filas:
+            break
+        for fila in filas:
+            ultimo_id = fila["id"]
+            try:
+                zona = zonas.get(fila.get("guild_id"), ZONA)
+                backend.actualizar(fila["id"], serializar_evento(calcular_momentos(fila, zona)))
+                migrados += 1
+            except Exception as e:
+                logger.error(f"Evento {fila['id']} no migrado ({fila.get('fecha')} {fila.get('hora')}): {e}")
+                fallidos += 1
+        logger.info(f"{migrados} eventos migrados hasta el id {ultimo_id}")
+    return migrados, fallidos
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lote", type=int, default=500, help="Filas leídas por consulta")
+    args = parser.parse_args()
+
+    backend = crear_backend()
+    try:
+        migrados, fallidos = migrar(backend, args.lote)
+    finally:
+        backend.cerrar()
+    logger.info(f"Migración terminada: {migrados} eventos actualizados, {fallidos} con errores")
+    sys.exit(1 if fallidos else 0)
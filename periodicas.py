@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+
+logger = logging.getLogger(__name__)
+
+# Dormir como mucho este tiempo seguido para no arrastrar desvíos del reloj
+ESPERA_MAXIMA = 3600
+
+
+class ReglaCalendario:
+    """Regla tipo cron: hora fija en ciertos días de la semana o del mes.
+
+    `dias_semana` usa la numeración de `weekday()` (0 = lunes) y `dias_mes` los
+    días del mes; si se omiten ambos la regla se cumple todos los días. Las
+    horas se interpretan en la zona indicada: una hora inexistente por el
+    cambio de horario se desplaza tras el salto y una hora repetida dispara
+    solo en su primera aparición.
+    """
+
+    def __init__(self, hora, minuto=0, dias_semana=None, dias_mes=None, zona="Europe/Madrid"):
+        self.hora = time(hora, minuto)
+        self.dias_semana = set(dias_semana) if dias_semana is not None else None
+        self.dias_mes = set(dias_mes) if dias_mes is not None else None
+        self.zona = ZoneInfo(zona)
+
+    def _cumple(self, dia):
+        if self.dias_semana is not None and dia.weekday() not in self.dias_semana:
+            return False
+        if self.dias_mes is not None and dia.day not in self.dias_mes:
+            return False
+        return True
+
+    def siguiente(self, despues):
+        """Primer disparo estrictamente posterior a `despues` (datetime con zona)."""
+        dia = despues.astimezone(self.zona).date()
+        limite = despues.astimezone(timezone.utc)
+        # Un año y un día bastan para encontrar cualquier combinación válida
+        for _ in range(367):
+            if self._cumple(dia):
+                local = datetime.combine(dia, self.hora, tzinfo=self.zona)
+                # Ida y vuelta por UTC para normalizar horas inexistentes
+                candidato = local.astimezone(timezone.utc)
+                if candidato > limite:
+                    return candidato.astimezone(self.zona)
+            dia += timedelta(days=1)
+        raise ValueError("La regla no se cumple ningún día")
+
+
+class RegistroEjecuciones:
+    """Última ejecución correcta de cada tarea periódica, en el `EstadoLocal`."""
+
+    def __init__(self, estado):
+        self._estado = estado
+        self._conexion = estado.conexion
+        with self._conexion:
+            self._conexion.execute("""
+                CREATE TABLE IF NOT EXISTS ejecuciones (
+                    nombre TEXT PRIMARY KEY,
+                    momento REAL NOT NULL
+                )
+            """)
+
+    async def ultima(self, nombre):
+        return await self._estado.ejecutar(self._ultima, nombre)
+
+    def _ultima(self, nombre):
+        fila = self._conexion.execute("SELECT momento FROM ejecuciones WHERE nombre = ?", (nombre,)).fetchone()
+        return datetime.fromtimestamp(fila[0], timezone.utc) if fila else None
+
+    async def registrar(self, nombre, momento):
+        await self._estado.ejecutar(self._registrar, nombre, momento)
+
+    def _registrar(self, nombre, momento):
+        with self._conexion:
+            self._conexion.execute(
+                "INSERT OR REPLACE INTO ejecuciones (nombre, momento) VALUES (?, ?)",
+                (nombre, momento.timestamp())
+            )
+
+
+class TareaPeriodica:
+    """Ejecuta `funcion(momento)` en cada disparo de una `ReglaCalendario`.
+
+    Duerme hasta el siguiente disparo en lugar de sondear. Cada disparo se
+    ejecuta una sola vez: tras completarse se guarda en el registro, y al
+    arrancar se recupera el último disparo perdido si no se ha pasado más de
+    `tolerancia`.
+    """
+
+    def __init__(self, nombre, regla, funcion, registro, tolerancia=timedelta(hours=1)):
+        self.nombre = nombre
+        self.regla = regla
+        self._funcion = funcion
+        self._registro = registro
+        self._tolerancia = tolerancia
+        self._tarea = None
+
+    async def proximo(self):
+        ahora = datetime.now(self.regla.zona)
+        ultima = await self._registro.ultima(self.nombre)
+        # Disparo pendiente: el siguiente tras la última ejecución o tras el
+        # inicio de la ventana de tolerancia, lo que sea más reciente
+        referencia = ahora - self._tolerancia
+        if ultima is not None and ultima > referencia:
+            referencia = ultima
+        return self.regla.siguiente(referencia)
+
+    def iniciar(self):
+        """Arranca la tarea; llamarlo de nuevo no tiene efecto."""
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._bucle())
+
+    def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    async def _bucle(self):
+        while True:
+            momento = await self.proximo()
+            espera = (momento - datetime.now(self.regla.zona)).total_seconds()
+            if espera > 0:
+                await asyncio.sleep(min(espera, ESPERA_MAXIMA))
+                continue
+            try:
+                await self._funcion(momento)
+                await self._registro.registrar(self.nombre, momento)
+                logger.info(f"Tarea {self.nombre} ejecutada para {momento.isoformat()}")
+            except Exception as e:
+                logger.error(f"Error en tarea {self.nombre}: {e}")
+                # Reintentar más tarde sin perder el disparo
+                await asyncio.sleep(60)
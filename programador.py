@@ -0,0 +1,117 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime, timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProgramadorRecordatorios:
+    """Planificador único de recordatorios basado en un montículo.
+
+    Cada evento tiene como mucho un recordatorio pendiente, indexado por su id.
+    Reprogramar o cancelar no toca el montículo: la entrada antigua queda
+    invalidada y se descarta al llegar a la cima, así que ambas operaciones son
+    O(log n). Una sola tarea duerme hasta el siguiente vencimiento y se
+    despierta cuando entra uno anterior. Cuando las entradas invalidadas
+    superan a las vigentes se compacta el montículo para que la memoria
+    dependa solo de los recordatorios pendientes.
+
+    `enviar` recibe el evento y el momento para el que se programó, que
+    identifica el recordatorio en el registro.
+    """
+
+    def __init__(self, enviar):
+        self._enviar = enviar
+        self._monticulo = []
+        self._pendientes = {}
+        self._secuencia = itertools.count()
+        self._despertar = asyncio.Event()
+        self._tarea = None
+        self._envios = set()
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def programar(self, id, momento, evento):
+        """Programa (o reprograma) el recordatorio de `id` para el instante `momento`."""
+        secuencia = next(self._secuencia)
+        instante = momento.timestamp()
+        self._pendientes[id] = (secuencia, instante, evento)
+        heapq.heappush(self._monticulo, (instante, secuencia, id))
+        self._compactar()
+        if self._monticulo[0][1] == secuencia:
+            self._despertar.set()
+
+    def cancelar(self, id):
+        if self._pendientes.pop(id, None) is not None:
+            self._compactar()
+
+    def _compactar(self):
+        if len(self._monticulo) > 64 and len(self._monticulo) > 2 * len(self._pendientes):
+            self._monticulo = [
+                (instante, secuencia, id)
+                for id, (secuencia, instante, _) in self._pendientes.items()
+            ]
+            heapq.heapify(self._monticulo)
+
+    def proximo(self):
+        """Instante (timestamp) del siguiente recordatorio pendiente, o None si no hay."""
+        while self._monticulo and not self._vigente(self._monticulo[0]):
+            heapq.heappop(self._monticulo)
+        return self._monticulo[0][0] if self._monticulo else None
+
+    def _vigente(self, entrada):
+        _, secuencia, id = entrada
+        pendiente = self._pendientes.get(id)
+        return pendiente is not None and pendiente[0] == secuencia
+
+    def iniciar(self):
+        """Arranca la tarea del planificador; llamarlo de nuevo no tiene efecto."""
+        if self._tarea is None or self._tarea.done():
+            self._tarea = asyncio.create_task(self._bucle())
+
+    def activo(self):
+        """True si la tarea del planificador está en marcha."""
+        return self._tarea is not None and not self._tarea.done()
+
+    def detener(self):
+        if self._tarea is not None:
+            self._tarea.cancel()
+            self._tarea = None
+
+    async def _bucle(self):
+        while True:
+            self._despertar.clear()
+            while self._monticulo and not self._vigente(self._monticulo[0]):
+                heapq.heappop(self._monticulo)
+
+            if not self._monticulo:
+                await self._despertar.wait()
+                continue
+
+            instante, _, id = self._monticulo[0]
+            espera = instante - time.time()
+            if espera > 0:
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), timeout=espera)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._monticulo)
+            _, _, evento = self._pendientes.pop(id)
+            momento = datetime.fromtimestamp(instante, timezone.utc)
+            # Sin esperar al envío: los que vencen a la vez llegan juntos al despachador
+            envio = asyncio.create_task(self._enviar_registrando(id, evento, momento))
+            self._envios.add(envio)
+            envio.add_done_callback(self._envios.discard)
+
+    async def _enviar_registrando(self, id, evento, momento):
+        try:
+            await self._enviar(evento, momento)
+        except Exception as e:
+            logger.error(f"Error enviando recordatorio del evento {id}: {e}")
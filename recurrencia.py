@@ -0,0 +1,135 @@
+import calendar
+from datetime import date, datetime, timedelta, timezone
+
+from tiempo import ZONA
+
+
+FRECUENCIAS = ("DAILY", "WEEKLY", "MONTHLY")
+_CLAVES = {"FREQ", "INTERVAL", "UNTIL", "COUNT", "WKST"}
+
+
+class Recurrencia:
+    """Subconjunto de RRULE (RFC 5545): FREQ, INTERVAL, UNTIL y COUNT.
+
+    Se guarda como texto en la columna `rrule` de la serie, p. ej.
+    "FREQ=WEEKLY;INTERVAL=2;UNTIL=20270630". UNTIL es una fecha local
+    inclusiva y COUNT el número total de ocurrencias, excepciones incluidas.
+    """
+
+    def __init__(self, frecuencia, intervalo=1, hasta=None, cuenta=None):
+        if frecuencia not in FRECUENCIAS:
+            raise ValueError(f"frecuencia no soportada '{frecuencia}'")
+        if intervalo < 1:
+            raise ValueError("el intervalo debe ser positivo")
+        if cuenta is not None and cuenta < 1:
+            raise ValueError("el número de repeticiones debe ser positivo")
+        self.frecuencia = frecuencia
+        self.intervalo = intervalo
+        self.hasta = hasta
+        self.cuenta = cuenta
+
+    @classmethod
+    def parse(cls, texto):
+        partes = {}
+        for parte in texto.strip().upper().split(";"):
+            clave, separador, valor = parte.partition("=")
+            if not separador:
+                raise ValueError(f"regla de repetición inválida '{texto}'")
+            partes[clave] = valor
+        desconocidas = set(partes) - _CLAVES
+        if desconocidas:
+            raise ValueError(f"regla de repetición no soportada: {', '.join(sorted(desconocidas))}")
+        try:
+            hasta = partes.get("UNTIL")
+            return cls(
+                partes.get("FREQ", ""),
+                int(partes.get("INTERVAL", 1)),
+                datetime.strptime(hasta[:8], "%Y%m%d").date() if hasta else None,
+                int(partes["COUNT"]) if "COUNT" in partes else None
+            )
+        except ValueError as e:
+            raise ValueError(f"regla de repetición inválida '{texto}': {e}") from None
+
+    def __str__(self):
+        texto = f"FREQ={self.frecuencia};INTERVAL={self.intervalo}"
+        if self.hasta:
+            texto += f";UNTIL={self.hasta:%Y%m%d}"
+        if self.cuenta:
+            texto += f";COUNT={self.cuenta}"
+        return texto
+
+    def _dia(self, inicio, indice):
+        """Día de la ocurrencia `indice` o None si no existe (p. ej. 31 de un mes corto)."""
+        if self.frecuencia == "DAILY":
+            return inicio + timedelta(days=indice * self.intervalo)
+        if self.frecuencia == "WEEKLY":
+            return inicio + timedelta(weeks=indice * self.intervalo)
+        año, mes = divmod(inicio.month - 1 + indice * self.intervalo, 12)
+        año += inicio.year
+        if inicio.day > calendar.monthrange(año, mes + 1)[1]:
+            return None
+        return date(año, mes + 1, inicio.day)
+
+    def _primer_indice(self, inicio, desde):
+        # Salta directamente a la primera ocurrencia candidata sin recorrer las anteriores
+        if desde <= inicio:
+            return 0
+        if self.frecuencia == "DAILY":
+            return (desde - inicio).days // self.intervalo
+        if self.frecuencia == "WEEKLY":
+            return (desde - inicio).days // (7 * self.intervalo)
+        meses = (desde.year - inicio.year) * 12 + desde.month - inicio.month
+        return max(meses // self.intervalo - 1, 0)
+
+    def dias(self, inicio, desde):
+        """Días de ocurrencia a partir de `desde` (inclusive), en orden."""
+        # Con COUNT en meses cortos hay que contar los saltos desde el principio
+        saltos_contados = self.cuenta is not None and self.frecuencia == "MONTHLY" and inicio.day > 28
+        indice = 0 if saltos_contados else self._primer_indice(inicio, desde)
+        emitidas = indice
+        while True:
+            if self.cuenta is not None and emitidas >= self.cuenta:
+                return
+            dia = self._dia(inicio, indice)
+            indice += 1
+            if dia is None:
+                continue
+            if self.hasta and dia > self.hasta:
+                return
+            emitidas += 1
+            if dia >= desde:
+                yield dia
+
+
+def excepciones(evento):
+    """Fechas (date) excluidas de una serie, guardadas como 'YYYY-MM-DD,YYYY-MM-DD'."""
+    texto = evento.get("excepciones") or ""
+    return {date.fromisoformat(d.strip()) for d in texto.split(",") if d.strip()}
+
+
+def ocurrencias(evento, desde, hasta=None, zona=ZONA):
+    """Genera perezosamente las ocurrencias de una serie que empiezan en [desde, hasta).
+
+    Cada ocurrencia es una copia del evento con su propio `starts_at`,
+    `remind_at`, `fecha` y `hora`, y conserva el id de la serie. Solo se
+    calculan las que caen en la ventana pedida.
+    """
+    regla = Recurrencia.parse(evento["rrule"])
+    excluidas = excepciones(evento)
+    primero = evento["starts_at"].astimezone(zona)
+    antelacion = primero - evento["remind_at"] if evento.get("remind_at") else None
+    for dia in regla.dias(primero.date(), desde.astimezone(zona).date()):
+        if dia in excluidas:
+            continue
+        inicio = datetime.combine(dia, primero.timetz().replace(tzinfo=None), tzinfo=zona)
+        inicio = inicio.astimezone(timezone.utc).astimezone(zona)
+        if inicio < desde:
+            continue
+        if hasta is not None and inicio >= hasta:
+            return
+        yield {
+            **evento,
+            "fecha": dia.isoformat(),
+            "starts_at": inicio,
+            "remind_at": inicio - antelacion if antelacion is not None else None,
+        }
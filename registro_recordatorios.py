@@ -0,0 +1,173 @@
+import json
+import logging
+import time
+from datetime import datetime
+
+from tiempo import deserializar_evento, serializar_evento
+
+
+logger = logging.getLogger(__name__)
+
+PENDIENTE = "pendiente"
+ENVIADO = "enviado"
+CADUCADO = "caducado"
+
+
+class RegistroRecordatorios:
+    """Registro persistente de recordatorios programados y enviados.
+
+    Cada recordatorio se identifica por (evento_id, momento) y guarda una copia
+    del evento, de modo que al arrancar basta con leer los pendientes sin
+    consultar la tabla de eventos. Un recordatorio se marca como enviado antes
+    de mandarlo (`reclamar`), así que nunca sale dos veces aunque el bot se
+    reinicie o reconecte.
+
+    Las operaciones son corrutinas que se ejecutan en el hilo del
+    `EstadoLocal`, así que el disco no bloquea el event loop.
+    `programar_lote` y `cancelar_lote` escriben muchos recordatorios en una
+    sola transacción.
+    """
+
+    def __init__(self, estado, zona_de=None):
+        self._estado = estado
+        self._zona_de = zona_de
+        self._conexion = estado.conexion
+        with self._conexion:
+            self._conexion.executescript("""
+                CREATE TABLE IF NOT EXISTS recordatorios (
+                    evento_id INTEGER NOT NULL,
+                    momento REAL NOT NULL,
+                    evento TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    enviado_en REAL,
+                    PRIMARY KEY (evento_id, momento)
+                );
+                CREATE INDEX IF NOT EXISTS recordatorios_estado_momento
+                    ON recordatorios (estado, momento);
+            """)
+
+    def _programar(self, evento_id, momento, evento):
+        instante = momento.timestamp()
+        fila = self._conexion.execute(
+            "SELECT estado FROM recordatorios WHERE evento_id = ? AND momento = ?",
+            (evento_id, instante)
+        ).fetchone()
+        self._conexion.execute(
+            "DELETE FROM recordatorios WHERE evento_id = ? AND estado = ?",
+            (evento_id, PENDIENTE)
+        )
+        if fila and fila[0] != PENDIENTE:
+            return False
+        self._conexion.execute(
+            "INSERT INTO recordatorios (evento_id, momento, evento, estado) VALUES (?, ?, ?, ?)",
+            (evento_id, instante, json.dumps(serializar_evento(evento), default=str), PENDIENTE)
+        )
+        return True
+
+    def _programar_lote(self, recordatorios):
+        with self._conexion:
+            return [self._programar(*recordatorio) for recordatorio in recordatorios]
+
+    async def programar(self, evento_id, momento, evento):
+        """Registra el recordatorio pendiente de un evento.
+
+        Sustituye al pendiente anterior del mismo evento. Devuelve False si ese
+        mismo recordatorio ya se envió o caducó y no debe volver a programarse;
+        en ese caso el evento se queda sin pendiente.
+        """
+        resultados = await self._estado.ejecutar(self._programar_lote, [(evento_id, momento, evento)])
+        return resultados[0]
+
+    async def programar_lote(self, recordatorios):
+        """`programar` para una lista de (evento_id, momento, evento) en una transacción; una lista de bool."""
+        if not recordatorios:
+            return []
+        return await self._estado.ejecutar(self._programar_lote, recordatorios)
+
+    def _cancelar_lote(self, evento_ids):
+        with self._conexion:
+            self._conexion.executemany(
+                "DELETE FROM recordatorios WHERE evento_id = ? AND estado = ?",
+                [(evento_id, PENDIENTE) for evento_id in evento_ids]
+            )
+
+    async def cancelar(self, evento_id):
+        await self._estado.ejecutar(self._cancelar_lote, [evento_id])
+
+    async def cancelar_lote(self, evento_ids):
+        if evento_ids:
+            await self._estado.ejecutar(self._cancelar_lote, list(evento_ids))
+
+    def _reclamar(self, evento_id, momento):
+        with self._conexion:
+            cursor = self._conexion.execute(
+                "UPDATE recordatorios SET estado = ?, enviado_en = ? WHERE evento_id = ? AND momento = ? AND estado = ?",
+                (ENVIADO, time.time(), evento_id, momento.timestamp(), PENDIENTE)
+            )
+        return cursor.rowcount == 1
+
+    async def reclamar(self, evento_id, momento):
+        """Marca como enviado el recordatorio pendiente (evento_id, momento); True solo para quien lo consigue.
+
+        Si el evento se reprogramó a otro momento no reclama nada: el pendiente
+        nuevo queda para su propio envío.
+        """
+        return await self._estado.ejecutar(self._reclamar, evento_id, momento)
+
+    async def liberar(self, evento_id, momento):
+        """Devuelve a pendiente un recordatorio reclamado si su envío ha fallado y el evento no tiene ya otro."""
+        await self._estado.ejecutar(self._liberar, evento_id, momento)
+
+    def _liberar(self, evento_id, momento):
+        with self._conexion:
+            self._conexion.execute(
+                """UPDATE recordatorios SET estado = ?, enviado_en = NULL
+                   WHERE evento_id = ? AND momento = ? AND estado = ?
+                   AND NOT EXISTS (SELECT 1 FROM recordatorios WHERE evento_id = ? AND estado = ?)""",
+                (PENDIENTE, evento_id, momento.timestamp(), ENVIADO, evento_id, PENDIENTE)
+            )
+
+    async def recuperar(self, ahora, gracia):
+        """Lee los pendientes y los separa en atrasados y futuros.
+
+        Los que vencieron hace más de `gracia` se marcan como caducados y no se
+        envían. Devuelve dos listas de tuplas (evento_id, momento, evento).
+        """
+        return await self._estado.ejecutar(self._recuperar, ahora, gracia)
+
+    def _recuperar(self, ahora, gracia):
+        limite = (ahora - gracia).timestamp()
+        with self._conexion:
+            caducados = self._conexion.execute(
+                "UPDATE recordatorios SET estado = ? WHERE estado = ? AND momento < ?",
+                (CADUCADO, PENDIENTE, limite)
+            ).rowcount
+            filas = self._conexion.execute(
+                "SELECT evento_id, momento, evento FROM recordatorios WHERE estado = ? ORDER BY momento",
+                (PENDIENTE,)
+            ).fetchall()
+        if caducados:
+            logger.warning(f"{caducados} recordatorios caducados fuera del margen de recuperación")
+
+        atrasados, futuros = [], []
+        for evento_id, instante, evento in filas:
+            momento = datetime.fromtimestamp(instante, ahora.tzinfo)
+            destino = atrasados if momento <= ahora else futuros
+            fila = json.loads(evento)
+            if self._zona_de is not None:
+                evento = deserializar_evento(fila, self._zona_de(fila.get("guild_id")))
+            else:
+                evento = deserializar_evento(fila)
+            destino.append((evento_id, momento, evento))
+        return atrasados, futuros
+
+    async def purgar(self, antes_de):
+        """Borra los recordatorios ya enviados o caducados anteriores a `antes_de`."""
+        await self._estado.ejecutar(self._purgar, antes_de)
+
+    def _purgar(self, antes_de):
+        with self._conexion:
+            self._conexion.execute(
+                "DELETE FROM recordatorios WHERE estado != ? AND momento < ?",
+                (PENDIENTE, antes_de.timestamp())
+            )
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metricas import ERRORES_BD, LLAMADAS_BD, cronometrar
+from tiempo import deserializar_evento, serializar_evento
+
+
+logger = logging.getLogger(__name__)
+
+
+class RepositorioEventos:
+    """Acceso asíncrono a la tabla de eventos.
+
+    Los backends de `almacenamiento` son síncronos, así que cada operación se
+    ejecuta en un pool de hilos acotado y ninguna llamada bloquea el event
+    loop. Los errores del backend se registran aquí y se devuelven como
+    resultado vacío. Es también la frontera de formato: `starts_at` y
+    `remind_at` se analizan una sola vez al leer cada fila y se convierten a
+    texto al escribirla, de modo que el resto del bot solo ve `datetime`.
+    `zona_de(guild_id)` da la zona en que se interpretan las filas de cada
+    servidor; sin ella se usa la zona por defecto.
+    """
+
+    def __init__(self, backend, max_workers=4, zona_de=None):
+        self._backend = backend
+        self._zona_de = zona_de
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="almacenamiento")
+        # Instante (monotonic) de la última llamada al backend que terminó sin error
+        self.ultimo_exito = None
+
+    async def _ejecutar(self, operacion, *args, nombre=None):
+        # Se mide desde el loop: incluye la espera por un hilo libre del pool
+        loop = asyncio.get_running_loop()
+        with cronometrar(LLAMADAS_BD, ERRORES_BD, operacion=nombre or operacion.__name__):
+            resultado = await loop.run_in_executor(self._executor, operacion, *args)
+        self.ultimo_exito = time.monotonic()
+        return resultado
+
+    def _deserializar(self, fila):
+        try:
+            if self._zona_de is None:
+                return deserializar_evento(fila)
+            return deserializar_evento(fila, self._zona_de(fila.get("guild_id")))
+        except (KeyError, ValueError) as e:
+            # Una fila con fecha u hora inválidas no debe tumbar la carga entera
+            logger.warning(f"Evento {fila.get('id')} ignorado por datos inválidos: {e}")
+            return None
+
+    async def _leer(self, operacion, *args):
+        # El análisis de las filas también se hace en el pool, fuera del loop
+        def leer():
+            filas = operacion(*args)
+            if filas is None:
+                return None
+            return [evento for evento in map(self._deserializar, filas) if evento is not None]
+        return await self._ejecutar(leer, nombre=operacion.__name__)
+
+    async def _leer_uno(self, operacion, *args):
+        def leer():
+            fila = operacion(*args)
+            return self._deserializar(fila) if fila else None
+        return await self._ejecutar(leer, nombre=operacion.__name__)
+
+    async def cargar(self, guild_id=None, desde=None):
+        """Eventos de un servidor, o de todos si no se indica; None si falla.
+
+        Con `desde` se omiten los eventos puntuales anteriores (las series se
+        cargan siempre).
+        """
+        try:
+            return await self._leer(self._backend.cargar, guild_id, desde)
+        except Exception as e:
+            logger.error(f"Error cargando eventos desde {self._backend.nombre}: {e}")
+            return None
+
+    async def obtener(self, id):
+        try:
+            return await self._leer_uno(self._backend.obtener, id)
+        except Exception as e:
+            logger.error(f"Error obteniendo evento {id}: {e}")
+            return None
+
+    async def rango(self, guild_id, desde, hasta):
+        """Eventos que empiezan en [desde, hasta), ordenados por `starts_at`."""
+        try:
+            return await self._leer(self._backend.rango, guild_id, desde, hasta)
+        except Exception as e:
+            logger.error(f"Error consultando eventos entre {desde} y {hasta}: {e}")
+            return []
+
+    async def pagina(self, guild_id, desde, despues=None, limite=10):
+        """Página de eventos que empiezan desde `desde`, por clave (starts_at, id).
+
+        `despues` es la clave del último evento de la página anterior; la
+        consulta continúa justo tras ella sin OFFSET, así que el coste de cada
+        página no depende de cuántas haya antes.
+        """
+        try:
+            return await self._leer(self._backend.pagina, guild_id, desde, despues, limite)
+        except Exception as e:
+            logger.error(f"Error paginando eventos desde {desde}: {e}")
+            return []
+
+    async def contar(self, guild_id, desde):
+        """Número de eventos que empiezan desde `desde`, sin transferir las filas."""
+        try:
+            return await self._ejecutar(self._backend.contar, guild_id, desde)
+        except Exception as e:
+            logger.error(f"Error contando eventos desde {desde}: {e}")
+            return 0
+
+    async def series(self, guild_id=None):
+        """Eventos recurrentes sin expandir, una fila por serie."""
+        try:
+            return await self._leer(self._backend.series, guild_id)
+        except Exception as e:
+            logger.error(f"Error consultando series de eventos: {e}")
+            return []
+
+    async def recordatorios(self, desde, hasta):
+        """Eventos puntuales de todos los servidores cuyo recordatorio vence en [desde, hasta); None si falla."""
+        try:
+            return await self._leer(self._backend.recordatorios, desde, hasta)
+        except Exception as e:
+            logger.error(f"Error consultando recordatorios entre {desde} y {hasta}: {e}")
+            return None
+
+    async def cambios(self, desde):
+        """(eventos, borrados) modificados o borrados desde `desde` en cualquier servidor; None si falla."""
+        def leer():
+            filas, borrados = self._backend.cambios(desde)
+            eventos = [evento for evento in map(self._deserializar, filas) if evento is not None]
+            return eventos, borrados
+        try:
+            return await self._ejecutar(leer, nombre="cambios")
+        except Exception as e:
+            logger.error(f"Error consultando cambios desde {desde}: {e}")
+            return None
+
+    async def guardar(self, evento):
+        try:
+            return await self._leer_uno(self._backend.guardar, serializar_evento(evento))
+        except Exception as e:
+            logger.error(f"Error guardando evento en {self._backend.nombre}: {e}")
+            return None
+
+    async def guardar_lote(self, eventos):
+        """Inserta un lote en una sola llamada; devuelve None si el lote falla."""
+        try:
+            return await self._leer(self._backend.guardar_lote, [serializar_evento(e) for e in eventos])
+        except Exception as e:
+            logger.error(f"Error guardando lote de {len(eventos)} eventos en {self._backend.nombre}: {e}")
+            return None
+
+    async def actualizar(self, id, campos):
+        try:
+            return await self._leer(self._backend.actualizar, id, serializar_evento(campos))
+        except Exception as e:
+            logger.error(f"Error actualizando evento {id}: {e}")
+            return None
+
+    async def eliminar(self, id):
+        try:
+            return await self._leer(self._backend.eliminar, id)
+        except Exception as e:
+            logger.error(f"Error eliminando evento {id}: {e}")
+            return None
+
+    async def archivar(self, antes, limite):
+        """Traslada al archivo un lote de eventos puntuales anteriores a `antes`; None si falla."""
+        try:
+            return await self._ejecutar(self._backend.archivar, antes, limite)
+        except Exception as e:
+            logger.error(f"Error archivando eventos anteriores a {antes}: {e}")
+            return None
+
+    async def historial(self, guild_id, desde=None, hasta=None, texto=None, despues=None, limite=10):
+        """Página de eventos archivados, del más reciente al más antiguo, por clave (starts_at, id)."""
+        try:
+            return await self._leer(self._backend.historial, guild_id, desde, hasta, texto, despues, limite)
+        except Exception as e:
+            logger.error(f"Error consultando el historial del servidor {guild_id}: {e}")
+            return []
+
+    async def asignar_servidor(self, guild_id):
+        try:
+            return await self._ejecutar(self._backend.asignar_servidor, guild_id)
+        except Exception as e:
+            logger.error(f"Error asignando eventos sin servidor a {guild_id}: {e}")
+            return 0
+
+    async def cargar_servidores(self):
+        """Configuración de todos los servidores; None si falla."""
+        try:
+            return await self._ejecutar(self._backend.cargar_servidores)
+        except Exception as e:
+            logger.error(f"Error cargando servidores desde {self._backend.nombre}: {e}")
+            return None
+
+    async def guardar_servidor(self, fila):
+        try:
+            return await self._ejecutar(self._backend.guardar_servidor, fila)
+        except Exception as e:
+            logger.error(f"Error guardando la configuración del servidor {fila.get('guild_id')}: {e}")
+            return None
+
+    async def comprobar(self, max_edad=60):
+        """True si el backend respondió hace menos de `max_edad` s o responde ahora a una consulta ligera."""
+        if self.ultimo_exito is not None and time.monotonic() - self.ultimo_exito < max_edad:
+            return True
+        try:
+            await self._ejecutar(self._backend.cargar_servidores, nombre="comprobar")
+            return True
+        except Exception as e:
+            logger.error(f"El almacenamiento {self._backend.nombre} no responde: {e}")
+            return False
+
+    def cerrar(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._backend.cerrar()
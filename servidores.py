@@ -0,0 +1,93 @@
+import logging
+from zoneinfo import ZoneInfo
+
+from periodicas import ReglaCalendario
+
+
+logger = logging.getLogger(__name__)
+
+ZONA_POR_DEFECTO = "Europe/Madrid"
+
+
+class ConfigServidor:
+    """Ajustes de un servidor: canal de anuncios, zona horaria y resumen semanal.
+
+    `resumen_dia` usa la numeración de `weekday()` (0 = lunes); None desactiva
+    el resumen. Sin canal configurado las respuestas se quedan en el canal
+    donde se usó la orden.
+    """
+
+    def __init__(self, guild_id, canal_id=None, zona=ZONA_POR_DEFECTO, resumen_dia=6, resumen_hora=20):
+        self.guild_id = guild_id
+        self.canal_id = canal_id
+        self.zona = zona
+        # Valida la zona al crear la configuración, no al usarla
+        self.zona_info = ZoneInfo(zona)
+        self.resumen_dia = resumen_dia
+        self.resumen_hora = resumen_hora
+
+    @classmethod
+    def desde_fila(cls, fila):
+        return cls(
+            fila["guild_id"],
+            fila.get("canal_id"),
+            fila.get("zona") or ZONA_POR_DEFECTO,
+            fila.get("resumen_dia"),
+            fila.get("resumen_hora") if fila.get("resumen_hora") is not None else 20
+        )
+
+    def fila(self):
+        return {
+            "guild_id": self.guild_id,
+            "canal_id": self.canal_id,
+            "zona": self.zona,
+            "resumen_dia": self.resumen_dia,
+            "resumen_hora": self.resumen_hora,
+        }
+
+    def regla_resumen(self):
+        """Regla del resumen semanal, o None si está desactivado o no hay canal."""
+        if self.resumen_dia is None or self.canal_id is None:
+            return None
+        return ReglaCalendario(self.resumen_hora, 0, dias_semana=[self.resumen_dia], zona=self.zona)
+
+
+class ConfiguracionServidores:
+    """Configuración de todos los servidores, cargada una vez y servida desde memoria.
+
+    Se guarda en el almacenamiento de eventos para que todos los procesos
+    (uno por grupo de shards) compartan la misma. Las lecturas son síncronas
+    y nunca consultan la base de datos; los servidores sin configurar reciben
+    los valores por defecto.
+    """
+
+    def __init__(self, repositorio):
+        self._repositorio = repositorio
+        self._por_servidor = {}
+
+    async def cargar(self):
+        filas = await self._repositorio.cargar_servidores()
+        if filas is None:
+            return False
+        configuraciones = {}
+        for fila in filas:
+            try:
+                configuraciones[fila["guild_id"]] = ConfigServidor.desde_fila(fila)
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Configuración del servidor {fila.get('guild_id')} ignorada: {e}")
+        self._por_servidor = configuraciones
+        logger.info(f"Configuración de {len(configuraciones)} servidores cargada")
+        return True
+
+    def obtener(self, guild_id):
+        config = self._por_servidor.get(guild_id)
+        return config if config is not None else ConfigServidor(guild_id)
+
+    def configurados(self):
+        return list(self._por_servidor.values())
+
+    async def guardar(self, config):
+        if not await self._repositorio.guardar_servidor(config.fila()):
+            return False
+        self._por_servidor[config.guild_id] = config
+        return True
@@ -0,0 +1,109 @@
+import re
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+
+# Zona en la que se introducen y se muestran las fechas y horas de los eventos
+ZONA = ZoneInfo("Europe/Madrid")
+
+# Campos de los que dependen los instantes precalculados
+CAMPOS_MOMENTO = ("fecha", "hora", "recordatorio")
+
+# Duración con la que cuentan los eventos sin `duracion` al buscar solapes y huecos
+DURACION_POR_DEFECTO = timedelta(hours=1)
+
+_PATRON_RECORDATORIO = re.compile(r"(\d+)([dhm])")
+
+
+def parse_recordatorio(valor):
+    dias = horas = minutos = 0
+    for match in _PATRON_RECORDATORIO.finditer(valor):
+        cantidad, unidad = int(match.group(1)), match.group(2)
+        if unidad == "d":
+            dias += cantidad
+        elif unidad == "h":
+            horas += cantidad
+        elif unidad == "m":
+            minutos += cantidad
+    return timedelta(days=dias, hours=horas, minutes=minutos)
+
+
+def formatear_duracion(delta):
+    """Texto como el de los recordatorios ("1d2h30m") para un timedelta; "" si no llega a un minuto."""
+    minutos = int(delta.total_seconds() // 60)
+    horas, minutos = divmod(minutos, 60)
+    dias, horas = divmod(horas, 24)
+    return "".join(f"{cantidad}{unidad}" for cantidad, unidad in ((dias, "d"), (horas, "h"), (minutos, "m")) if cantidad)
+
+
+def duracion_evento(evento):
+    """Duración del evento según su campo `duracion`, o `DURACION_POR_DEFECTO` si no tiene."""
+    duracion = parse_recordatorio(evento["duracion"]) if evento.get("duracion") else None
+    return duracion or DURACION_POR_DEFECTO
+
+
+def fin_evento(evento):
+    return evento["starts_at"] + duracion_evento(evento)
+
+
+def parse_hora(hora):
+    """Acepta HH:MM y HH:MM:SS (Postgres devuelve las columnas time con segundos)."""
+    try:
+        return datetime.strptime(hora, "%H:%M:%S").time()
+    except ValueError:
+        return datetime.strptime(hora, "%H:%M").time()
+
+
+def inicio_dia(dia, zona=ZONA):
+    """Medianoche local de `dia` como instante con zona."""
+    return datetime.combine(dia, time(0), tzinfo=zona)
+
+
+def calcular_momentos(evento, zona=ZONA):
+    """Instantes canónicos del evento a partir de fecha, hora y recordatorio.
+
+    `starts_at` es el comienzo del evento y `remind_at` el del recordatorio
+    (None si no tiene). Se calculan una vez al escribir el evento.
+    """
+    dia = datetime.strptime(evento["fecha"], "%Y-%m-%d").date()
+    starts_at = datetime.combine(dia, parse_hora(evento["hora"]), tzinfo=zona)
+    # Ida y vuelta por UTC para normalizar horas inexistentes por el cambio de horario
+    starts_at = starts_at.astimezone(timezone.utc).astimezone(zona)
+    remind_at = None
+    if evento.get("recordatorio"):
+        remind_at = starts_at - parse_recordatorio(evento["recordatorio"])
+    return {"starts_at": starts_at, "remind_at": remind_at}
+
+
+def _a_texto(momento):
+    # Siempre en UTC para que el orden del texto coincida con el cronológico
+    return momento.astimezone(timezone.utc).isoformat() if momento is not None else None
+
+
+def _desde_texto(valor, zona):
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.fromisoformat(valor).astimezone(zona)
+
+
+def serializar_evento(evento):
+    """Copia del evento lista para el almacenamiento, con instantes ISO en UTC."""
+    fila = dict(evento)
+    for campo in ("starts_at", "remind_at"):
+        if campo in fila:
+            fila[campo] = _a_texto(fila[campo])
+    return fila
+
+
+def deserializar_evento(fila, zona=ZONA):
+    """Convierte una fila leída del almacenamiento a evento con instantes ya analizados.
+
+    Las filas anteriores a la migración, sin `starts_at`, se completan aquí
+    para que el bot siga funcionando hasta ejecutar `migrar_fechas.py`.
+    """
+    if fila.get("starts_at") is None:
+        fila.update(calcular_momentos(fila, zona))
+    else:
+        fila["starts_at"] = _desde_texto(fila["starts_at"], zona)
+        fila["remind_at"] = _desde_texto(fila.get("remind_at"), zona)
+    return fila
@@ -0,0 +1,60 @@
+import logging
+
+import discord
+
+
+logger = logging.getLogger(__name__)
+
+
+class VistaPaginada(discord.ui.View):
+    """Botones Anterior/Siguiente sobre una consulta paginada por cursor.
+
+    `cargar_pagina(cursor, limite)` devuelve los elementos que siguen a
+    `cursor` (None para la primera página), `cursor_de(elemento)` da el cursor
+    de un elemento y `construir_embed(elementos, numero)` dibuja la página.
+    Se guarda el cursor inicial de cada página visitada para volver atrás sin
+    consultas hacia detrás. Solo quien abrió la lista puede pasar páginas.
+    """
+
+    def __init__(self, cargar_pagina, cursor_de, construir_embed, autor_id, por_pagina=10, timeout=300):
+        super().__init__(timeout=timeout)
+        self._cargar_pagina = cargar_pagina
+        self._cursor_de = cursor_de
+        self._construir_embed = construir_embed
+        self._autor_id = autor_id
+        self._por_pagina = por_pagina
+        self._cursores = [None]
+        self._siguiente = None
+
+    async def mostrar(self):
+        """Carga la página actual y devuelve su embed con los botones actualizados."""
+        # Un elemento de más indica si existe página siguiente
+        elementos = await self._cargar_pagina(self._cursores[-1], self._por_pagina + 1)
+        hay_siguiente = len(elementos) > self._por_pagina
+        elementos = elementos[:self._por_pagina]
+        self._siguiente = self._cursor_de(elementos[-1]) if hay_siguiente else None
+
+        self.anterior.disabled = len(self._cursores) == 1
+        self.siguiente.disabled = not hay_siguiente
+        return self._construir_embed(elementos, len(self._cursores))
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id != self._autor_id:
+            await interaction.response.send_message("❌ Solo quien pidió la lista puede cambiar de página.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Anterior", style=discord.ButtonStyle.secondary)
+    async def anterior(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if len(self._cursores) > 1:
+            self._cursores.pop()
+        await interaction.response.edit_message(embed=await self.mostrar(), view=self)
+
+    @discord.ui.button(label="Siguiente ▶", style=discord.ButtonStyle.secondary)
+    async def siguiente(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if self._siguiente is not None:
+            self._cursores.append(self._siguiente)
+        await interaction.response.edit_message(embed=await self.mostrar(), view=self)
+
+    async def on_error(self, interaction: discord.Interaction, error: Exception, item):
+        logger.error(f"Error cambiando de página: {error}")